@@ -1,229 +1,777 @@
 import json
 import os
+import contextvars
+import re
+import random
+import hashlib
+import io
+import base64
 import psycopg2
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
 
-def handler(event: dict, context) -> dict:
-    '''API для управления заявками на конкурсы'''
-    
-    method = event.get('httpMethod', 'GET')
-    
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Блоки между маркерами runtime:* — копии секций backend/_runtime.py; правятся там и переносятся scripts/sync_runtime.py
+CORS_ALLOW_METHODS = 'GET, POST, PUT, DELETE, OPTIONS'
+CORS_ALLOW_HEADERS = 'Content-Type'
+
+
+# >>> runtime:trace
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', 'true') == 'true'
+TRACE_SERVER_TIMING = os.environ.get('TRACE_SERVER_TIMING', 'false') == 'true'
+TRACE_MAX_SPANS = int(os.environ.get('TRACE_MAX_SPANS', '200'))
+_trace_spans = contextvars.ContextVar('trace_spans', default=None)
+
+
+def record_span(name: str, detail, started: float) -> None:
+    '''Добавляет завершившийся участок в трассу текущего запроса, если она ведётся'''
+    spans = _trace_spans.get()
+    if spans is not None and len(spans) < TRACE_MAX_SPANS:
+        spans.append((name, detail, started, time.perf_counter()))
+
+
+def finish_trace(event: dict, context, response: dict, spans: list, started: float) -> dict:
+    '''Пишет трассу запроса одной JSON-строкой и при TRACE_SERVER_TIMING добавляет заголовок Server-Timing'''
+    total_ms = (time.perf_counter() - started) * 1000
+    totals = {}
+    for name, _, span_started, span_ended in spans:
+        count, ms = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, ms + (span_ended - span_started) * 1000)
+    print(json.dumps({'trace': {
+        'request_id': getattr(context, 'request_id', None),
+        'method': event.get('httpMethod'),
+        'status': response.get('statusCode'),
+        'total_ms': round(total_ms, 2),
+        'totals': {name: {'count': count, 'ms': round(ms, 2)} for name, (count, ms) in totals.items()},
+        'spans': [
+            {'name': name, 'detail': detail, 'at_ms': round((s - started) * 1000, 2), 'ms': round((e - s) * 1000, 2)}
+            for name, detail, s, e in spans
+        ]
+    }}, ensure_ascii=False, default=str))
+    if TRACE_SERVER_TIMING:
+        timing = ', '.join(
+            [f'{name};dur={ms:.1f};desc="{count}"' for name, (count, ms) in totals.items()] + [f'app;dur={total_ms:.1f}']
+        )
+        headers = dict(response.get('headers') or {})
+        headers['Server-Timing'] = headers['Server-Timing'] + ', ' + timing if headers.get('Server-Timing') else timing
+        if 'Server-Timing' not in headers.get('Access-Control-Expose-Headers', ''):
+            headers['Access-Control-Expose-Headers'] = ', '.join(
+                filter(None, [headers.get('Access-Control-Expose-Headers'), 'Server-Timing'])
+            )
+        response = dict(response, headers=headers)
+    return response
+# <<< runtime:trace
+
+
+# >>> runtime:span
+@contextmanager
+def span(name: str, detail=None):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, detail, started)
+# <<< runtime:span
+
+
+# >>> runtime:sql-trace
+TRACE_SQL_MAX_LENGTH = int(os.environ.get('TRACE_SQL_MAX_LENGTH', '300'))
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_normalized_sql = {}
+_traced_cursor_classes = {}
+_query_observers = []
+
+
+def normalize_sql(query) -> str:
+    '''Текст запроса без литералов и лишних пробелов; результат кешируется по исходной строке'''
+    text = _normalized_sql.get(query)
+    if text is None:
+        raw = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+        text = _SQL_LITERALS.sub('?', ' '.join(raw.split()))[:TRACE_SQL_MAX_LENGTH]
+        if len(_normalized_sql) < 1024:
+            _normalized_sql[query] = text
+    return text
+
+
+def traced_cursor_class(base):
+    '''Подкласс курсора, который засекает execute/executemany/copy_expert как участки db.query'''
+    cls = _traced_cursor_classes.get(base)
+    if cls is None:
+        class TracedCursor(base):
+            def execute(self, query, vars=None):
+                if _trace_spans.get() is None and not _query_observers:
+                    return super().execute(query, vars)
+                started = time.perf_counter()
+                with span('db.query', normalize_sql(query)):
+                    result = super().execute(query, vars)
+                # У именованного курсора execute — это только DECLARE; его выборку наблюдателям отдаёт stream_json_array
+                if self.name is None:
+                    for observer in _query_observers:
+                        observer(self.connection, query, vars, started)
+                return result
+
+            def executemany(self, query, vars_list):
+                if _trace_spans.get() is None:
+                    return super().executemany(query, vars_list)
+                with span('db.query', normalize_sql(query)):
+                    return super().executemany(query, vars_list)
+
+            def copy_expert(self, sql, file, size=8192):
+                if _trace_spans.get() is None:
+                    return super().copy_expert(sql, file, size)
+                with span('db.copy', normalize_sql(sql)):
+                    return super().copy_expert(sql, file, size)
+
+        cls = _traced_cursor_classes[base] = TracedCursor
+    return cls
+
+
+class TracingConnection(psycopg2.extensions.connection):
+    '''Соединение, все курсоры которого (включая RealDictCursor и именованные) пишут участки в трассу'''
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = traced_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+# <<< runtime:sql-trace
+
+
+# >>> runtime:slow-query
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '0'))
+SLOW_QUERY_EXPLAIN_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_RATE', '0.1'))
+_SQL_PLACEHOLDER_LISTS = re.compile(r'%s(?:\s*,\s*%s)+')
+_SQL_READ_ONLY = re.compile(r'\s*(?:SELECT|WITH)\b', re.IGNORECASE)
+_SQL_WRITES = re.compile(r'\b(?:INSERT|UPDATE|DELETE|MERGE)\b', re.IGNORECASE)
+_slow_query_lock = threading.Lock()
+_slow_query_stats = {}
+
+
+def fingerprint_sql(query) -> tuple:
+    '''Отпечаток запроса: текст без литералов, списки %s в IN (...) свёрнуты, чтобы варианты
+    динамического WHERE с разным числом значений попадали в одну группу'''
+    raw = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+    text = _SQL_PLACEHOLDER_LISTS.sub('%s, ...', _SQL_LITERALS.sub('?', ' '.join(raw.split())))
+    return hashlib.md5(text.encode()).hexdigest()[:16], text
+
+
+def summarize_plan(plan: dict) -> dict:
+    seq_scans = []
+
+    def walk(node: dict) -> None:
+        if node.get('Node Type') == 'Seq Scan':
+            seq_scans.append({
+                'relation': node.get('Relation Name'),
+                'rows': node.get('Actual Rows'),
+                'removed_by_filter': node.get('Rows Removed by Filter', 0)
+            })
+        for child in node.get('Plans', ()):
+            walk(child)
+
+    root = plan['Plan']
+    walk(root)
+    return {
+        'execution_ms': plan.get('Execution Time'),
+        'planning_ms': plan.get('Planning Time'),
+        'root': root.get('Node Type'),
+        'shared_hit_blocks': root.get('Shared Hit Blocks'),
+        'shared_read_blocks': root.get('Shared Read Blocks'),
+        'seq_scans': seq_scans,
+        'plan': plan
+    }
+
+
+def explain_query(conn, query, vars) -> dict:
+    '''Выполняет EXPLAIN (ANALYZE, BUFFERS) на том же соединении под SAVEPOINT,
+    чтобы ошибка плана не оборвала транзакцию обработчика'''
+    text = query.as_string(conn) if hasattr(query, 'as_string') else query
+    if isinstance(text, bytes):
+        text = text.decode()
+    use_savepoint = not conn.autocommit
+    cur = psycopg2.extensions.cursor(conn)
+    try:
+        if use_savepoint:
+            cur.execute('SAVEPOINT slow_query_explain')
+        try:
+            cur.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + text, vars)
+            plan = cur.fetchone()[0][0]
+        except psycopg2.Error as e:
+            if use_savepoint:
+                cur.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            return {'error': str(e)}
+        if use_savepoint:
+            cur.execute('RELEASE SAVEPOINT slow_query_explain')
+    finally:
+        cur.close()
+    return summarize_plan(plan)
+
+
+def observe_slow_query(conn, query, vars, started: float) -> None:
+    '''Учитывает запрос дольше SLOW_QUERY_MS в сводке по отпечатку и пишет его в лог.
+
+    С вероятностью SLOW_QUERY_EXPLAIN_RATE к записи добавляется план; EXPLAIN ANALYZE
+    исполняет запрос повторно, поэтому планы снимаются только для чтения.
+    '''
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+    fingerprint, text = fingerprint_sql(query)
+    with _slow_query_lock:
+        stats = _slow_query_stats.setdefault(fingerprint, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['total_ms'] = round(stats['total_ms'] + elapsed_ms, 2)
+        stats['max_ms'] = round(max(stats['max_ms'], elapsed_ms), 2)
+        stats = dict(stats)
+    record = {'fingerprint': fingerprint, 'query': text, 'ms': round(elapsed_ms, 2), 'instance': stats}
+    if random.random() < SLOW_QUERY_EXPLAIN_RATE and _SQL_READ_ONLY.match(text) and not _SQL_WRITES.search(text):
+        with span('db.explain', fingerprint):
+            record['explain'] = explain_query(conn, query, vars)
+    print(json.dumps({'slow_query': record}, ensure_ascii=False, default=str))
+
+
+if SLOW_QUERY_MS:
+    _query_observers.append(observe_slow_query)
+# <<< runtime:slow-query
+
+
+# >>> runtime:pool
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_HEALTHCHECK_AFTER = float(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', '30'))
+DB_POOL_LOG_EVERY_RELEASE = os.environ.get('DB_POOL_LOG_EVERY_RELEASE', 'false') == 'true'
+_pool_cond = threading.Condition()
+_pool_idle = []
+_pool_size = 0
+_pool_stats = {'hits': 0, 'misses': 0, 'waits': 0, 'wait_ms': 0.0, 'evicted': 0}
+
+
+def _pool_snapshot(event: str) -> str:
+    '''Строка лога со счётчиками пула; собирается под _pool_cond, печатается уже без блокировки'''
+    return json.dumps({'db_pool': dict(_pool_stats, event=event, size=_pool_size, idle=len(_pool_idle))})
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_alive(conn) -> bool:
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def get_connection():
+    '''Выдаёт соединение из пула, который живёт между тёплыми вызовами функции.
+
+    В лог пишется только рост пула (новое соединение) и его исчерпание (ожидание свободного).
+    '''
+    global _pool_size
+    started = time.monotonic()
+    exhausted = None
+    with _pool_cond:
+        now = time.monotonic()
+        for item in [i for i in _pool_idle if now - i[1] > DB_POOL_IDLE_TIMEOUT]:
+            _pool_idle.remove(item)
+            _close_quietly(item[0])
+            _pool_size -= 1
+            _pool_stats['evicted'] += 1
+        if not _pool_idle and _pool_size >= DB_POOL_MAX_SIZE:
+            _pool_stats['waits'] += 1
+            exhausted = _pool_snapshot('exhausted')
+            while not _pool_idle and _pool_size >= DB_POOL_MAX_SIZE:
+                _pool_cond.wait()
+        _pool_stats['wait_ms'] += (time.monotonic() - started) * 1000
+        if _pool_idle:
+            conn, last_used = _pool_idle.pop()
+        else:
+            conn, last_used = None, None
+            _pool_size += 1
+    if exhausted:
+        print(exhausted)
+
+    if conn is not None:
+        idle_for = time.monotonic() - last_used
+        if not conn.closed and (idle_for < DB_POOL_HEALTHCHECK_AFTER or _is_alive(conn)):
+            with _pool_cond:
+                _pool_stats['hits'] += 1
+            return conn
+        _close_quietly(conn)
+        with _pool_cond:
+            _pool_stats['evicted'] += 1
+
+    try:
+        with span('db.connect'):
+            conn = psycopg2.connect(os.environ['DATABASE_URL'], connection_factory=TracingConnection)
+    except Exception:
+        with _pool_cond:
+            _pool_size -= 1
+            _pool_cond.notify()
+        raise
+    with _pool_cond:
+        _pool_stats['misses'] += 1
+        grew = _pool_snapshot('grew')
+    print(grew)
+    return conn
+
+
+def release_connection(conn) -> None:
+    '''Возвращает соединение в пул; разорванные соединения отбрасываются'''
+    global _pool_size
+    if not conn.closed:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            _close_quietly(conn)
+    with _pool_cond:
+        if conn.closed:
+            _pool_size -= 1
+        else:
+            _pool_idle.append((conn, time.monotonic()))
+        _pool_cond.notify()
+        released = _pool_snapshot('released') if DB_POOL_LOG_EVERY_RELEASE else None
+    if released:
+        print(released)
+
+
+@contextmanager
+def db_connection():
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+# <<< runtime:pool
+
+
+# >>> runtime:json
+STREAM_ITERSIZE = int(os.environ.get('STREAM_ITERSIZE', '500'))
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def encode_json(value) -> str:
+    '''Кодирует значение в JSON; orjson, если установлен, сам обрабатывает даты'''
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default).decode('utf-8')
+    return json.dumps(value, default=_json_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def stream_json_array(conn, query: str, params=(), limit=None, row_hook=None) -> tuple:
+    '''Читает выборку именованным (серверным) курсором по STREAM_ITERSIZE строк
+    и кодирует каждую строку сразу в буфер, не собирая список словарей.
+
+    Возвращает (JSON-массив, последняя исходная строка, были ли строки сверх limit).
+    '''
+    buffer = io.StringIO()
+    buffer.write('[')
+    last_row = None
+    count = 0
+    has_more = False
+    started = time.perf_counter()
+    with conn.cursor(name='stream_json_array') as cur:
+        cur.itersize = STREAM_ITERSIZE
+        cur.execute(query, params)
+        columns = None
+        for values in cur:
+            if limit is not None and count >= limit:
+                has_more = True
+                break
+            if columns is None:
+                columns = [col[0] for col in cur.description]
+            row = dict(zip(columns, values))
+            if count:
+                buffer.write(',')
+            buffer.write(encode_json(row_hook(row) if row_hook else row))
+            last_row = row
+            count += 1
+    for observer in _query_observers:
+        observer(conn, query, params, started)
+    buffer.write(']')
+    return buffer.getvalue(), last_row, has_more
+# <<< runtime:json
+
+
+# >>> runtime:json-envelope
+def json_envelope(items_json: str, **fields) -> str:
+    '''Собирает {"items": [...], ...} вокруг уже закодированного массива'''
+    return '{"items":' + items_json + ''.join(f',{json.dumps(key)}:{encode_json(value)}' for key, value in fields.items()) + '}'
+# <<< runtime:json-envelope
+
+
+# >>> runtime:keyset-cursor
+def encode_cursor(values: list) -> str:
+    '''Упаковывает ключи сортировки последней строки в непрозрачный курсор'''
+    raw = json.dumps(values, separators=(',', ':'), default=_json_default).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> list:
+    padded = token + '=' * (-len(token) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or not values:
+        raise ValueError('Invalid cursor')
+    return values
+# <<< runtime:keyset-cursor
+
+
+# >>> runtime:http
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_RESPONSE = {
+    'statusCode': 200,
+    'headers': {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': CORS_ALLOW_METHODS,
+        'Access-Control-Allow-Headers': CORS_ALLOW_HEADERS,
+        'Access-Control-Max-Age': '86400'
+    },
+    'body': '',
+    'isBase64Encoded': False
+}
+METHOD_NOT_ALLOWED_RESPONSE = {
+    'statusCode': 405,
+    'headers': JSON_HEADERS,
+    'body': '{"error": "Method not allowed"}',
+    'isBase64Encoded': False
+}
+
+
+class HttpError(Exception):
+    '''Ошибка с готовым HTTP-статусом; dispatch() превращает её в JSON-ответ'''
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(status: int, payload, headers: dict = JSON_HEADERS) -> dict:
+    body = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+    return {'statusCode': status, 'headers': headers, 'body': body, 'isBase64Encoded': False}
+
+
+def dispatch(routes: dict, event: dict, context, default_method: str = 'GET') -> dict:
+    '''Выбирает обработчик по HTTP-методу и переводит исключения в ответы.
+
+    Ответы на OPTIONS и неизвестный метод собраны заранее и не аллоцируются на каждый вызов.
+    Остальные запросы трассируются: участки БД, S3 и внешних HTTP-вызовов пишутся одной JSON-строкой в лог.
+    '''
+    method = event.get('httpMethod', default_method)
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': ''
-        }
-    
-    dsn = os.environ.get('DATABASE_URL')
-    
-    if method == 'GET':
+        return PREFLIGHT_RESPONSE
+    route = routes.get(method)
+    if route is None:
+        return METHOD_NOT_ALLOWED_RESPONSE
+    spans = [] if TRACE_ENABLED else None
+    token = _trace_spans.set(spans)
+    started = time.perf_counter()
+    try:
+        response = route(event, context)
+    except HttpError as e:
+        response = json_response(e.status, {'error': str(e)})
+    except json.JSONDecodeError:
+        response = json_response(400, {'error': 'Invalid JSON body'})
+    except Exception as e:
+        response = json_response(500, {'error': str(e)})
+    finally:
+        _trace_spans.reset(token)
+    if spans is None:
+        return response
+    return finish_trace(event, context, response, spans, started)
+# <<< runtime:http
+
+
+SCHEMA_CACHE_TTL = float(os.environ.get('SCHEMA_CACHE_TTL', '600'))
+
+APPLICATION_COLUMNS = (
+    'id', 'full_name', 'age', 'teacher', 'institution', 'work_title',
+    'email', 'contest_id', 'contest_name', 'work_file_url',
+    'status', 'result', 'gallery_consent', 'created_at', 'updated_at', 'deleted_at'
+)
+
+_schema_cache = {}
+
+
+def get_table_columns(cursor, table: str) -> frozenset:
+    '''Возвращает набор колонок таблицы; information_schema опрашивается раз в SCHEMA_CACHE_TTL секунд'''
+    cached = _schema_cache.get(table)
+    if cached and time.monotonic() - cached[1] < SCHEMA_CACHE_TTL:
+        return cached[0]
+    cursor.execute(
+        'SELECT column_name FROM information_schema.columns WHERE table_name = %s',
+        (table,)
+    )
+    columns = frozenset(row[0] for row in cursor.fetchall())
+    _schema_cache[table] = (columns, time.monotonic())
+    return columns
+
+
+def row_to_application(row: dict) -> dict:
+    app_data = dict.fromkeys(APPLICATION_COLUMNS)
+    app_data.update(row)
+    return app_data
+
+
+APPLICATIONS_PAGE_SIZE = int(os.environ.get('APPLICATIONS_PAGE_SIZE', '50'))
+APPLICATIONS_MAX_PAGE_SIZE = int(os.environ.get('APPLICATIONS_MAX_PAGE_SIZE', '500'))
+
+BULK_MAX_IDS = int(os.environ.get('BULK_MAX_IDS', '5000'))
+BULK_UPDATE_FIELDS = ('status', 'result')
+BULK_FILTER_COLUMNS = ('contest_id', 'contest_name', 'status', 'result')
+APPLICATION_STATUSES = ('new', 'viewed', 'sent')
+APPLICATION_RESULTS = ('grand_prix', 'first_degree', 'second_degree', 'third_degree', 'participant')
+
+
+def is_db_integer(value) -> bool:
+    '''int в диапазоне INTEGER; bool, хоть и подкласс int, идентификатором не считается'''
+    return isinstance(value, int) and not isinstance(value, bool) and -2 ** 31 <= value < 2 ** 31
+
+
+def bulk_value_valid(column: str, value) -> bool:
+    if column == 'contest_id':
+        return is_db_integer(value)
+    if column == 'contest_name':
+        return isinstance(value, str)
+    if column == 'status':
+        return value in APPLICATION_STATUSES
+    return value is None or value in APPLICATION_RESULTS
+
+
+def list_applications(event: dict, context) -> dict:
+    '''Список заявок; с limit/cursor — постранично с курсором'''
+    query_params = event.get('queryStringParameters') or {}
+    show_deleted = query_params.get('deleted') == 'true'
+    paginated = 'limit' in query_params or 'cursor' in query_params
+    
+    if paginated:
         try:
-            conn = psycopg2.connect(dsn)
-            cursor = conn.cursor()
-            
-            query_params = event.get('queryStringParameters', {})
-            show_deleted = query_params.get('deleted') == 'true'
-            
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'applications' AND column_name = 'deleted_at'
-            """)
-            has_deleted_at = cursor.fetchone() is not None
-            
-            if has_deleted_at:
-                if show_deleted:
-                    cursor.execute("""
-                        SELECT id, full_name, age, teacher, institution, work_title, 
-                               email, contest_id, contest_name, work_file_url, 
-                               status, result, gallery_consent, created_at, updated_at, deleted_at
-                        FROM applications
-                        WHERE deleted_at IS NOT NULL
-                        ORDER BY deleted_at DESC
-                    """)
-                else:
-                    cursor.execute("""
-                        SELECT id, full_name, age, teacher, institution, work_title, 
-                               email, contest_id, contest_name, work_file_url, 
-                               status, result, gallery_consent, created_at, updated_at, deleted_at
-                        FROM applications
-                        WHERE deleted_at IS NULL
-                        ORDER BY created_at DESC
-                    """)
+            page_size = min(int(query_params.get('limit') or APPLICATIONS_PAGE_SIZE), APPLICATIONS_MAX_PAGE_SIZE)
+            after = decode_cursor(query_params['cursor']) if query_params.get('cursor') else None
+        except (ValueError, TypeError):
+            return json_response(400, {'error': 'Invalid limit or cursor'})
+        if page_size < 1:
+            page_size = APPLICATIONS_PAGE_SIZE
+    
+    with db_connection() as conn:
+        cursor = conn.cursor()
+    
+        available = get_table_columns(cursor, 'applications')
+        columns = [c for c in APPLICATION_COLUMNS if c in available]
+        has_deleted_at = 'deleted_at' in columns
+        where = []
+        if has_deleted_at:
+            where.append('deleted_at IS NOT NULL' if show_deleted else 'deleted_at IS NULL')
+        
+        # Корзина идёт по idx_applications_deleted_at (deleted_at, created_at, id), основной список —
+        # по частичному idx_applications_active_created_at (created_at, id) WHERE deleted_at IS NULL
+        sort_keys = ['deleted_at', 'created_at', 'id'] if has_deleted_at and show_deleted else ['created_at', 'id']
+        order_by = ', '.join(f'{key} DESC' for key in sort_keys)
+        
+        total = None
+        params = []
+        if paginated:
+            # Общее число считается только для первой страницы: на следующих оно уже есть у клиента
+            if after is None:
+                cursor.execute(
+                    'SELECT COUNT(*) FROM applications' + (' WHERE ' + ' AND '.join(where) if where else '')
+                )
+                total = cursor.fetchone()[0]
             else:
-                cursor.execute("""
-                    SELECT id, full_name, age, teacher, institution, work_title, 
-                           email, contest_id, contest_name, work_file_url, 
-                           status, result, gallery_consent, created_at, updated_at
-                    FROM applications
-                    ORDER BY created_at DESC
-                """)
-            
-            rows = cursor.fetchall()
-            
-            applications = []
-            for row in rows:
-                if has_deleted_at:
-                    app_data = {
-                        'id': row[0],
-                        'full_name': row[1],
-                        'age': row[2],
-                        'teacher': row[3],
-                        'institution': row[4],
-                        'work_title': row[5],
-                        'email': row[6],
-                        'contest_id': row[7],
-                        'contest_name': row[8],
-                        'work_file_url': row[9],
-                        'status': row[10],
-                        'result': row[11],
-                        'gallery_consent': row[12],
-                        'created_at': row[13].isoformat() if row[13] else None,
-                        'updated_at': row[14].isoformat() if row[14] else None
-                    }
-                    if len(row) > 15:
-                        app_data['deleted_at'] = row[15].isoformat() if row[15] else None
-                    else:
-                        app_data['deleted_at'] = None
-                else:
-                    app_data = {
-                        'id': row[0],
-                        'full_name': row[1],
-                        'age': row[2],
-                        'teacher': row[3],
-                        'institution': row[4],
-                        'work_title': row[5],
-                        'email': row[6],
-                        'contest_id': row[7],
-                        'contest_name': row[8],
-                        'work_file_url': row[9],
-                        'status': row[10],
-                        'result': row[11],
-                        'gallery_consent': row[12],
-                        'created_at': row[13].isoformat() if row[13] else None,
-                        'updated_at': row[14].isoformat() if row[14] else None,
-                        'deleted_at': None
-                    }
-                applications.append(app_data)
-            
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(applications)
-            }
-            
-        except Exception as e:
-            return {
-                'statusCode': 500,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': str(e)})
-            }
-    
-    if method == 'PUT':
-        try:
-            body = json.loads(event.get('body', '{}'))
-            
-            app_id = body.get('id')
-            if not app_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Missing id'})
-                }
-            
-            conn = psycopg2.connect(dsn)
-            cursor = conn.cursor()
-            
+                if len(after) != len(sort_keys):
+                    return json_response(400, {'error': 'Cursor does not match this listing'})
+                where.append(f"({', '.join(sort_keys)}) < ({', '.join(['%s'] * len(sort_keys))})")
+                params.extend(after)
+        
+        query = f"SELECT {', '.join(columns)} FROM applications"
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += f' ORDER BY {order_by}'
+        if paginated:
+            query += ' LIMIT %s'
+            params.append(page_size + 1)
+        
+        cursor.close()
+        
+        items, last, has_more = stream_json_array(
+            conn, query, params,
+            limit=page_size if paginated else None,
+            row_hook=row_to_application
+        )
+    
+    if not paginated:
+        return json_response(200, items)
+    
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor([last[key] for key in sort_keys])
+    
+    return json_response(200, json_envelope(items, total=total, has_more=has_more, next_cursor=next_cursor))
+
+
+def bulk_update_applications(event: dict, context) -> dict:
+    '''Массовое изменение статуса, удаление или восстановление заявок'''
+    body = json.loads(event.get('body') or '{}')
+    action = body.get('action')
+    ids = body.get('ids') or []
+    filters = body.get('filter') or {}
+    
+    if action not in ('update', 'delete', 'restore'):
+        return json_response(400, {'error': 'action must be update, delete or restore'})
+    if not isinstance(ids, list) or len(ids) > BULK_MAX_IDS or not all(is_db_integer(i) for i in ids):
+        return json_response(400, {'error': f'ids must be a list of at most {BULK_MAX_IDS} integers'})
+    if not isinstance(filters, dict) or set(filters) - set(BULK_FILTER_COLUMNS) or not (ids or filters):
+        return json_response(400, {'error': 'Provide ids or a filter on ' + ', '.join(BULK_FILTER_COLUMNS)})
+    # Значения проверяются здесь, чтобы неверный тип давал 400, а не ошибку Postgres
+    for column, value in list(filters.items()) + [(f, body[f]) for f in BULK_UPDATE_FIELDS if f in body]:
+        if not bulk_value_valid(column, value):
+            return json_response(400, {'error': f'Invalid {column}: {value!r}'})
+    
+    if action == 'update':
+        assignments = [f'{field} = %s' for field in BULK_UPDATE_FIELDS if field in body]
+        set_params = [body[field] for field in BULK_UPDATE_FIELDS if field in body]
+        if not assignments:
+            return json_response(400, {'error': 'Nothing to update: pass status and/or result'})
+        assignments.append('updated_at = CURRENT_TIMESTAMP')
+        # Как и delete, изменение по фильтру не трогает заявки в корзине
+        where = ['deleted_at IS NULL']
+    elif action == 'delete':
+        assignments, set_params = ['deleted_at = CURRENT_TIMESTAMP'], []
+        where = ['deleted_at IS NULL']
+    else:
+        assignments, set_params = ['deleted_at = NULL', 'updated_at = CURRENT_TIMESTAMP'], []
+        where = ['deleted_at IS NOT NULL']
+    
+    where_params = []
+    if ids:
+        where.append('id = ANY(%s)')
+        where_params.append(ids)
+    for column in BULK_FILTER_COLUMNS:
+        if column not in filters:
+            continue
+        if filters[column] is None:
+            where.append(f'{column} IS NULL')
+        else:
+            where.append(f'{column} = %s')
+            where_params.append(filters[column])
+    
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE applications SET {', '.join(assignments)} WHERE {' AND '.join(where)} RETURNING id",
+                set_params + where_params
+            )
+            changed = sorted(row[0] for row in cursor.fetchall())
+        conn.commit()
+    
+    changed_set = set(changed)
+    results = {str(app_id): 'updated' for app_id in changed}
+    for app_id in ids:
+        results.setdefault(str(app_id), 'skipped')
+    
+    return json_response(200, {
+        'success': True,
+        'action': action,
+        'updated': len(changed_set),
+        'skipped': len(set(ids) - changed_set),
+        'results': results
+    })
+
+
+def update_application(event: dict, context) -> dict:
+    '''Обновление одной заявки'''
+    body = json.loads(event.get('body', '{}'))
+    
+    app_id = body.get('id')
+    if not app_id:
+        return json_response(400, {'error': 'Missing id'})
+    
+    with db_connection() as conn:
+        cursor = conn.cursor()
+    
+        cursor.execute("""
+            UPDATE applications 
+            SET full_name = %s, age = %s, teacher = %s, institution = %s,
+                work_title = %s, email = %s, status = %s, result = %s,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (
+            body.get('full_name'),
+            body.get('age'),
+            body.get('teacher'),
+            body.get('institution'),
+            body.get('work_title'),
+            body.get('email'),
+            body.get('status'),
+            body.get('result'),
+            app_id
+        ))
+    
+        conn.commit()
+        cursor.close()
+    
+    return json_response(200, {'success': True})
+
+
+def delete_application(event: dict, context) -> dict:
+    '''Мягкое удаление заявки или её восстановление (restore=true)'''
+    query_params = event.get('queryStringParameters', {})
+    app_id = query_params.get('id')
+    restore = query_params.get('restore') == 'true'
+    
+    if not app_id:
+        return json_response(400, {'error': 'Missing id'})
+    
+    with db_connection() as conn:
+        cursor = conn.cursor()
+    
+        if restore:
             cursor.execute("""
                 UPDATE applications 
-                SET full_name = %s, age = %s, teacher = %s, institution = %s,
-                    work_title = %s, email = %s, status = %s, result = %s,
-                    updated_at = CURRENT_TIMESTAMP
+                SET deleted_at = NULL, updated_at = CURRENT_TIMESTAMP
                 WHERE id = %s
-            """, (
-                body.get('full_name'),
-                body.get('age'),
-                body.get('teacher'),
-                body.get('institution'),
-                body.get('work_title'),
-                body.get('email'),
-                body.get('status'),
-                body.get('result'),
-                app_id
-            ))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True})
-            }
-            
-        except Exception as e:
-            return {
-                'statusCode': 500,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': str(e)})
-            }
-    
-    if method == 'DELETE':
-        try:
-            query_params = event.get('queryStringParameters', {})
-            app_id = query_params.get('id')
-            restore = query_params.get('restore') == 'true'
-            
-            if not app_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Missing id'})
-                }
-            
-            conn = psycopg2.connect(dsn)
-            cursor = conn.cursor()
-            
-            if restore:
-                cursor.execute("""
-                    UPDATE applications 
-                    SET deleted_at = NULL, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                """, (app_id,))
-            else:
-                cursor.execute("""
-                    UPDATE applications 
-                    SET deleted_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                """, (app_id,))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True})
-            }
-            
-        except Exception as e:
-            return {
-                'statusCode': 500,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': str(e)})
-            }
+            """, (app_id,))
+        else:
+            cursor.execute("""
+                UPDATE applications 
+                SET deleted_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, (app_id,))
     
-    return {
-        'statusCode': 405,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Method not allowed'})
-    }
\ No newline at end of file
+        conn.commit()
+        cursor.close()
+    
+    return json_response(200, {'success': True})
+
+
+ROUTES = {
+    'GET': list_applications,
+    'POST': bulk_update_applications,
+    'PUT': update_application,
+    'DELETE': delete_application
+}
+
+
+def handler(event: dict, context) -> dict:
+    '''API для управления заявками на конкурсы'''
+    return dispatch(ROUTES, event, context)
@@ -1,181 +1,524 @@
 import json
 import os
+import contextvars
+import re
+import hashlib
 import psycopg2
 from psycopg2.extras import RealDictCursor
+import threading
+import time
+from contextlib import contextmanager
+from collections import OrderedDict
 
-def handler(event: dict, context) -> dict:
-    """API для управления конкурсами: получение списка, создание, обновление и удаление конкурсов"""
-    
-    method = event.get('httpMethod', 'GET')
-    
+
+# Блоки между маркерами runtime:* — копии секций backend/_runtime.py; правятся там и переносятся scripts/sync_runtime.py
+CORS_ALLOW_METHODS = 'GET, POST, PUT, DELETE, OPTIONS'
+CORS_ALLOW_HEADERS = 'Content-Type, X-Authorization, If-None-Match'
+
+
+# >>> runtime:trace
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', 'true') == 'true'
+TRACE_SERVER_TIMING = os.environ.get('TRACE_SERVER_TIMING', 'false') == 'true'
+TRACE_MAX_SPANS = int(os.environ.get('TRACE_MAX_SPANS', '200'))
+_trace_spans = contextvars.ContextVar('trace_spans', default=None)
+
+
+def record_span(name: str, detail, started: float) -> None:
+    '''Добавляет завершившийся участок в трассу текущего запроса, если она ведётся'''
+    spans = _trace_spans.get()
+    if spans is not None and len(spans) < TRACE_MAX_SPANS:
+        spans.append((name, detail, started, time.perf_counter()))
+
+
+def finish_trace(event: dict, context, response: dict, spans: list, started: float) -> dict:
+    '''Пишет трассу запроса одной JSON-строкой и при TRACE_SERVER_TIMING добавляет заголовок Server-Timing'''
+    total_ms = (time.perf_counter() - started) * 1000
+    totals = {}
+    for name, _, span_started, span_ended in spans:
+        count, ms = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, ms + (span_ended - span_started) * 1000)
+    print(json.dumps({'trace': {
+        'request_id': getattr(context, 'request_id', None),
+        'method': event.get('httpMethod'),
+        'status': response.get('statusCode'),
+        'total_ms': round(total_ms, 2),
+        'totals': {name: {'count': count, 'ms': round(ms, 2)} for name, (count, ms) in totals.items()},
+        'spans': [
+            {'name': name, 'detail': detail, 'at_ms': round((s - started) * 1000, 2), 'ms': round((e - s) * 1000, 2)}
+            for name, detail, s, e in spans
+        ]
+    }}, ensure_ascii=False, default=str))
+    if TRACE_SERVER_TIMING:
+        timing = ', '.join(
+            [f'{name};dur={ms:.1f};desc="{count}"' for name, (count, ms) in totals.items()] + [f'app;dur={total_ms:.1f}']
+        )
+        headers = dict(response.get('headers') or {})
+        headers['Server-Timing'] = headers['Server-Timing'] + ', ' + timing if headers.get('Server-Timing') else timing
+        if 'Server-Timing' not in headers.get('Access-Control-Expose-Headers', ''):
+            headers['Access-Control-Expose-Headers'] = ', '.join(
+                filter(None, [headers.get('Access-Control-Expose-Headers'), 'Server-Timing'])
+            )
+        response = dict(response, headers=headers)
+    return response
+# <<< runtime:trace
+
+
+# >>> runtime:span
+@contextmanager
+def span(name: str, detail=None):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, detail, started)
+# <<< runtime:span
+
+
+# >>> runtime:sql-trace
+TRACE_SQL_MAX_LENGTH = int(os.environ.get('TRACE_SQL_MAX_LENGTH', '300'))
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_normalized_sql = {}
+_traced_cursor_classes = {}
+_query_observers = []
+
+
+def normalize_sql(query) -> str:
+    '''Текст запроса без литералов и лишних пробелов; результат кешируется по исходной строке'''
+    text = _normalized_sql.get(query)
+    if text is None:
+        raw = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+        text = _SQL_LITERALS.sub('?', ' '.join(raw.split()))[:TRACE_SQL_MAX_LENGTH]
+        if len(_normalized_sql) < 1024:
+            _normalized_sql[query] = text
+    return text
+
+
+def traced_cursor_class(base):
+    '''Подкласс курсора, который засекает execute/executemany/copy_expert как участки db.query'''
+    cls = _traced_cursor_classes.get(base)
+    if cls is None:
+        class TracedCursor(base):
+            def execute(self, query, vars=None):
+                if _trace_spans.get() is None and not _query_observers:
+                    return super().execute(query, vars)
+                started = time.perf_counter()
+                with span('db.query', normalize_sql(query)):
+                    result = super().execute(query, vars)
+                # У именованного курсора execute — это только DECLARE; его выборку наблюдателям отдаёт stream_json_array
+                if self.name is None:
+                    for observer in _query_observers:
+                        observer(self.connection, query, vars, started)
+                return result
+
+            def executemany(self, query, vars_list):
+                if _trace_spans.get() is None:
+                    return super().executemany(query, vars_list)
+                with span('db.query', normalize_sql(query)):
+                    return super().executemany(query, vars_list)
+
+            def copy_expert(self, sql, file, size=8192):
+                if _trace_spans.get() is None:
+                    return super().copy_expert(sql, file, size)
+                with span('db.copy', normalize_sql(sql)):
+                    return super().copy_expert(sql, file, size)
+
+        cls = _traced_cursor_classes[base] = TracedCursor
+    return cls
+
+
+class TracingConnection(psycopg2.extensions.connection):
+    '''Соединение, все курсоры которого (включая RealDictCursor и именованные) пишут участки в трассу'''
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = traced_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+# <<< runtime:sql-trace
+
+
+# >>> runtime:pool
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_HEALTHCHECK_AFTER = float(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', '30'))
+DB_POOL_LOG_EVERY_RELEASE = os.environ.get('DB_POOL_LOG_EVERY_RELEASE', 'false') == 'true'
+_pool_cond = threading.Condition()
+_pool_idle = []
+_pool_size = 0
+_pool_stats = {'hits': 0, 'misses': 0, 'waits': 0, 'wait_ms': 0.0, 'evicted': 0}
+
+
+def _pool_snapshot(event: str) -> str:
+    '''Строка лога со счётчиками пула; собирается под _pool_cond, печатается уже без блокировки'''
+    return json.dumps({'db_pool': dict(_pool_stats, event=event, size=_pool_size, idle=len(_pool_idle))})
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_alive(conn) -> bool:
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def get_connection():
+    '''Выдаёт соединение из пула, который живёт между тёплыми вызовами функции.
+
+    В лог пишется только рост пула (новое соединение) и его исчерпание (ожидание свободного).
+    '''
+    global _pool_size
+    started = time.monotonic()
+    exhausted = None
+    with _pool_cond:
+        now = time.monotonic()
+        for item in [i for i in _pool_idle if now - i[1] > DB_POOL_IDLE_TIMEOUT]:
+            _pool_idle.remove(item)
+            _close_quietly(item[0])
+            _pool_size -= 1
+            _pool_stats['evicted'] += 1
+        if not _pool_idle and _pool_size >= DB_POOL_MAX_SIZE:
+            _pool_stats['waits'] += 1
+            exhausted = _pool_snapshot('exhausted')
+            while not _pool_idle and _pool_size >= DB_POOL_MAX_SIZE:
+                _pool_cond.wait()
+        _pool_stats['wait_ms'] += (time.monotonic() - started) * 1000
+        if _pool_idle:
+            conn, last_used = _pool_idle.pop()
+        else:
+            conn, last_used = None, None
+            _pool_size += 1
+    if exhausted:
+        print(exhausted)
+
+    if conn is not None:
+        idle_for = time.monotonic() - last_used
+        if not conn.closed and (idle_for < DB_POOL_HEALTHCHECK_AFTER or _is_alive(conn)):
+            with _pool_cond:
+                _pool_stats['hits'] += 1
+            return conn
+        _close_quietly(conn)
+        with _pool_cond:
+            _pool_stats['evicted'] += 1
+
+    try:
+        with span('db.connect'):
+            conn = psycopg2.connect(os.environ['DATABASE_URL'], connection_factory=TracingConnection)
+    except Exception:
+        with _pool_cond:
+            _pool_size -= 1
+            _pool_cond.notify()
+        raise
+    with _pool_cond:
+        _pool_stats['misses'] += 1
+        grew = _pool_snapshot('grew')
+    print(grew)
+    return conn
+
+
+def release_connection(conn) -> None:
+    '''Возвращает соединение в пул; разорванные соединения отбрасываются'''
+    global _pool_size
+    if not conn.closed:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            _close_quietly(conn)
+    with _pool_cond:
+        if conn.closed:
+            _pool_size -= 1
+        else:
+            _pool_idle.append((conn, time.monotonic()))
+        _pool_cond.notify()
+        released = _pool_snapshot('released') if DB_POOL_LOG_EVERY_RELEASE else None
+    if released:
+        print(released)
+
+
+@contextmanager
+def db_connection():
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+# <<< runtime:pool
+
+
+# >>> runtime:etag
+def cached_json_response(event: dict, body: str) -> dict:
+    '''Отдаёт JSON с ETag и Cache-Control; на совпавший If-None-Match отвечает 304 без тела'''
+    etag = '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'Cache-Control': CACHE_CONTROL,
+        'ETag': etag
+    }
+    request_headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    if_none_match = request_headers.get('if-none-match', '')
+    candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    if etag in candidates or '*' in candidates:
+        return {'statusCode': 304, 'headers': headers, 'body': '', 'isBase64Encoded': False}
+    return {'statusCode': 200, 'headers': headers, 'body': body, 'isBase64Encoded': False}
+# <<< runtime:etag
+
+
+# >>> runtime:http
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_RESPONSE = {
+    'statusCode': 200,
+    'headers': {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': CORS_ALLOW_METHODS,
+        'Access-Control-Allow-Headers': CORS_ALLOW_HEADERS,
+        'Access-Control-Max-Age': '86400'
+    },
+    'body': '',
+    'isBase64Encoded': False
+}
+METHOD_NOT_ALLOWED_RESPONSE = {
+    'statusCode': 405,
+    'headers': JSON_HEADERS,
+    'body': '{"error": "Method not allowed"}',
+    'isBase64Encoded': False
+}
+
+
+class HttpError(Exception):
+    '''Ошибка с готовым HTTP-статусом; dispatch() превращает её в JSON-ответ'''
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(status: int, payload, headers: dict = JSON_HEADERS) -> dict:
+    body = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+    return {'statusCode': status, 'headers': headers, 'body': body, 'isBase64Encoded': False}
+
+
+def dispatch(routes: dict, event: dict, context, default_method: str = 'GET') -> dict:
+    '''Выбирает обработчик по HTTP-методу и переводит исключения в ответы.
+
+    Ответы на OPTIONS и неизвестный метод собраны заранее и не аллоцируются на каждый вызов.
+    Остальные запросы трассируются: участки БД, S3 и внешних HTTP-вызовов пишутся одной JSON-строкой в лог.
+    '''
+    method = event.get('httpMethod', default_method)
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
+        return PREFLIGHT_RESPONSE
+    route = routes.get(method)
+    if route is None:
+        return METHOD_NOT_ALLOWED_RESPONSE
+    spans = [] if TRACE_ENABLED else None
+    token = _trace_spans.set(spans)
+    started = time.perf_counter()
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        response = route(event, context)
+    except HttpError as e:
+        response = json_response(e.status, {'error': str(e)})
+    except json.JSONDecodeError:
+        response = json_response(400, {'error': 'Invalid JSON body'})
+    except Exception as e:
+        response = json_response(500, {'error': str(e)})
+    finally:
+        _trace_spans.reset(token)
+    if spans is None:
+        return response
+    return finish_trace(event, context, response, spans, started)
+# <<< runtime:http
+
+
+CACHE_CONTROL = os.environ.get('CACHE_CONTROL', 'public, max-age=60, stale-while-revalidate=600')
+
+
+CONTESTS_CACHE_TTL = float(os.environ.get('CONTESTS_CACHE_TTL', '30'))
+CONTESTS_CACHE_MAX_ENTRIES = int(os.environ.get('CONTESTS_CACHE_MAX_ENTRIES', '64'))
+
+_catalog_cache = OrderedDict()
+_catalog_cache_lock = threading.Lock()
+
+
+def catalog_version(cur) -> str:
+    '''Дешёвый отпечаток каталога: тёплые инстансы сверяют его вместо полного перечитывания.
+
+    participants_count меняется без обновления updated_at, поэтому счётчики входят в отпечаток отдельно.
+    '''
+    cur.execute('''
+        SELECT COUNT(*) AS total, MAX(updated_at) AS last_update,
+               md5(string_agg(id || ':' || COALESCE(participants_count, 0), ',' ORDER BY id)) AS participants
+        FROM contests
+    ''')
+    row = cur.fetchone()
+    return f"{row['total']}:{row['last_update']}:{row['participants']}"
+
+
+def catalog_cache_get(key: str):
+    with _catalog_cache_lock:
+        entry = _catalog_cache.get(key)
+        if entry is not None:
+            _catalog_cache.move_to_end(key)
+        return entry
+
+
+def catalog_cache_put(key: str, body: str, version: str) -> None:
+    with _catalog_cache_lock:
+        _catalog_cache[key] = {'body': body, 'version': version, 'checked_at': time.monotonic()}
+        _catalog_cache.move_to_end(key)
+        while len(_catalog_cache) > CONTESTS_CACHE_MAX_ENTRIES:
+            _catalog_cache.popitem(last=False)
+
+
+def catalog_cache_clear() -> None:
+    with _catalog_cache_lock:
+        _catalog_cache.clear()
+
+
+def list_contests(event: dict, context) -> dict:
+    params = event.get('queryStringParameters') or {}
+    category_id = params.get('category_id')
+    cache_key = category_id or '*'
+    cached = catalog_cache_get(cache_key)
+    if cached and time.monotonic() - cached['checked_at'] < CONTESTS_CACHE_TTL:
+        return cached_json_response(event, cached['body'])
+    
+    with db_connection() as conn:
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
-        if method == 'GET':
-            params = event.get('queryStringParameters') or {}
-            category_id = params.get('category_id')
-            
-            if category_id:
-                cur.execute("""
-                    SELECT id, title, description, category_id as "categoryId", 
-                           deadline, price, status, rules_file_url as "rulesLink",
-                           diploma_sample_url as "diplomaImage", image_url as image,
-                           participants_count as participants, is_popular as "isPopular"
-                    FROM contests 
-                    WHERE category_id = %s
-                    ORDER BY deadline ASC
-                """, (category_id,))
-            else:
-                cur.execute("""
-                    SELECT id, title, description, category_id as "categoryId", 
-                           deadline, price, status, rules_file_url as "rulesLink",
-                           diploma_sample_url as "diplomaImage", image_url as image,
-                           participants_count as participants, is_popular as "isPopular"
-                    FROM contests 
-                    ORDER BY deadline ASC
-                """)
-            
-            contests = cur.fetchall()
-            
-            for contest in contests:
-                if contest.get('deadline'):
-                    contest['deadline'] = contest['deadline'].strftime('%d %B %Y')
-            
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps(contests, ensure_ascii=False, default=str),
-                'isBase64Encoded': False
-            }
+        version = catalog_version(cur)
+        if cached and cached['version'] == version:
+            catalog_cache_put(cache_key, cached['body'], version)
+            return cached_json_response(event, cached['body'])
         
-        elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            
+        if category_id:
             cur.execute("""
-                INSERT INTO contests 
-                (title, description, category_id, deadline, price, status, 
-                 rules_file_url, diploma_sample_url, image_url, is_popular)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """, (
-                body.get('title'),
-                body.get('description'),
-                body.get('categoryId'),
-                body.get('deadline'),
-                body.get('price', 200),
-                body.get('status', 'active'),
-                body.get('rulesLink'),
-                body.get('diplomaImage'),
-                body.get('image'),
-                body.get('isPopular', False)
-            ))
-            
-            contest_id = cur.fetchone()['id']
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 201,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'id': contest_id, 'message': 'Конкурс создан'}),
-                'isBase64Encoded': False
-            }
-        
-        elif method == 'PUT':
-            body = json.loads(event.get('body', '{}'))
-            contest_id = body.get('id')
-            
+                SELECT id, title, description, category_id as "categoryId", 
+                       deadline, price, status, rules_file_url as "rulesLink",
+                       diploma_sample_url as "diplomaImage", image_url as image,
+                       participants_count as participants, is_popular as "isPopular"
+                FROM contests 
+                WHERE category_id = %s
+                ORDER BY deadline ASC
+            """, (category_id,))
+        else:
             cur.execute("""
-                UPDATE contests 
-                SET title = %s, description = %s, category_id = %s, deadline = %s,
-                    price = %s, status = %s, rules_file_url = %s, 
-                    diploma_sample_url = %s, image_url = %s, is_popular = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE id = %s
-            """, (
-                body.get('title'),
-                body.get('description'),
-                body.get('categoryId'),
-                body.get('deadline'),
-                body.get('price'),
-                body.get('status'),
-                body.get('rulesLink'),
-                body.get('diplomaImage'),
-                body.get('image'),
-                body.get('isPopular', False),
-                contest_id
-            ))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'message': 'Конкурс обновлен'}),
-                'isBase64Encoded': False
-            }
+                SELECT id, title, description, category_id as "categoryId", 
+                       deadline, price, status, rules_file_url as "rulesLink",
+                       diploma_sample_url as "diplomaImage", image_url as image,
+                       participants_count as participants, is_popular as "isPopular"
+                FROM contests 
+                ORDER BY deadline ASC
+            """)
         
-        elif method == 'DELETE':
-            params = event.get('queryStringParameters') or {}
-            contest_id = params.get('id')
-            
-            cur.execute("DELETE FROM contests WHERE id = %s", (contest_id,))
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({'message': 'Конкурс удален'}),
-                'isBase64Encoded': False
-            }
+        contests = cur.fetchall()
         
-        else:
-            return {
-                'statusCode': 405,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Method not allowed'}),
-                'isBase64Encoded': False
-            }
+        for contest in contests:
+            if contest.get('deadline'):
+                contest['deadline'] = contest['deadline'].strftime('%d %B %Y')
+        
+        cur.close()
     
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
\ No newline at end of file
+    body = json.dumps(contests, ensure_ascii=False, default=str)
+    catalog_cache_put(cache_key, body, version)
+    
+    return cached_json_response(event, body)
+
+
+def create_contest(event: dict, context) -> dict:
+    body = json.loads(event.get('body', '{}'))
+    
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("""
+            INSERT INTO contests 
+            (title, description, category_id, deadline, price, status, 
+             rules_file_url, diploma_sample_url, image_url, is_popular)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
+        """, (
+            body.get('title'),
+            body.get('description'),
+            body.get('categoryId'),
+            body.get('deadline'),
+            body.get('price', 200),
+            body.get('status', 'active'),
+            body.get('rulesLink'),
+            body.get('diplomaImage'),
+            body.get('image'),
+            body.get('isPopular', False)
+        ))
+        
+        contest_id = cur.fetchone()['id']
+        conn.commit()
+        catalog_cache_clear()
+        cur.close()
+    
+    return json_response(201, {'id': contest_id, 'message': 'Конкурс создан'})
+
+
+def update_contest(event: dict, context) -> dict:
+    body = json.loads(event.get('body', '{}'))
+    contest_id = body.get('id')
+    
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("""
+            UPDATE contests 
+            SET title = %s, description = %s, category_id = %s, deadline = %s,
+                price = %s, status = %s, rules_file_url = %s, 
+                diploma_sample_url = %s, image_url = %s, is_popular = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (
+            body.get('title'),
+            body.get('description'),
+            body.get('categoryId'),
+            body.get('deadline'),
+            body.get('price'),
+            body.get('status'),
+            body.get('rulesLink'),
+            body.get('diplomaImage'),
+            body.get('image'),
+            body.get('isPopular', False),
+            contest_id
+        ))
+        
+        conn.commit()
+        catalog_cache_clear()
+        cur.close()
+    
+    return json_response(200, {'message': 'Конкурс обновлен'})
+
+
+def delete_contest(event: dict, context) -> dict:
+    params = event.get('queryStringParameters') or {}
+    contest_id = params.get('id')
+    
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("DELETE FROM contests WHERE id = %s", (contest_id,))
+        conn.commit()
+        catalog_cache_clear()
+        cur.close()
+    
+    return json_response(200, {'message': 'Конкурс удален'})
+
+
+ROUTES = {
+    'GET': list_contests,
+    'POST': create_contest,
+    'PUT': update_contest,
+    'DELETE': delete_contest
+}
+
+
+def handler(event: dict, context) -> dict:
+    """API для управления конкурсами: получение списка, создание, обновление и удаление конкурсов"""
+    return dispatch(ROUTES, event, context)
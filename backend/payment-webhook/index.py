@@ -1,98 +1,445 @@
 import json
 import os
+import contextvars
+import re
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import hashlib
+import threading
+import time
+from contextlib import contextmanager
 
 
-def handler(event: dict, context) -> dict:
-    '''Обработка webhook от ЮКассы для подтверждения оплаты'''
+# Блоки между маркерами runtime:* — копии секций backend/_runtime.py; правятся там и переносятся scripts/sync_runtime.py
+CORS_ALLOW_METHODS = 'POST, OPTIONS'
+CORS_ALLOW_HEADERS = 'Content-Type'
+
+
+# >>> runtime:trace
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', 'true') == 'true'
+TRACE_SERVER_TIMING = os.environ.get('TRACE_SERVER_TIMING', 'false') == 'true'
+TRACE_MAX_SPANS = int(os.environ.get('TRACE_MAX_SPANS', '200'))
+_trace_spans = contextvars.ContextVar('trace_spans', default=None)
+
+
+def record_span(name: str, detail, started: float) -> None:
+    '''Добавляет завершившийся участок в трассу текущего запроса, если она ведётся'''
+    spans = _trace_spans.get()
+    if spans is not None and len(spans) < TRACE_MAX_SPANS:
+        spans.append((name, detail, started, time.perf_counter()))
+
+
+def finish_trace(event: dict, context, response: dict, spans: list, started: float) -> dict:
+    '''Пишет трассу запроса одной JSON-строкой и при TRACE_SERVER_TIMING добавляет заголовок Server-Timing'''
+    total_ms = (time.perf_counter() - started) * 1000
+    totals = {}
+    for name, _, span_started, span_ended in spans:
+        count, ms = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, ms + (span_ended - span_started) * 1000)
+    print(json.dumps({'trace': {
+        'request_id': getattr(context, 'request_id', None),
+        'method': event.get('httpMethod'),
+        'status': response.get('statusCode'),
+        'total_ms': round(total_ms, 2),
+        'totals': {name: {'count': count, 'ms': round(ms, 2)} for name, (count, ms) in totals.items()},
+        'spans': [
+            {'name': name, 'detail': detail, 'at_ms': round((s - started) * 1000, 2), 'ms': round((e - s) * 1000, 2)}
+            for name, detail, s, e in spans
+        ]
+    }}, ensure_ascii=False, default=str))
+    if TRACE_SERVER_TIMING:
+        timing = ', '.join(
+            [f'{name};dur={ms:.1f};desc="{count}"' for name, (count, ms) in totals.items()] + [f'app;dur={total_ms:.1f}']
+        )
+        headers = dict(response.get('headers') or {})
+        headers['Server-Timing'] = headers['Server-Timing'] + ', ' + timing if headers.get('Server-Timing') else timing
+        if 'Server-Timing' not in headers.get('Access-Control-Expose-Headers', ''):
+            headers['Access-Control-Expose-Headers'] = ', '.join(
+                filter(None, [headers.get('Access-Control-Expose-Headers'), 'Server-Timing'])
+            )
+        response = dict(response, headers=headers)
+    return response
+# <<< runtime:trace
+
+
+# >>> runtime:span
+@contextmanager
+def span(name: str, detail=None):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, detail, started)
+# <<< runtime:span
+
+
+# >>> runtime:sql-trace
+TRACE_SQL_MAX_LENGTH = int(os.environ.get('TRACE_SQL_MAX_LENGTH', '300'))
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_normalized_sql = {}
+_traced_cursor_classes = {}
+_query_observers = []
+
+
+def normalize_sql(query) -> str:
+    '''Текст запроса без литералов и лишних пробелов; результат кешируется по исходной строке'''
+    text = _normalized_sql.get(query)
+    if text is None:
+        raw = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+        text = _SQL_LITERALS.sub('?', ' '.join(raw.split()))[:TRACE_SQL_MAX_LENGTH]
+        if len(_normalized_sql) < 1024:
+            _normalized_sql[query] = text
+    return text
+
+
+def traced_cursor_class(base):
+    '''Подкласс курсора, который засекает execute/executemany/copy_expert как участки db.query'''
+    cls = _traced_cursor_classes.get(base)
+    if cls is None:
+        class TracedCursor(base):
+            def execute(self, query, vars=None):
+                if _trace_spans.get() is None and not _query_observers:
+                    return super().execute(query, vars)
+                started = time.perf_counter()
+                with span('db.query', normalize_sql(query)):
+                    result = super().execute(query, vars)
+                # У именованного курсора execute — это только DECLARE; его выборку наблюдателям отдаёт stream_json_array
+                if self.name is None:
+                    for observer in _query_observers:
+                        observer(self.connection, query, vars, started)
+                return result
+
+            def executemany(self, query, vars_list):
+                if _trace_spans.get() is None:
+                    return super().executemany(query, vars_list)
+                with span('db.query', normalize_sql(query)):
+                    return super().executemany(query, vars_list)
+
+            def copy_expert(self, sql, file, size=8192):
+                if _trace_spans.get() is None:
+                    return super().copy_expert(sql, file, size)
+                with span('db.copy', normalize_sql(sql)):
+                    return super().copy_expert(sql, file, size)
+
+        cls = _traced_cursor_classes[base] = TracedCursor
+    return cls
+
+
+class TracingConnection(psycopg2.extensions.connection):
+    '''Соединение, все курсоры которого (включая RealDictCursor и именованные) пишут участки в трассу'''
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = traced_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+# <<< runtime:sql-trace
+
+
+# >>> runtime:pool
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_HEALTHCHECK_AFTER = float(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', '30'))
+DB_POOL_LOG_EVERY_RELEASE = os.environ.get('DB_POOL_LOG_EVERY_RELEASE', 'false') == 'true'
+_pool_cond = threading.Condition()
+_pool_idle = []
+_pool_size = 0
+_pool_stats = {'hits': 0, 'misses': 0, 'waits': 0, 'wait_ms': 0.0, 'evicted': 0}
+
+
+def _pool_snapshot(event: str) -> str:
+    '''Строка лога со счётчиками пула; собирается под _pool_cond, печатается уже без блокировки'''
+    return json.dumps({'db_pool': dict(_pool_stats, event=event, size=_pool_size, idle=len(_pool_idle))})
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_alive(conn) -> bool:
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def get_connection():
+    '''Выдаёт соединение из пула, который живёт между тёплыми вызовами функции.
+
+    В лог пишется только рост пула (новое соединение) и его исчерпание (ожидание свободного).
+    '''
+    global _pool_size
+    started = time.monotonic()
+    exhausted = None
+    with _pool_cond:
+        now = time.monotonic()
+        for item in [i for i in _pool_idle if now - i[1] > DB_POOL_IDLE_TIMEOUT]:
+            _pool_idle.remove(item)
+            _close_quietly(item[0])
+            _pool_size -= 1
+            _pool_stats['evicted'] += 1
+        if not _pool_idle and _pool_size >= DB_POOL_MAX_SIZE:
+            _pool_stats['waits'] += 1
+            exhausted = _pool_snapshot('exhausted')
+            while not _pool_idle and _pool_size >= DB_POOL_MAX_SIZE:
+                _pool_cond.wait()
+        _pool_stats['wait_ms'] += (time.monotonic() - started) * 1000
+        if _pool_idle:
+            conn, last_used = _pool_idle.pop()
+        else:
+            conn, last_used = None, None
+            _pool_size += 1
+    if exhausted:
+        print(exhausted)
+
+    if conn is not None:
+        idle_for = time.monotonic() - last_used
+        if not conn.closed and (idle_for < DB_POOL_HEALTHCHECK_AFTER or _is_alive(conn)):
+            with _pool_cond:
+                _pool_stats['hits'] += 1
+            return conn
+        _close_quietly(conn)
+        with _pool_cond:
+            _pool_stats['evicted'] += 1
+
+    try:
+        with span('db.connect'):
+            conn = psycopg2.connect(os.environ['DATABASE_URL'], connection_factory=TracingConnection)
+    except Exception:
+        with _pool_cond:
+            _pool_size -= 1
+            _pool_cond.notify()
+        raise
+    with _pool_cond:
+        _pool_stats['misses'] += 1
+        grew = _pool_snapshot('grew')
+    print(grew)
+    return conn
+
+
+def release_connection(conn) -> None:
+    '''Возвращает соединение в пул; разорванные соединения отбрасываются'''
+    global _pool_size
+    if not conn.closed:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            _close_quietly(conn)
+    with _pool_cond:
+        if conn.closed:
+            _pool_size -= 1
+        else:
+            _pool_idle.append((conn, time.monotonic()))
+        _pool_cond.notify()
+        released = _pool_snapshot('released') if DB_POOL_LOG_EVERY_RELEASE else None
+    if released:
+        print(released)
+
+
+@contextmanager
+def db_connection():
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+# <<< runtime:pool
+
+
+# >>> runtime:http
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_RESPONSE = {
+    'statusCode': 200,
+    'headers': {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': CORS_ALLOW_METHODS,
+        'Access-Control-Allow-Headers': CORS_ALLOW_HEADERS,
+        'Access-Control-Max-Age': '86400'
+    },
+    'body': '',
+    'isBase64Encoded': False
+}
+METHOD_NOT_ALLOWED_RESPONSE = {
+    'statusCode': 405,
+    'headers': JSON_HEADERS,
+    'body': '{"error": "Method not allowed"}',
+    'isBase64Encoded': False
+}
+
+
+class HttpError(Exception):
+    '''Ошибка с готовым HTTP-статусом; dispatch() превращает её в JSON-ответ'''
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(status: int, payload, headers: dict = JSON_HEADERS) -> dict:
+    body = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+    return {'statusCode': status, 'headers': headers, 'body': body, 'isBase64Encoded': False}
+
+
+def dispatch(routes: dict, event: dict, context, default_method: str = 'GET') -> dict:
+    '''Выбирает обработчик по HTTP-методу и переводит исключения в ответы.
+
+    Ответы на OPTIONS и неизвестный метод собраны заранее и не аллоцируются на каждый вызов.
+    Остальные запросы трассируются: участки БД, S3 и внешних HTTP-вызовов пишутся одной JSON-строкой в лог.
+    '''
+    method = event.get('httpMethod', default_method)
+    if method == 'OPTIONS':
+        return PREFLIGHT_RESPONSE
+    route = routes.get(method)
+    if route is None:
+        return METHOD_NOT_ALLOWED_RESPONSE
+    spans = [] if TRACE_ENABLED else None
+    token = _trace_spans.set(spans)
+    started = time.perf_counter()
+    try:
+        response = route(event, context)
+    except HttpError as e:
+        response = json_response(e.status, {'error': str(e)})
+    except json.JSONDecodeError:
+        response = json_response(400, {'error': 'Invalid JSON body'})
+    except Exception as e:
+        response = json_response(500, {'error': str(e)})
+    finally:
+        _trace_spans.reset(token)
+    if spans is None:
+        return response
+    return finish_trace(event, context, response, spans, started)
+# <<< runtime:http
+
+
+WEBHOOK_MODE = os.environ.get('WEBHOOK_MODE', 'inline')
+WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', '200'))
+WEBHOOK_FLUSH_INTERVAL = float(os.environ.get('WEBHOOK_FLUSH_INTERVAL', '5'))
+
+_last_drain = float('-inf')
+
+
+def drain_payment_events(conn, batch_size: int = WEBHOOK_BATCH_SIZE) -> int:
+    '''Применяет пачку накопленных событий к applications одним UPDATE; возвращает число событий'''
+    global _last_drain
+    _last_drain = time.monotonic()
+    with conn.cursor() as cur:
+        cur.execute("""
+            WITH batch AS (
+                SELECT id, application_id, status
+                FROM payment_events
+                WHERE processed_at IS NULL
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ), applied AS (
+                UPDATE applications AS a
+                SET status = 'paid', payment_status = batch.status
+                FROM batch
+                WHERE a.id = batch.application_id
+            )
+            UPDATE payment_events AS e
+            SET processed_at = CURRENT_TIMESTAMP
+            FROM batch
+            WHERE e.id = batch.id
+        """, (batch_size,))
+        drained = cur.rowcount
+    conn.commit()
+    return drained
+
+
+def parse_application_id(value):
+    '''application_id из metadata ЮКассы (строка или число); None, если это не положительное INTEGER'''
+    if isinstance(value, str) and re.fullmatch(r'\d{1,10}', value.strip()):
+        value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and 0 < value < 2 ** 31:
+        return value
+    return None
+
+
+def receive_notification(event: dict, context) -> dict:
+    '''Принимает уведомление payment.succeeded: inline — сразу отмечает оплату, queue — кладёт в очередь'''
+    body = json.loads(event.get('body', '{}'))
     
-    method = event.get('httpMethod', 'POST')
+    event_type = body.get('event')
+    payment_obj = body.get('object', {})
     
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': ''
-        }
+    if event_type != 'payment.succeeded':
+        return json_response(200, {'status': 'ignored', 'event': event_type})
     
-    if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+    payment_id = payment_obj.get('id')
+    status = payment_obj.get('status')
+    metadata = payment_obj.get('metadata', {})
+    application_id = metadata.get('application_id')
     
-    try:
-        body = json.loads(event.get('body', '{}'))
-        
-        event_type = body.get('event')
-        payment_obj = body.get('object', {})
-        
-        if event_type != 'payment.succeeded':
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'status': 'ignored', 'event': event_type})
-            }
-        
-        payment_id = payment_obj.get('id')
-        status = payment_obj.get('status')
-        metadata = payment_obj.get('metadata', {})
-        application_id = metadata.get('application_id')
-        
-        if not application_id:
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'Missing application_id in metadata'})
-            }
+    if not application_id:
+        return json_response(400, {'error': 'Missing application_id in metadata'})
+    # Нецелый id иначе уронил бы вставку в payment_events ошибкой приведения типа (500)
+    application_id = parse_application_id(application_id)
+    if application_id is None:
+        return json_response(400, {'error': 'Invalid application_id in metadata'})
+    
+    if not payment_id:
+        return json_response(400, {'error': 'Missing payment id'})
+    
+    if status != 'succeeded':
+        return json_response(200, {'status': 'processed', 'payment_status': status})
+    
+    if WEBHOOK_MODE == 'queue':
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO payment_events (payment_id, event, application_id, status)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (payment_id, event) DO NOTHING
+                """, (payment_id, event_type, application_id, status))
+                recorded = cur.rowcount
+            conn.commit()
+            
+            if time.monotonic() - _last_drain >= WEBHOOK_FLUSH_INTERVAL:
+                drain_payment_events(conn)
         
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
+        return json_response(200, {
+            'status': 'queued' if recorded else 'duplicate',
+            'application_id': application_id,
+            'payment_status': status
+        })
+    
+    with db_connection() as conn:
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
-        if status == 'succeeded':
-            cur.execute(
-                "UPDATE applications SET status = 'paid', payment_status = %s WHERE id = %s",
-                (status, application_id)
+        # Повторные доставки ЮКассы упираются в уникальный ключ и не трогают applications
+        cur.execute("""
+            WITH event AS (
+                INSERT INTO payment_events (payment_id, event, application_id, status, processed_at)
+                VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (payment_id, event) DO NOTHING
+                RETURNING application_id
+            ), updated AS (
+                UPDATE applications SET status = 'paid', payment_status = %s
+                WHERE id IN (SELECT application_id FROM event)
+                RETURNING id
             )
-            conn.commit()
-            
-            cur.execute("SELECT * FROM applications WHERE id = %s", (application_id,))
-            application = cur.fetchone()
-            
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'status': 'success',
-                    'application_id': application_id,
-                    'payment_status': status,
-                    'application': dict(application) if application else None
-                })
-            }
-        
+            SELECT (SELECT COUNT(*) FROM event) AS recorded, (SELECT COUNT(*) FROM updated) AS updated
+        """, (payment_id, event_type, application_id, status, status))
+        outcome = cur.fetchone()
+        conn.commit()
         cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'status': 'processed', 'payment_status': status})
-        }
-        
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
+    
+    return json_response(200, {
+        'status': 'success' if outcome['recorded'] else 'duplicate',
+        'application_id': application_id,
+        'payment_status': status
+    })
+
+
+ROUTES = {'POST': receive_notification}
+
+
+def handler(event: dict, context) -> dict:
+    '''Обработка webhook от ЮКассы для подтверждения оплаты'''
+    return dispatch(ROUTES, event, context, default_method='POST')
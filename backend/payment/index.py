@@ -1,192 +1,661 @@
 import json
 import os
+import contextvars
+import re
 import uuid
-import requests
+import random
 import psycopg2
-import boto3
 import base64
 from base64 import b64encode
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
-def handler(event: dict, context) -> dict:
-    '''API для создания платежа через ЮКассу'''
-    
-    method = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    if method == 'POST':
+
+# Блоки между маркерами runtime:* — копии секций backend/_runtime.py; правятся там и переносятся scripts/sync_runtime.py
+CORS_ALLOW_METHODS = 'POST, OPTIONS'
+CORS_ALLOW_HEADERS = 'Content-Type'
+
+
+# >>> runtime:trace
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', 'true') == 'true'
+TRACE_SERVER_TIMING = os.environ.get('TRACE_SERVER_TIMING', 'false') == 'true'
+TRACE_MAX_SPANS = int(os.environ.get('TRACE_MAX_SPANS', '200'))
+_trace_spans = contextvars.ContextVar('trace_spans', default=None)
+
+
+def record_span(name: str, detail, started: float) -> None:
+    '''Добавляет завершившийся участок в трассу текущего запроса, если она ведётся'''
+    spans = _trace_spans.get()
+    if spans is not None and len(spans) < TRACE_MAX_SPANS:
+        spans.append((name, detail, started, time.perf_counter()))
+
+
+def finish_trace(event: dict, context, response: dict, spans: list, started: float) -> dict:
+    '''Пишет трассу запроса одной JSON-строкой и при TRACE_SERVER_TIMING добавляет заголовок Server-Timing'''
+    total_ms = (time.perf_counter() - started) * 1000
+    totals = {}
+    for name, _, span_started, span_ended in spans:
+        count, ms = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, ms + (span_ended - span_started) * 1000)
+    print(json.dumps({'trace': {
+        'request_id': getattr(context, 'request_id', None),
+        'method': event.get('httpMethod'),
+        'status': response.get('statusCode'),
+        'total_ms': round(total_ms, 2),
+        'totals': {name: {'count': count, 'ms': round(ms, 2)} for name, (count, ms) in totals.items()},
+        'spans': [
+            {'name': name, 'detail': detail, 'at_ms': round((s - started) * 1000, 2), 'ms': round((e - s) * 1000, 2)}
+            for name, detail, s, e in spans
+        ]
+    }}, ensure_ascii=False, default=str))
+    if TRACE_SERVER_TIMING:
+        timing = ', '.join(
+            [f'{name};dur={ms:.1f};desc="{count}"' for name, (count, ms) in totals.items()] + [f'app;dur={total_ms:.1f}']
+        )
+        headers = dict(response.get('headers') or {})
+        headers['Server-Timing'] = headers['Server-Timing'] + ', ' + timing if headers.get('Server-Timing') else timing
+        if 'Server-Timing' not in headers.get('Access-Control-Expose-Headers', ''):
+            headers['Access-Control-Expose-Headers'] = ', '.join(
+                filter(None, [headers.get('Access-Control-Expose-Headers'), 'Server-Timing'])
+            )
+        response = dict(response, headers=headers)
+    return response
+# <<< runtime:trace
+
+
+# >>> runtime:span
+@contextmanager
+def span(name: str, detail=None):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, detail, started)
+# <<< runtime:span
+
+
+# >>> runtime:sql-trace
+TRACE_SQL_MAX_LENGTH = int(os.environ.get('TRACE_SQL_MAX_LENGTH', '300'))
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_normalized_sql = {}
+_traced_cursor_classes = {}
+_query_observers = []
+
+
+def normalize_sql(query) -> str:
+    '''Текст запроса без литералов и лишних пробелов; результат кешируется по исходной строке'''
+    text = _normalized_sql.get(query)
+    if text is None:
+        raw = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+        text = _SQL_LITERALS.sub('?', ' '.join(raw.split()))[:TRACE_SQL_MAX_LENGTH]
+        if len(_normalized_sql) < 1024:
+            _normalized_sql[query] = text
+    return text
+
+
+def traced_cursor_class(base):
+    '''Подкласс курсора, который засекает execute/executemany/copy_expert как участки db.query'''
+    cls = _traced_cursor_classes.get(base)
+    if cls is None:
+        class TracedCursor(base):
+            def execute(self, query, vars=None):
+                if _trace_spans.get() is None and not _query_observers:
+                    return super().execute(query, vars)
+                started = time.perf_counter()
+                with span('db.query', normalize_sql(query)):
+                    result = super().execute(query, vars)
+                # У именованного курсора execute — это только DECLARE; его выборку наблюдателям отдаёт stream_json_array
+                if self.name is None:
+                    for observer in _query_observers:
+                        observer(self.connection, query, vars, started)
+                return result
+
+            def executemany(self, query, vars_list):
+                if _trace_spans.get() is None:
+                    return super().executemany(query, vars_list)
+                with span('db.query', normalize_sql(query)):
+                    return super().executemany(query, vars_list)
+
+            def copy_expert(self, sql, file, size=8192):
+                if _trace_spans.get() is None:
+                    return super().copy_expert(sql, file, size)
+                with span('db.copy', normalize_sql(sql)):
+                    return super().copy_expert(sql, file, size)
+
+        cls = _traced_cursor_classes[base] = TracedCursor
+    return cls
+
+
+class TracingConnection(psycopg2.extensions.connection):
+    '''Соединение, все курсоры которого (включая RealDictCursor и именованные) пишут участки в трассу'''
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = traced_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+# <<< runtime:sql-trace
+
+
+# >>> runtime:pool
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_HEALTHCHECK_AFTER = float(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', '30'))
+DB_POOL_LOG_EVERY_RELEASE = os.environ.get('DB_POOL_LOG_EVERY_RELEASE', 'false') == 'true'
+_pool_cond = threading.Condition()
+_pool_idle = []
+_pool_size = 0
+_pool_stats = {'hits': 0, 'misses': 0, 'waits': 0, 'wait_ms': 0.0, 'evicted': 0}
+
+
+def _pool_snapshot(event: str) -> str:
+    '''Строка лога со счётчиками пула; собирается под _pool_cond, печатается уже без блокировки'''
+    return json.dumps({'db_pool': dict(_pool_stats, event=event, size=_pool_size, idle=len(_pool_idle))})
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_alive(conn) -> bool:
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def get_connection():
+    '''Выдаёт соединение из пула, который живёт между тёплыми вызовами функции.
+
+    В лог пишется только рост пула (новое соединение) и его исчерпание (ожидание свободного).
+    '''
+    global _pool_size
+    started = time.monotonic()
+    exhausted = None
+    with _pool_cond:
+        now = time.monotonic()
+        for item in [i for i in _pool_idle if now - i[1] > DB_POOL_IDLE_TIMEOUT]:
+            _pool_idle.remove(item)
+            _close_quietly(item[0])
+            _pool_size -= 1
+            _pool_stats['evicted'] += 1
+        if not _pool_idle and _pool_size >= DB_POOL_MAX_SIZE:
+            _pool_stats['waits'] += 1
+            exhausted = _pool_snapshot('exhausted')
+            while not _pool_idle and _pool_size >= DB_POOL_MAX_SIZE:
+                _pool_cond.wait()
+        _pool_stats['wait_ms'] += (time.monotonic() - started) * 1000
+        if _pool_idle:
+            conn, last_used = _pool_idle.pop()
+        else:
+            conn, last_used = None, None
+            _pool_size += 1
+    if exhausted:
+        print(exhausted)
+
+    if conn is not None:
+        idle_for = time.monotonic() - last_used
+        if not conn.closed and (idle_for < DB_POOL_HEALTHCHECK_AFTER or _is_alive(conn)):
+            with _pool_cond:
+                _pool_stats['hits'] += 1
+            return conn
+        _close_quietly(conn)
+        with _pool_cond:
+            _pool_stats['evicted'] += 1
+
+    try:
+        with span('db.connect'):
+            conn = psycopg2.connect(os.environ['DATABASE_URL'], connection_factory=TracingConnection)
+    except Exception:
+        with _pool_cond:
+            _pool_size -= 1
+            _pool_cond.notify()
+        raise
+    with _pool_cond:
+        _pool_stats['misses'] += 1
+        grew = _pool_snapshot('grew')
+    print(grew)
+    return conn
+
+
+def release_connection(conn) -> None:
+    '''Возвращает соединение в пул; разорванные соединения отбрасываются'''
+    global _pool_size
+    if not conn.closed:
         try:
-            body = json.loads(event.get('body', '{}'))
-            
-            amount = body.get('amount')
-            description = body.get('description')
-            contest_name = body.get('contest_name')
-            email = body.get('email')
-            application_data = body.get('application_data', {})
-            
-            if not amount or not description or not application_data:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Missing required fields'}),
-                    'isBase64Encoded': False
-                }
-            
-            database_url = os.environ.get('DATABASE_URL')
-            if not database_url:
-                return {
-                    'statusCode': 500,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Database not configured'}),
-                    'isBase64Encoded': False
-                }
-            
-            work_file_url = ''
-            work_file = application_data.get('work_file')
-            file_name = application_data.get('file_name')
-            file_type = application_data.get('file_type')
-            
-            if work_file and file_name:
-                try:
-                    aws_access_key = os.environ.get('AWS_ACCESS_KEY_ID')
-                    aws_secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
-                    
-                    s3 = boto3.client('s3',
-                        endpoint_url='https://bucket.poehali.dev',
-                        aws_access_key_id=aws_access_key,
-                        aws_secret_access_key=aws_secret_key
-                    )
-                    
-                    file_data = base64.b64decode(work_file)
-                    file_key = f'works/{file_name}'
-                    
-                    s3.put_object(
-                        Bucket='files',
-                        Key=file_key,
-                        Body=file_data,
-                        ContentType=file_type
+            conn.rollback()
+        except psycopg2.Error:
+            _close_quietly(conn)
+    with _pool_cond:
+        if conn.closed:
+            _pool_size -= 1
+        else:
+            _pool_idle.append((conn, time.monotonic()))
+        _pool_cond.notify()
+        released = _pool_snapshot('released') if DB_POOL_LOG_EVERY_RELEASE else None
+    if released:
+        print(released)
+
+
+@contextmanager
+def db_connection():
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+# <<< runtime:pool
+
+
+# >>> runtime:http
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_RESPONSE = {
+    'statusCode': 200,
+    'headers': {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': CORS_ALLOW_METHODS,
+        'Access-Control-Allow-Headers': CORS_ALLOW_HEADERS,
+        'Access-Control-Max-Age': '86400'
+    },
+    'body': '',
+    'isBase64Encoded': False
+}
+METHOD_NOT_ALLOWED_RESPONSE = {
+    'statusCode': 405,
+    'headers': JSON_HEADERS,
+    'body': '{"error": "Method not allowed"}',
+    'isBase64Encoded': False
+}
+
+
+class HttpError(Exception):
+    '''Ошибка с готовым HTTP-статусом; dispatch() превращает её в JSON-ответ'''
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(status: int, payload, headers: dict = JSON_HEADERS) -> dict:
+    body = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+    return {'statusCode': status, 'headers': headers, 'body': body, 'isBase64Encoded': False}
+
+
+def dispatch(routes: dict, event: dict, context, default_method: str = 'GET') -> dict:
+    '''Выбирает обработчик по HTTP-методу и переводит исключения в ответы.
+
+    Ответы на OPTIONS и неизвестный метод собраны заранее и не аллоцируются на каждый вызов.
+    Остальные запросы трассируются: участки БД, S3 и внешних HTTP-вызовов пишутся одной JSON-строкой в лог.
+    '''
+    method = event.get('httpMethod', default_method)
+    if method == 'OPTIONS':
+        return PREFLIGHT_RESPONSE
+    route = routes.get(method)
+    if route is None:
+        return METHOD_NOT_ALLOWED_RESPONSE
+    spans = [] if TRACE_ENABLED else None
+    token = _trace_spans.set(spans)
+    started = time.perf_counter()
+    try:
+        response = route(event, context)
+    except HttpError as e:
+        response = json_response(e.status, {'error': str(e)})
+    except json.JSONDecodeError:
+        response = json_response(400, {'error': 'Invalid JSON body'})
+    except Exception as e:
+        response = json_response(500, {'error': str(e)})
+    finally:
+        _trace_spans.reset(token)
+    if spans is None:
+        return response
+    return finish_trace(event, context, response, spans, started)
+# <<< runtime:http
+
+
+# >>> runtime:s3
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '10'))
+S3_MAX_ATTEMPTS = int(os.environ.get('S3_MAX_ATTEMPTS', '3'))
+_s3_client = None
+_s3_lock = threading.Lock()
+
+
+def _s3_before_call(context, model=None, **kwargs):
+    context['trace_started'] = time.perf_counter()
+    context['trace_operation'] = model.name if model is not None else kwargs.get('event_name', '').rsplit('.', 1)[-1]
+
+
+def _s3_after_call(context, **kwargs):
+    if 'trace_started' in context:
+        record_span('s3.' + context.pop('trace_operation', ''), None, context.pop('trace_started'))
+
+
+def _s3_after_call_error(context, exception=None, **kwargs):
+    # botocore передаёт сюда только exception и context; исключение из обработчика заслонило бы ошибку S3
+    if 'trace_started' in context:
+        record_span(
+            's3.' + context.pop('trace_operation', ''),
+            {'error': type(exception).__name__},
+            context.pop('trace_started')
+        )
+
+
+def instrument_s3(client):
+    '''Засекает каждый вызов S3 через события botocore как участок s3.<Операция>'''
+    client.meta.events.register('before-call.s3', _s3_before_call)
+    client.meta.events.register('after-call.s3', _s3_after_call)
+    client.meta.events.register('after-call-error.s3', _s3_after_call_error)
+    return client
+
+
+def get_s3_client():
+    '''Клиент S3 создаётся один раз на инстанс и переиспользует keep-alive соединения'''
+    global _s3_client
+    if _s3_client is None:
+        with _s3_lock:
+            if _s3_client is None:
+                import boto3
+                from botocore.config import Config
+                _s3_client = boto3.client('s3',
+                    endpoint_url='https://bucket.poehali.dev',
+                    aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+                    aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],
+                    config=Config(
+                        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                        retries={'max_attempts': S3_MAX_ATTEMPTS, 'mode': 'standard'},
+                        connect_timeout=5,
+                        read_timeout=60,
+                        tcp_keepalive=True
                     )
-                    
-                    work_file_url = f"https://cdn.poehali.dev/projects/{aws_access_key}/bucket/{file_key}"
-                except Exception as s3_error:
-                    print(f"S3 upload error: {s3_error}")
-            
-            conn = psycopg2.connect(database_url)
-            cur = conn.cursor()
-            
-            cur.execute(
-                '''INSERT INTO applications 
-                   (full_name, age, teacher, institution, work_title, email, contest_name, 
-                    work_file, file_name, file_type, gallery_consent, payment_status, work_file_url, created_at)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-                   RETURNING id''',
-                (
-                    application_data.get('full_name'),
-                    application_data.get('age'),
-                    application_data.get('teacher'),
-                    application_data.get('institution'),
-                    application_data.get('work_title'),
-                    application_data.get('email'),
-                    application_data.get('contest_name'),
-                    work_file,
-                    file_name,
-                    file_type,
-                    application_data.get('gallery_consent', False),
-                    'pending',
-                    work_file_url
                 )
+                instrument_s3(_s3_client)
+    return _s3_client
+# <<< runtime:s3
+
+
+STORE_INLINE_WORK_FILE = os.environ.get('STORE_INLINE_WORK_FILE', 'false') == 'true'
+
+
+YOOKASSA_API_URL = os.environ.get('YOOKASSA_API_URL', 'https://api.yookassa.ru/v3')
+YOOKASSA_CONNECT_TIMEOUT = float(os.environ.get('YOOKASSA_CONNECT_TIMEOUT', '3'))
+YOOKASSA_READ_TIMEOUT = float(os.environ.get('YOOKASSA_READ_TIMEOUT', '10'))
+YOOKASSA_MAX_RETRIES = int(os.environ.get('YOOKASSA_MAX_RETRIES', '2'))
+YOOKASSA_BACKOFF = float(os.environ.get('YOOKASSA_BACKOFF', '0.3'))
+
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_http_session = None
+_http_lock = threading.Lock()
+_yookassa_latency = {'count': 0, 'sum_ms': 0.0, 'buckets': dict.fromkeys([*map(str, LATENCY_BUCKETS_MS), '+Inf'], 0)}
+
+
+def get_http_session():
+    '''Одна requests.Session на инстанс: keep-alive соединения к ЮКассе переживают тёплые вызовы'''
+    global _http_session
+    if _http_session is None:
+        with _http_lock:
+            if _http_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+                session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+                _http_session = session
+    return _http_session
+
+
+def observe_yookassa_latency(elapsed_ms: float, outcome: str) -> None:
+    _yookassa_latency['count'] += 1
+    _yookassa_latency['sum_ms'] += elapsed_ms
+    bucket = next((str(b) for b in LATENCY_BUCKETS_MS if elapsed_ms <= b), '+Inf')
+    _yookassa_latency['buckets'][bucket] += 1
+    print(json.dumps({'yookassa_call': {'elapsed_ms': round(elapsed_ms, 1), 'outcome': outcome}, 'histogram': _yookassa_latency}))
+
+
+def yookassa_post(path: str, payload: dict, headers: dict):
+    '''POST в ЮКассу с таймаутами и повторами; Idempotence-Key в headers одинаков для всех попыток'''
+    import requests
+    session = get_http_session()
+    for attempt in range(YOOKASSA_MAX_RETRIES + 1):
+        last_attempt = attempt == YOOKASSA_MAX_RETRIES
+        started = time.monotonic()
+        try:
+            with span('http.yookassa', path):
+                response = session.post(
+                    YOOKASSA_API_URL + path,
+                    json=payload,
+                    headers=headers,
+                    timeout=(YOOKASSA_CONNECT_TIMEOUT, YOOKASSA_READ_TIMEOUT)
+                )
+        except (requests.ConnectionError, requests.Timeout) as error:
+            observe_yookassa_latency((time.monotonic() - started) * 1000, type(error).__name__)
+            if last_attempt:
+                raise
+        else:
+            observe_yookassa_latency((time.monotonic() - started) * 1000, str(response.status_code))
+            if last_attempt or (response.status_code < 500 and response.status_code != 429):
+                return response
+        time.sleep(random.uniform(0, YOOKASSA_BACKOFF * 2 ** attempt))
+
+
+_stage_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('PAYMENT_STAGE_WORKERS', '4')))
+
+
+def timed_stage(stage_ms: dict, name: str, fn, *args):
+    started = time.monotonic()
+    try:
+        return fn(*args)
+    finally:
+        stage_ms[name] = (time.monotonic() - started) * 1000
+
+
+def upload_work_file(file_key: str, work_file: str, file_type: str) -> None:
+    get_s3_client().put_object(
+        Bucket='files',
+        Key=file_key,
+        Body=base64.b64decode(work_file),
+        ContentType=file_type
+    )
+
+
+def insert_application(application_data: dict, inline_work_file, work_file_key, work_file_url: str):
+    '''Создаёт заявку и возвращает её id; None, если загрузка по work_file_key не подтверждена или уже использована'''
+    with db_connection() as conn:
+        cur = conn.cursor()
+        
+        if application_data.get('work_file_key'):
+            # Ключ помечается использованным в той же транзакции, что и вставка заявки
+            cur.execute(
+                """UPDATE uploads SET consumed_at = CURRENT_TIMESTAMP
+                   WHERE object_key = %s AND status = 'completed' AND consumed_at IS NULL""",
+                (work_file_key,)
+            )
+            if cur.rowcount != 1:
+                conn.rollback()
+                return None
+        
+        cur.execute(
+            '''INSERT INTO applications 
+               (full_name, age, teacher, institution, work_title, email, contest_name, 
+                work_file, work_file_key, file_name, file_type, gallery_consent, payment_status, work_file_url, created_at)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+               RETURNING id''',
+            (
+                application_data.get('full_name'),
+                application_data.get('age'),
+                application_data.get('teacher'),
+                application_data.get('institution'),
+                application_data.get('work_title'),
+                application_data.get('email'),
+                application_data.get('contest_name'),
+                inline_work_file,
+                work_file_key,
+                application_data.get('file_name'),
+                application_data.get('file_type'),
+                application_data.get('gallery_consent', False),
+                'pending',
+                work_file_url
             )
-            
-            application_id = cur.fetchone()[0]
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            shop_id = os.environ.get('YOOKASSA_SHOP_ID')
-            secret_key = os.environ.get('YOOKASSA_SECRET_KEY')
-            
-            if not shop_id or not secret_key:
-                return {
-                    'statusCode': 500,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'YooKassa credentials not configured'}),
-                    'isBase64Encoded': False
-                }
-            
-            auth_string = f"{shop_id}:{secret_key}"
-            auth_header = b64encode(auth_string.encode()).decode()
-            
-            idempotence_key = str(uuid.uuid4())
-            
-            payment_data = {
-                "amount": {
-                    "value": str(amount),
-                    "currency": "RUB"
-                },
-                "confirmation": {
-                    "type": "redirect",
-                    "return_url": "https://preview--talent-studio-project.poehali.dev/?section=home"
-                },
-                "capture": True,
-                "description": description,
-                "metadata": {
-                    "application_id": str(application_id)
-                }
-            }
-            
-            headers = {
-                'Authorization': f'Basic {auth_header}',
-                'Idempotence-Key': idempotence_key,
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.post(
-                'https://api.yookassa.ru/v3/payments',
-                json=payment_data,
-                headers=headers
+        )
+        
+        application_id = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+    return application_id
+
+
+def wait_for_upload(upload_future):
+    '''Дожидается фоновой загрузки в S3 и возвращает её исключение или None'''
+    if upload_future is None:
+        return None
+    try:
+        upload_future.result()
+    except Exception as s3_error:
+        print(f"S3 upload error: {s3_error}")
+        return s3_error
+    return None
+
+
+def detach_failed_upload(application_id: int) -> None:
+    '''Загрузка в S3 не удалась после создания заявки: снимаем ключ несуществующего объекта.
+
+    Без STORE_INLINE_WORK_FILE заявка помечается upload_failed и не оплачивается;
+    в режиме совместимости файл уже лежит в work_file, и заявка остаётся pending.
+    '''
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                '''UPDATE applications
+                   SET work_file_key = NULL, work_file_url = '',
+                       payment_status = CASE WHEN %s THEN payment_status ELSE 'upload_failed' END
+                   WHERE id = %s''',
+                (STORE_INLINE_WORK_FILE, application_id)
             )
-            
-            if response.status_code in [200, 201]:
-                payment_response = response.json()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'payment_id': payment_response['id'],
-                        'confirmation_url': payment_response['confirmation']['confirmation_url'],
-                        'status': payment_response['status']
-                    }),
-                    'isBase64Encoded': False
-                }
-            else:
-                return {
-                    'statusCode': response.status_code,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': response.text}),
-                    'isBase64Encoded': False
-                }
-                
-        except Exception as e:
-            return {
-                'statusCode': 500,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': str(e)}),
-                'isBase64Encoded': False
-            }
-    
-    return {
-        'statusCode': 405,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Method not allowed'}),
-        'isBase64Encoded': False
-    }
\ No newline at end of file
+        conn.commit()
+
+
+def create_payment(event: dict, context) -> dict:
+    '''Сохраняет заявку и создаёт платёж в ЮКассе; загрузка файла идёт параллельно со вставкой заявки'''
+    body = json.loads(event.get('body', '{}'))
+    
+    amount = body.get('amount')
+    description = body.get('description')
+    contest_name = body.get('contest_name')
+    email = body.get('email')
+    application_data = body.get('application_data', {})
+    
+    if not amount or not description or not application_data:
+        return json_response(400, {'error': 'Missing required fields'})
+    # Без имени файла base64 некуда положить: заявка сохранилась бы без работы
+    if application_data.get('work_file') and not application_data.get('work_file_key') and not application_data.get('file_name'):
+        return json_response(400, {'error': 'file_name is required with work_file'})
+    
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        return json_response(500, {'error': 'Database not configured'})
+    
+    shop_id = os.environ.get('YOOKASSA_SHOP_ID')
+    secret_key = os.environ.get('YOOKASSA_SECRET_KEY')
+    
+    if not shop_id or not secret_key:
+        return json_response(500, {'error': 'YooKassa credentials not configured'})
+    
+    started = time.monotonic()
+    stage_ms = {}
+    
+    work_file_key = application_data.get('work_file_key')
+    work_file = application_data.get('work_file')
+    file_name = application_data.get('file_name')
+    file_type = application_data.get('file_type')
+    aws_access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+    
+    # Ключ известен заранее, поэтому загрузка в S3 идёт параллельно со вставкой заявки
+    upload_future = None
+    if work_file and file_name and not work_file_key:
+        work_file_key = f'works/{file_name}'
+        upload_future = _stage_pool.submit(
+            contextvars.copy_context().run, timed_stage, stage_ms, 'upload', upload_work_file, work_file_key, work_file, file_type
+        )
+    
+    work_file_url = f"https://cdn.poehali.dev/projects/{aws_access_key}/bucket/{work_file_key}" if work_file_key else ''
+    
+    # Base64 пишется в таблицу только в режиме совместимости STORE_INLINE_WORK_FILE=true
+    inline_work_file = work_file if STORE_INLINE_WORK_FILE else None
+    
+    # Загрузку ждём и при ошибке вставки, чтобы её сбой не терялся вместе с future
+    try:
+        application_id = timed_stage(
+            stage_ms, 'insert', insert_application,
+            application_data, inline_work_file, work_file_key, work_file_url
+        )
+    finally:
+        upload_error = wait_for_upload(upload_future)
+    if application_id is None:
+        return json_response(400, {'error': 'Upload not completed or already used'})
+    
+    # Как и до распараллеливания: без файла в S3 платёж не создаётся
+    if upload_error is not None:
+        detach_failed_upload(application_id)
+        if not STORE_INLINE_WORK_FILE:
+            return json_response(502, {'error': 'Не удалось сохранить файл работы'})
+    
+    auth_string = f"{shop_id}:{secret_key}"
+    auth_header = b64encode(auth_string.encode()).decode()
+    
+    idempotence_key = str(uuid.uuid4())
+    
+    payment_data = {
+        "amount": {
+            "value": str(amount),
+            "currency": "RUB"
+        },
+        "confirmation": {
+            "type": "redirect",
+            "return_url": "https://preview--talent-studio-project.poehali.dev/?section=home"
+        },
+        "capture": True,
+        "description": description,
+        "metadata": {
+            "application_id": str(application_id)
+        }
+    }
+    
+    headers = {
+        'Authorization': f'Basic {auth_header}',
+        'Idempotence-Key': idempotence_key,
+        'Content-Type': 'application/json'
+    }
+    
+    response = timed_stage(stage_ms, 'provider', yookassa_post, '/payments', payment_data, headers)
+    
+    stage_ms['total'] = (time.monotonic() - started) * 1000
+    response_headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'Server-Timing',
+        'Server-Timing': ', '.join(f'{stage};dur={ms:.1f}' for stage, ms in stage_ms.items())
+    }
+    
+    if response.status_code in [200, 201]:
+        payment_response = response.json()
+        return json_response(200, {
+            'payment_id': payment_response['id'],
+            'confirmation_url': payment_response['confirmation']['confirmation_url'],
+            'status': payment_response['status']
+        }, response_headers)
+    else:
+        return json_response(response.status_code, {'error': response.text}, response_headers)
+
+
+ROUTES = {'POST': create_payment}
+
+
+def handler(event: dict, context) -> dict:
+    '''API для создания платежа через ЮКассу'''
+    return dispatch(ROUTES, event, context)
@@ -1,102 +1,771 @@
 import json
 import os
+import contextvars
+import re
+import random
+import hashlib
+import io
+import csv
+import base64
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from datetime import datetime
+from datetime import date, datetime
+from decimal import Decimal
+import threading
+import time
+from contextlib import contextmanager
 
-def handler(event: dict, context) -> dict:
-    '''API для работы с результатами конкурсов: получение, создание, обновление и удаление результатов'''
-    method = event.get('httpMethod', 'GET')
-    
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Блоки между маркерами runtime:* — копии секций backend/_runtime.py; правятся там и переносятся scripts/sync_runtime.py
+CORS_ALLOW_METHODS = 'GET, POST, PUT, DELETE, OPTIONS'
+CORS_ALLOW_HEADERS = 'Content-Type'
+
+
+# >>> runtime:trace
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', 'true') == 'true'
+TRACE_SERVER_TIMING = os.environ.get('TRACE_SERVER_TIMING', 'false') == 'true'
+TRACE_MAX_SPANS = int(os.environ.get('TRACE_MAX_SPANS', '200'))
+_trace_spans = contextvars.ContextVar('trace_spans', default=None)
+
+
+def record_span(name: str, detail, started: float) -> None:
+    '''Добавляет завершившийся участок в трассу текущего запроса, если она ведётся'''
+    spans = _trace_spans.get()
+    if spans is not None and len(spans) < TRACE_MAX_SPANS:
+        spans.append((name, detail, started, time.perf_counter()))
+
+
+def finish_trace(event: dict, context, response: dict, spans: list, started: float) -> dict:
+    '''Пишет трассу запроса одной JSON-строкой и при TRACE_SERVER_TIMING добавляет заголовок Server-Timing'''
+    total_ms = (time.perf_counter() - started) * 1000
+    totals = {}
+    for name, _, span_started, span_ended in spans:
+        count, ms = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, ms + (span_ended - span_started) * 1000)
+    print(json.dumps({'trace': {
+        'request_id': getattr(context, 'request_id', None),
+        'method': event.get('httpMethod'),
+        'status': response.get('statusCode'),
+        'total_ms': round(total_ms, 2),
+        'totals': {name: {'count': count, 'ms': round(ms, 2)} for name, (count, ms) in totals.items()},
+        'spans': [
+            {'name': name, 'detail': detail, 'at_ms': round((s - started) * 1000, 2), 'ms': round((e - s) * 1000, 2)}
+            for name, detail, s, e in spans
+        ]
+    }}, ensure_ascii=False, default=str))
+    if TRACE_SERVER_TIMING:
+        timing = ', '.join(
+            [f'{name};dur={ms:.1f};desc="{count}"' for name, (count, ms) in totals.items()] + [f'app;dur={total_ms:.1f}']
+        )
+        headers = dict(response.get('headers') or {})
+        headers['Server-Timing'] = headers['Server-Timing'] + ', ' + timing if headers.get('Server-Timing') else timing
+        if 'Server-Timing' not in headers.get('Access-Control-Expose-Headers', ''):
+            headers['Access-Control-Expose-Headers'] = ', '.join(
+                filter(None, [headers.get('Access-Control-Expose-Headers'), 'Server-Timing'])
+            )
+        response = dict(response, headers=headers)
+    return response
+# <<< runtime:trace
+
+
+# >>> runtime:span
+@contextmanager
+def span(name: str, detail=None):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, detail, started)
+# <<< runtime:span
+
+
+# >>> runtime:sql-trace
+TRACE_SQL_MAX_LENGTH = int(os.environ.get('TRACE_SQL_MAX_LENGTH', '300'))
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_normalized_sql = {}
+_traced_cursor_classes = {}
+_query_observers = []
+
+
+def normalize_sql(query) -> str:
+    '''Текст запроса без литералов и лишних пробелов; результат кешируется по исходной строке'''
+    text = _normalized_sql.get(query)
+    if text is None:
+        raw = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+        text = _SQL_LITERALS.sub('?', ' '.join(raw.split()))[:TRACE_SQL_MAX_LENGTH]
+        if len(_normalized_sql) < 1024:
+            _normalized_sql[query] = text
+    return text
+
+
+def traced_cursor_class(base):
+    '''Подкласс курсора, который засекает execute/executemany/copy_expert как участки db.query'''
+    cls = _traced_cursor_classes.get(base)
+    if cls is None:
+        class TracedCursor(base):
+            def execute(self, query, vars=None):
+                if _trace_spans.get() is None and not _query_observers:
+                    return super().execute(query, vars)
+                started = time.perf_counter()
+                with span('db.query', normalize_sql(query)):
+                    result = super().execute(query, vars)
+                # У именованного курсора execute — это только DECLARE; его выборку наблюдателям отдаёт stream_json_array
+                if self.name is None:
+                    for observer in _query_observers:
+                        observer(self.connection, query, vars, started)
+                return result
+
+            def executemany(self, query, vars_list):
+                if _trace_spans.get() is None:
+                    return super().executemany(query, vars_list)
+                with span('db.query', normalize_sql(query)):
+                    return super().executemany(query, vars_list)
+
+            def copy_expert(self, sql, file, size=8192):
+                if _trace_spans.get() is None:
+                    return super().copy_expert(sql, file, size)
+                with span('db.copy', normalize_sql(sql)):
+                    return super().copy_expert(sql, file, size)
+
+        cls = _traced_cursor_classes[base] = TracedCursor
+    return cls
+
+
+class TracingConnection(psycopg2.extensions.connection):
+    '''Соединение, все курсоры которого (включая RealDictCursor и именованные) пишут участки в трассу'''
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = traced_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+# <<< runtime:sql-trace
+
+
+# >>> runtime:slow-query
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '0'))
+SLOW_QUERY_EXPLAIN_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_RATE', '0.1'))
+_SQL_PLACEHOLDER_LISTS = re.compile(r'%s(?:\s*,\s*%s)+')
+_SQL_READ_ONLY = re.compile(r'\s*(?:SELECT|WITH)\b', re.IGNORECASE)
+_SQL_WRITES = re.compile(r'\b(?:INSERT|UPDATE|DELETE|MERGE)\b', re.IGNORECASE)
+_slow_query_lock = threading.Lock()
+_slow_query_stats = {}
+
+
+def fingerprint_sql(query) -> tuple:
+    '''Отпечаток запроса: текст без литералов, списки %s в IN (...) свёрнуты, чтобы варианты
+    динамического WHERE с разным числом значений попадали в одну группу'''
+    raw = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+    text = _SQL_PLACEHOLDER_LISTS.sub('%s, ...', _SQL_LITERALS.sub('?', ' '.join(raw.split())))
+    return hashlib.md5(text.encode()).hexdigest()[:16], text
+
+
+def summarize_plan(plan: dict) -> dict:
+    seq_scans = []
+
+    def walk(node: dict) -> None:
+        if node.get('Node Type') == 'Seq Scan':
+            seq_scans.append({
+                'relation': node.get('Relation Name'),
+                'rows': node.get('Actual Rows'),
+                'removed_by_filter': node.get('Rows Removed by Filter', 0)
+            })
+        for child in node.get('Plans', ()):
+            walk(child)
+
+    root = plan['Plan']
+    walk(root)
+    return {
+        'execution_ms': plan.get('Execution Time'),
+        'planning_ms': plan.get('Planning Time'),
+        'root': root.get('Node Type'),
+        'shared_hit_blocks': root.get('Shared Hit Blocks'),
+        'shared_read_blocks': root.get('Shared Read Blocks'),
+        'seq_scans': seq_scans,
+        'plan': plan
+    }
+
+
+def explain_query(conn, query, vars) -> dict:
+    '''Выполняет EXPLAIN (ANALYZE, BUFFERS) на том же соединении под SAVEPOINT,
+    чтобы ошибка плана не оборвала транзакцию обработчика'''
+    text = query.as_string(conn) if hasattr(query, 'as_string') else query
+    if isinstance(text, bytes):
+        text = text.decode()
+    use_savepoint = not conn.autocommit
+    cur = psycopg2.extensions.cursor(conn)
+    try:
+        if use_savepoint:
+            cur.execute('SAVEPOINT slow_query_explain')
+        try:
+            cur.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + text, vars)
+            plan = cur.fetchone()[0][0]
+        except psycopg2.Error as e:
+            if use_savepoint:
+                cur.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            return {'error': str(e)}
+        if use_savepoint:
+            cur.execute('RELEASE SAVEPOINT slow_query_explain')
+    finally:
+        cur.close()
+    return summarize_plan(plan)
+
+
+def observe_slow_query(conn, query, vars, started: float) -> None:
+    '''Учитывает запрос дольше SLOW_QUERY_MS в сводке по отпечатку и пишет его в лог.
+
+    С вероятностью SLOW_QUERY_EXPLAIN_RATE к записи добавляется план; EXPLAIN ANALYZE
+    исполняет запрос повторно, поэтому планы снимаются только для чтения.
+    '''
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+    fingerprint, text = fingerprint_sql(query)
+    with _slow_query_lock:
+        stats = _slow_query_stats.setdefault(fingerprint, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['total_ms'] = round(stats['total_ms'] + elapsed_ms, 2)
+        stats['max_ms'] = round(max(stats['max_ms'], elapsed_ms), 2)
+        stats = dict(stats)
+    record = {'fingerprint': fingerprint, 'query': text, 'ms': round(elapsed_ms, 2), 'instance': stats}
+    if random.random() < SLOW_QUERY_EXPLAIN_RATE and _SQL_READ_ONLY.match(text) and not _SQL_WRITES.search(text):
+        with span('db.explain', fingerprint):
+            record['explain'] = explain_query(conn, query, vars)
+    print(json.dumps({'slow_query': record}, ensure_ascii=False, default=str))
+
+
+if SLOW_QUERY_MS:
+    _query_observers.append(observe_slow_query)
+# <<< runtime:slow-query
+
+
+# >>> runtime:pool
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_HEALTHCHECK_AFTER = float(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', '30'))
+DB_POOL_LOG_EVERY_RELEASE = os.environ.get('DB_POOL_LOG_EVERY_RELEASE', 'false') == 'true'
+_pool_cond = threading.Condition()
+_pool_idle = []
+_pool_size = 0
+_pool_stats = {'hits': 0, 'misses': 0, 'waits': 0, 'wait_ms': 0.0, 'evicted': 0}
+
+
+def _pool_snapshot(event: str) -> str:
+    '''Строка лога со счётчиками пула; собирается под _pool_cond, печатается уже без блокировки'''
+    return json.dumps({'db_pool': dict(_pool_stats, event=event, size=_pool_size, idle=len(_pool_idle))})
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_alive(conn) -> bool:
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def get_connection():
+    '''Выдаёт соединение из пула, который живёт между тёплыми вызовами функции.
+
+    В лог пишется только рост пула (новое соединение) и его исчерпание (ожидание свободного).
+    '''
+    global _pool_size
+    started = time.monotonic()
+    exhausted = None
+    with _pool_cond:
+        now = time.monotonic()
+        for item in [i for i in _pool_idle if now - i[1] > DB_POOL_IDLE_TIMEOUT]:
+            _pool_idle.remove(item)
+            _close_quietly(item[0])
+            _pool_size -= 1
+            _pool_stats['evicted'] += 1
+        if not _pool_idle and _pool_size >= DB_POOL_MAX_SIZE:
+            _pool_stats['waits'] += 1
+            exhausted = _pool_snapshot('exhausted')
+            while not _pool_idle and _pool_size >= DB_POOL_MAX_SIZE:
+                _pool_cond.wait()
+        _pool_stats['wait_ms'] += (time.monotonic() - started) * 1000
+        if _pool_idle:
+            conn, last_used = _pool_idle.pop()
+        else:
+            conn, last_used = None, None
+            _pool_size += 1
+    if exhausted:
+        print(exhausted)
+
+    if conn is not None:
+        idle_for = time.monotonic() - last_used
+        if not conn.closed and (idle_for < DB_POOL_HEALTHCHECK_AFTER or _is_alive(conn)):
+            with _pool_cond:
+                _pool_stats['hits'] += 1
+            return conn
+        _close_quietly(conn)
+        with _pool_cond:
+            _pool_stats['evicted'] += 1
+
+    try:
+        with span('db.connect'):
+            conn = psycopg2.connect(os.environ['DATABASE_URL'], connection_factory=TracingConnection)
+    except Exception:
+        with _pool_cond:
+            _pool_size -= 1
+            _pool_cond.notify()
+        raise
+    with _pool_cond:
+        _pool_stats['misses'] += 1
+        grew = _pool_snapshot('grew')
+    print(grew)
+    return conn
+
+
+def release_connection(conn) -> None:
+    '''Возвращает соединение в пул; разорванные соединения отбрасываются'''
+    global _pool_size
+    if not conn.closed:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            _close_quietly(conn)
+    with _pool_cond:
+        if conn.closed:
+            _pool_size -= 1
+        else:
+            _pool_idle.append((conn, time.monotonic()))
+        _pool_cond.notify()
+        released = _pool_snapshot('released') if DB_POOL_LOG_EVERY_RELEASE else None
+    if released:
+        print(released)
+
+
+@contextmanager
+def db_connection():
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+# <<< runtime:pool
+
+
+# >>> runtime:json
+STREAM_ITERSIZE = int(os.environ.get('STREAM_ITERSIZE', '500'))
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def encode_json(value) -> str:
+    '''Кодирует значение в JSON; orjson, если установлен, сам обрабатывает даты'''
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default).decode('utf-8')
+    return json.dumps(value, default=_json_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def stream_json_array(conn, query: str, params=(), limit=None, row_hook=None) -> tuple:
+    '''Читает выборку именованным (серверным) курсором по STREAM_ITERSIZE строк
+    и кодирует каждую строку сразу в буфер, не собирая список словарей.
+
+    Возвращает (JSON-массив, последняя исходная строка, были ли строки сверх limit).
+    '''
+    buffer = io.StringIO()
+    buffer.write('[')
+    last_row = None
+    count = 0
+    has_more = False
+    started = time.perf_counter()
+    with conn.cursor(name='stream_json_array') as cur:
+        cur.itersize = STREAM_ITERSIZE
+        cur.execute(query, params)
+        columns = None
+        for values in cur:
+            if limit is not None and count >= limit:
+                has_more = True
+                break
+            if columns is None:
+                columns = [col[0] for col in cur.description]
+            row = dict(zip(columns, values))
+            if count:
+                buffer.write(',')
+            buffer.write(encode_json(row_hook(row) if row_hook else row))
+            last_row = row
+            count += 1
+    for observer in _query_observers:
+        observer(conn, query, params, started)
+    buffer.write(']')
+    return buffer.getvalue(), last_row, has_more
+# <<< runtime:json
+
+
+# >>> runtime:json-envelope
+def json_envelope(items_json: str, **fields) -> str:
+    '''Собирает {"items": [...], ...} вокруг уже закодированного массива'''
+    return '{"items":' + items_json + ''.join(f',{json.dumps(key)}:{encode_json(value)}' for key, value in fields.items()) + '}'
+# <<< runtime:json-envelope
+
+
+# >>> runtime:keyset-cursor
+def encode_cursor(values: list) -> str:
+    '''Упаковывает ключи сортировки последней строки в непрозрачный курсор'''
+    raw = json.dumps(values, separators=(',', ':'), default=_json_default).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> list:
+    padded = token + '=' * (-len(token) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or not values:
+        raise ValueError('Invalid cursor')
+    return values
+# <<< runtime:keyset-cursor
+
+
+# >>> runtime:http
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_RESPONSE = {
+    'statusCode': 200,
+    'headers': {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': CORS_ALLOW_METHODS,
+        'Access-Control-Allow-Headers': CORS_ALLOW_HEADERS,
+        'Access-Control-Max-Age': '86400'
+    },
+    'body': '',
+    'isBase64Encoded': False
+}
+METHOD_NOT_ALLOWED_RESPONSE = {
+    'statusCode': 405,
+    'headers': JSON_HEADERS,
+    'body': '{"error": "Method not allowed"}',
+    'isBase64Encoded': False
+}
+
+
+class HttpError(Exception):
+    '''Ошибка с готовым HTTP-статусом; dispatch() превращает её в JSON-ответ'''
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(status: int, payload, headers: dict = JSON_HEADERS) -> dict:
+    body = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+    return {'statusCode': status, 'headers': headers, 'body': body, 'isBase64Encoded': False}
+
+
+def dispatch(routes: dict, event: dict, context, default_method: str = 'GET') -> dict:
+    '''Выбирает обработчик по HTTP-методу и переводит исключения в ответы.
+
+    Ответы на OPTIONS и неизвестный метод собраны заранее и не аллоцируются на каждый вызов.
+    Остальные запросы трассируются: участки БД, S3 и внешних HTTP-вызовов пишутся одной JSON-строкой в лог.
+    '''
+    method = event.get('httpMethod', default_method)
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return PREFLIGHT_RESPONSE
+    route = routes.get(method)
+    if route is None:
+        return METHOD_NOT_ALLOWED_RESPONSE
+    spans = [] if TRACE_ENABLED else None
+    token = _trace_spans.set(spans)
+    started = time.perf_counter()
+    try:
+        response = route(event, context)
+    except HttpError as e:
+        response = json_response(e.status, {'error': str(e)})
+    except json.JSONDecodeError:
+        response = json_response(400, {'error': 'Invalid JSON body'})
+    except Exception as e:
+        response = json_response(500, {'error': str(e)})
+    finally:
+        _trace_spans.reset(token)
+    if spans is None:
+        return response
+    return finish_trace(event, context, response, spans, started)
+# <<< runtime:http
+
+
+RESULTS_PAGE_SIZE = int(os.environ.get('RESULTS_PAGE_SIZE', '50'))
+RESULTS_MAX_PAGE_SIZE = int(os.environ.get('RESULTS_MAX_PAGE_SIZE', '500'))
+
+RESULT_COLUMNS = (
+    'id', 'application_id', 'full_name', 'age', 'teacher', 'institution', 'work_title', 'email',
+    'contest_id', 'contest_name', 'work_file_url', 'result', 'place', 'score',
+    'diploma_url', 'notes', 'gallery_consent', 'created_at', 'updated_at'
+)
+RESULT_SORT_COLUMNS = ('created_at', 'id')
+
+
+IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', '50000'))
+
+IMPORT_COLUMNS = (
+    'application_id', 'full_name', 'age', 'teacher', 'institution', 'work_title', 'email',
+    'contest_id', 'contest_name', 'work_file_url', 'result', 'place', 'score',
+    'diploma_url', 'notes', 'gallery_consent'
+)
+IMPORT_INT_COLUMNS = ('application_id', 'age', 'contest_id', 'place')
+# Ограничения колонок results: строка, которая в них не влезет, уронила бы COPY или слияние целиком
+IMPORT_MAX_LENGTHS = {
+    'full_name': 255, 'teacher': 255, 'institution': 255, 'work_title': 255,
+    'email': 255, 'contest_name': 255, 'result': 100
+}
+IMPORT_SCORE_LIMIT = Decimal('1000')  # score DECIMAL(5,2)
+
+
+def iter_import_rows(file_data: bytes, file_format: str):
+    '''Отдаёт строки таблицы как словари по заголовку первой строки'''
+    if file_format == 'xlsx':
+        from openpyxl import load_workbook
+        sheet = load_workbook(io.BytesIO(file_data), read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else '' for cell in next(rows, [])]
+        for values in rows:
+            yield {name: value for name, value in zip(header, values) if name}
+    else:
+        text = io.TextIOWrapper(io.BytesIO(file_data), encoding='utf-8-sig', newline='')
+        sample = text.read(4096)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        for row in csv.DictReader(text, dialect=dialect):
+            yield {(name or '').strip(): value for name, value in row.items()}
+
+
+def parse_import_integer(column: str, value) -> int:
+    '''Целое в диапазоне INTEGER; дробные значения вроде 12.7 отклоняются, а не усекаются'''
+    number = Decimal(str(value).replace(',', '.'))
+    if not number.is_finite() or number != number.to_integral_value():
+        raise ValueError(f'{column}: {value!r} is not an integer')
+    number = int(number)
+    if not -2 ** 31 <= number < 2 ** 31:
+        raise ValueError(f'{column}: {value!r} is out of range')
+    return number
+
+
+def clean_import_row(row: dict) -> list:
+    values = []
+    for column in IMPORT_COLUMNS:
+        value = row.get(column)
+        if isinstance(value, str):
+            value = value.strip()
+        try:
+            if value in (None, ''):
+                value = None
+            elif column in IMPORT_INT_COLUMNS:
+                value = parse_import_integer(column, value)
+            elif column == 'score':
+                score = Decimal(str(value).replace(',', '.'))
+                if not score.is_finite() or abs(score.quantize(Decimal('0.01'))) >= IMPORT_SCORE_LIMIT:
+                    raise ValueError(f'score: {value!r} must be below {IMPORT_SCORE_LIMIT}')
+                value = str(score)
+            elif column == 'gallery_consent':
+                value = str(value).lower() in ('1', 'true', 'yes', 'да', '+')
+            else:
+                value = str(value)
+                if column in IMPORT_MAX_LENGTHS and len(value) > IMPORT_MAX_LENGTHS[column]:
+                    raise ValueError(f'{column}: longer than {IMPORT_MAX_LENGTHS[column]} characters')
+        except ArithmeticError:
+            raise ValueError(f'{column}: invalid value {value!r}')
+        values.append(value)
+    if values[IMPORT_COLUMNS.index('full_name')] is None:
+        raise ValueError('full_name is required')
+    # Без application_id строку не с чем сопоставить при повторном импорте: она вставлялась бы заново каждый раз
+    if values[IMPORT_COLUMNS.index('application_id')] is None:
+        raise ValueError('application_id is required')
+    if values[IMPORT_COLUMNS.index('gallery_consent')] is None:
+        values[IMPORT_COLUMNS.index('gallery_consent')] = True
+    return values
+
+
+def import_results(conn, data: dict) -> dict:
+    '''Массовая загрузка результатов: проверка строк, COPY во временную таблицу и слияние по application_id'''
+    file_format = data.get('format', 'csv')
+    if file_format not in ('csv', 'xlsx') or not data.get('file'):
+        return {'error': 'Pass file (base64) and format csv or xlsx'}
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    errors = []
+    staged = {}
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    row_count = 0
     
-    if method == 'GET':
+    for row_number, row in enumerate(iter_import_rows(base64.b64decode(data['file']), file_format), start=2):
+        if not any(value not in (None, '') for value in row.values()):
+            continue
+        row_count += 1
+        if row_count > IMPORT_MAX_ROWS:
+            errors.append({'row': row_number, 'error': f'Import is limited to {IMPORT_MAX_ROWS} rows'})
+            break
+        try:
+            values = clean_import_row(row)
+        except (ValueError, ArithmeticError) as e:
+            errors.append({'row': row_number, 'error': str(e)})
+            continue
+        application_id = values[0]
+        if application_id in staged:
+            errors.append({'row': staged[application_id], 'error': f'Superseded by row {row_number} with the same application_id'})
+        staged[application_id] = row_number
+        writer.writerow([row_number] + ['' if v is None else v for v in values])
+    
+    columns = ', '.join(IMPORT_COLUMNS)
+    updates = ', '.join(f'{c} = EXCLUDED.{c}' for c in IMPORT_COLUMNS if c != 'application_id')
+    buffer.seek(0)
+    
+    with conn.cursor() as cur:
+        cur.execute(f'''
+            CREATE TEMP TABLE results_import (row_number INTEGER, {', '.join(f'{c} TEXT' for c in IMPORT_COLUMNS)})
+            ON COMMIT DROP
+        ''')
+        cur.copy_expert(f'COPY results_import (row_number, {columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+        # Строки с несуществующей заявкой нарушили бы внешний ключ results.application_id
+        # и оборвали бы весь импорт, поэтому они отсеиваются и попадают в отчёт
+        cur.execute('''
+            DELETE FROM results_import i
+            WHERE NOT EXISTS (SELECT 1 FROM applications a WHERE a.id = i.application_id::integer)
+            RETURNING i.row_number, i.application_id
+        ''')
+        for row_number, application_id in cur.fetchall():
+            errors.append({'row': row_number, 'error': f'application_id {application_id} not found'})
+        # Для повторяющихся application_id побеждает последняя строка файла
+        cur.execute(f'''
+            INSERT INTO results ({columns})
+            SELECT application_id::integer, full_name, age::integer, teacher, institution, work_title, email,
+                   contest_id::integer, contest_name, work_file_url, result, place::integer, score::numeric,
+                   diploma_url, notes, gallery_consent::boolean
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY application_id ORDER BY row_number DESC) AS version
+                FROM results_import
+            ) s
+            WHERE version = 1
+            ORDER BY row_number
+            ON CONFLICT (application_id) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP
+            RETURNING (xmax = 0) AS inserted
+        ''')
+        outcomes = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    
+    return {
+        'imported': len(outcomes),
+        'inserted': sum(1 for inserted in outcomes if inserted),
+        'updated': sum(1 for inserted in outcomes if not inserted),
+        'errors': sorted(errors, key=lambda e: e['row'])
+    }
+
+
+def get_results(event: dict, context) -> dict:
+    '''Список результатов с фильтрами, выборкой полей и курсором либо один результат по id'''
+    with db_connection() as conn:
         params = event.get('queryStringParameters') or {}
         result_id = params.get('id')
         
         if result_id:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute('SELECT * FROM results WHERE id = %s', (result_id,))
+                cur.execute(f"SELECT {', '.join(RESULT_COLUMNS)} FROM results WHERE id = %s", (result_id,))
                 result = cur.fetchone()
-                conn.close()
                 
                 if result:
-                    result['created_at'] = result['created_at'].isoformat() if result.get('created_at') else None
-                    result['updated_at'] = result['updated_at'].isoformat() if result.get('updated_at') else None
-                    result['score'] = float(result['score']) if result.get('score') else None
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps(result),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(200, encode_json(result))
                 else:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Result not found'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(404, {'error': 'Result not found'})
         
         contest_id = params.get('contest_id')
         contest_name = params.get('contest_name')
         result_type = params.get('result')
         place = params.get('place')
+        paginated = 'limit' in params or 'cursor' in params
         
-        query = 'SELECT * FROM results WHERE 1=1'
+        fields = [f for f in (params.get('fields') or '').split(',') if f] or list(RESULT_COLUMNS)
+        sort_column = params.get('sort', 'created_at')
+        descending = params.get('order', 'desc') != 'asc'
+        try:
+            if set(fields) - set(RESULT_COLUMNS) or sort_column not in RESULT_SORT_COLUMNS:
+                raise ValueError('Unknown field or sort column')
+            page_size = min(int(params.get('limit') or RESULTS_PAGE_SIZE), RESULTS_MAX_PAGE_SIZE)
+            after = decode_cursor(params['cursor']) if params.get('cursor') else None
+            if after is not None and len(after) != 2:
+                raise ValueError('Invalid cursor')
+        except (ValueError, TypeError) as e:
+            return json_response(400, {'error': str(e)})
+        
+        where = []
         query_params = []
         
         if contest_id:
-            query += ' AND contest_id = %s'
+            where.append('contest_id = %s')
             query_params.append(contest_id)
         
         if contest_name:
-            query += ' AND contest_name ILIKE %s'
-            query_params.append(f'%{contest_name}%')
+            # Подстрочный поиск обслуживается trigram-индексом idx_results_contest_name_trgm
+            where.append('contest_name ILIKE %s')
+            query_params.append('%' + contest_name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
         
         if result_type:
-            query += ' AND result = %s'
+            where.append('result = %s')
             query_params.append(result_type)
         
         if place:
-            query += ' AND place = %s'
+            where.append('place = %s')
             query_params.append(place)
         
-        query += ' ORDER BY created_at DESC'
-        
+        total = None
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, query_params)
-            results = cur.fetchall()
-            conn.close()
+            if paginated:
+                cur.execute('SELECT COUNT(*) AS total FROM results' + (' WHERE ' + ' AND '.join(where) if where else ''), query_params)
+                total = cur.fetchone()['total']
+                if after is not None:
+                    where.append(f"({sort_column}, id) {'<' if descending else '>'} (%s, %s)")
+                    query_params.extend(after)
             
-            for res in results:
-                res['created_at'] = res['created_at'].isoformat() if res.get('created_at') else None
-                res['updated_at'] = res['updated_at'].isoformat() if res.get('updated_at') else None
-                res['score'] = float(res['score']) if res.get('score') else None
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(results),
-                'isBase64Encoded': False
-            }
-    
-    elif method == 'POST':
+            direction = 'DESC' if descending else 'ASC'
+            select_columns = list(dict.fromkeys(fields + ([sort_column, 'id'] if paginated else [])))
+            query = f"SELECT {', '.join(select_columns)} FROM results"
+            if where:
+                query += ' WHERE ' + ' AND '.join(where)
+            query += f' ORDER BY {sort_column} {direction}, id {direction}'
+            if paginated:
+                query += ' LIMIT %s'
+                query_params.append(page_size + 1)
+        
+        items, last, has_more = stream_json_array(
+            conn, query, query_params,
+            limit=page_size if paginated else None,
+            row_hook=lambda row: {key: row[key] for key in fields}
+        )
+        next_cursor = encode_cursor([last[sort_column], last['id']]) if has_more else None
+        
+        return json_response(200, json_envelope(items, total=total, has_more=has_more, next_cursor=next_cursor) if paginated else items)
+
+
+def create_result(event: dict, context) -> dict:
+    '''Создание результата или импорт из CSV/XLSX (action=import)'''
+    with db_connection() as conn:
         data = json.loads(event.get('body', '{}'))
+        
+        if data.get('action') == 'import':
+            report = import_results(conn, data)
+            return json_response(400 if 'error' in report else 200, report)
+        
         application_id = data.get('application_id')
         
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -105,13 +774,7 @@ def handler(event: dict, context) -> dict:
                 existing = cur.fetchone()
                 
                 if existing:
-                    conn.close()
-                    return {
-                        'statusCode': 409,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Result from this application already exists'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(409, {'error': 'Result from this application already exists'})
             
             cur.execute('''
                 INSERT INTO results (
@@ -119,8 +782,7 @@ def handler(event: dict, context) -> dict:
                     work_title, email, contest_id, contest_name, work_file_url,
                     result, place, score, diploma_url, notes, gallery_consent
                 ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING *
-            ''', (
+                RETURNING ''' + ', '.join(RESULT_COLUMNS), (
                 application_id,
                 data.get('full_name'),
                 data.get('age'),
@@ -140,31 +802,18 @@ def handler(event: dict, context) -> dict:
             ))
             result = cur.fetchone()
             conn.commit()
-            conn.close()
             
-            result['created_at'] = result['created_at'].isoformat() if result.get('created_at') else None
-            result['updated_at'] = result['updated_at'].isoformat() if result.get('updated_at') else None
-            result['score'] = float(result['score']) if result.get('score') else None
-            
-            return {
-                'statusCode': 201,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(result),
-                'isBase64Encoded': False
-            }
-    
-    elif method == 'PUT':
+            return json_response(201, encode_json(result))
+
+
+def update_result(event: dict, context) -> dict:
+    '''Обновление результата'''
+    with db_connection() as conn:
         data = json.loads(event.get('body', '{}'))
         result_id = data.get('id')
         
         if not result_id:
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Result ID is required'}),
-                'isBase64Encoded': False
-            }
+            return json_response(400, {'error': 'Result ID is required'})
         
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute('''
@@ -174,8 +823,7 @@ def handler(event: dict, context) -> dict:
                     work_file_url = %s, result = %s, place = %s, score = %s,
                     diploma_url = %s, notes = %s, gallery_consent = %s, updated_at = CURRENT_TIMESTAMP
                 WHERE id = %s
-                RETURNING *
-            ''', (
+                RETURNING ''' + ', '.join(RESULT_COLUMNS), (
                 data.get('full_name'),
                 data.get('age'),
                 data.get('teacher'),
@@ -195,56 +843,37 @@ def handler(event: dict, context) -> dict:
             ))
             result = cur.fetchone()
             conn.commit()
-            conn.close()
             
             if result:
-                result['created_at'] = result['created_at'].isoformat() if result.get('created_at') else None
-                result['updated_at'] = result['updated_at'].isoformat() if result.get('updated_at') else None
-                result['score'] = float(result['score']) if result.get('score') else None
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(result),
-                    'isBase64Encoded': False
-                }
+                return json_response(200, encode_json(result))
             else:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Result not found'}),
-                    'isBase64Encoded': False
-                }
-    
-    elif method == 'DELETE':
+                return json_response(404, {'error': 'Result not found'})
+
+
+def delete_result(event: dict, context) -> dict:
+    '''Удаление результата'''
+    with db_connection() as conn:
         params = event.get('queryStringParameters') or {}
         result_id = params.get('id')
         
         if not result_id:
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Result ID is required'}),
-                'isBase64Encoded': False
-            }
+            return json_response(400, {'error': 'Result ID is required'})
         
         with conn.cursor() as cur:
             cur.execute('DELETE FROM results WHERE id = %s', (result_id,))
             conn.commit()
-            conn.close()
             
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'message': 'Result deleted'}),
-                'isBase64Encoded': False
-            }
-    
-    conn.close()
-    return {
-        'statusCode': 405,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Method not allowed'}),
-        'isBase64Encoded': False
-    }
\ No newline at end of file
+            return json_response(200, {'message': 'Result deleted'})
+
+
+ROUTES = {
+    'GET': get_results,
+    'POST': create_result,
+    'PUT': update_result,
+    'DELETE': delete_result
+}
+
+
+def handler(event: dict, context) -> dict:
+    '''API для работы с результатами конкурсов: получение, создание, обновление и удаление результатов'''
+    return dispatch(ROUTES, event, context)
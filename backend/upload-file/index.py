@@ -1,91 +1,341 @@
 import json
 import os
+import contextvars
+import time
 import base64
-import boto3
+import binascii
 import uuid
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
-def handler(event: dict, context) -> dict:
-    """API для загрузки файлов в S3 хранилище"""
-    
-    method = event.get('httpMethod', 'GET')
-    
+
+# Блоки между маркерами runtime:* — копии секций backend/_runtime.py; правятся там и переносятся scripts/sync_runtime.py
+CORS_ALLOW_METHODS = 'POST, OPTIONS'
+CORS_ALLOW_HEADERS = 'Content-Type, X-Authorization'
+
+
+# >>> runtime:trace
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', 'true') == 'true'
+TRACE_SERVER_TIMING = os.environ.get('TRACE_SERVER_TIMING', 'false') == 'true'
+TRACE_MAX_SPANS = int(os.environ.get('TRACE_MAX_SPANS', '200'))
+_trace_spans = contextvars.ContextVar('trace_spans', default=None)
+
+
+def record_span(name: str, detail, started: float) -> None:
+    '''Добавляет завершившийся участок в трассу текущего запроса, если она ведётся'''
+    spans = _trace_spans.get()
+    if spans is not None and len(spans) < TRACE_MAX_SPANS:
+        spans.append((name, detail, started, time.perf_counter()))
+
+
+def finish_trace(event: dict, context, response: dict, spans: list, started: float) -> dict:
+    '''Пишет трассу запроса одной JSON-строкой и при TRACE_SERVER_TIMING добавляет заголовок Server-Timing'''
+    total_ms = (time.perf_counter() - started) * 1000
+    totals = {}
+    for name, _, span_started, span_ended in spans:
+        count, ms = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, ms + (span_ended - span_started) * 1000)
+    print(json.dumps({'trace': {
+        'request_id': getattr(context, 'request_id', None),
+        'method': event.get('httpMethod'),
+        'status': response.get('statusCode'),
+        'total_ms': round(total_ms, 2),
+        'totals': {name: {'count': count, 'ms': round(ms, 2)} for name, (count, ms) in totals.items()},
+        'spans': [
+            {'name': name, 'detail': detail, 'at_ms': round((s - started) * 1000, 2), 'ms': round((e - s) * 1000, 2)}
+            for name, detail, s, e in spans
+        ]
+    }}, ensure_ascii=False, default=str))
+    if TRACE_SERVER_TIMING:
+        timing = ', '.join(
+            [f'{name};dur={ms:.1f};desc="{count}"' for name, (count, ms) in totals.items()] + [f'app;dur={total_ms:.1f}']
+        )
+        headers = dict(response.get('headers') or {})
+        headers['Server-Timing'] = headers['Server-Timing'] + ', ' + timing if headers.get('Server-Timing') else timing
+        if 'Server-Timing' not in headers.get('Access-Control-Expose-Headers', ''):
+            headers['Access-Control-Expose-Headers'] = ', '.join(
+                filter(None, [headers.get('Access-Control-Expose-Headers'), 'Server-Timing'])
+            )
+        response = dict(response, headers=headers)
+    return response
+# <<< runtime:trace
+
+
+# >>> runtime:http
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_RESPONSE = {
+    'statusCode': 200,
+    'headers': {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': CORS_ALLOW_METHODS,
+        'Access-Control-Allow-Headers': CORS_ALLOW_HEADERS,
+        'Access-Control-Max-Age': '86400'
+    },
+    'body': '',
+    'isBase64Encoded': False
+}
+METHOD_NOT_ALLOWED_RESPONSE = {
+    'statusCode': 405,
+    'headers': JSON_HEADERS,
+    'body': '{"error": "Method not allowed"}',
+    'isBase64Encoded': False
+}
+
+
+class HttpError(Exception):
+    '''Ошибка с готовым HTTP-статусом; dispatch() превращает её в JSON-ответ'''
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(status: int, payload, headers: dict = JSON_HEADERS) -> dict:
+    body = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+    return {'statusCode': status, 'headers': headers, 'body': body, 'isBase64Encoded': False}
+
+
+def dispatch(routes: dict, event: dict, context, default_method: str = 'GET') -> dict:
+    '''Выбирает обработчик по HTTP-методу и переводит исключения в ответы.
+
+    Ответы на OPTIONS и неизвестный метод собраны заранее и не аллоцируются на каждый вызов.
+    Остальные запросы трассируются: участки БД, S3 и внешних HTTP-вызовов пишутся одной JSON-строкой в лог.
+    '''
+    method = event.get('httpMethod', default_method)
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return PREFLIGHT_RESPONSE
+    route = routes.get(method)
+    if route is None:
+        return METHOD_NOT_ALLOWED_RESPONSE
+    spans = [] if TRACE_ENABLED else None
+    token = _trace_spans.set(spans)
+    started = time.perf_counter()
+    try:
+        response = route(event, context)
+    except HttpError as e:
+        response = json_response(e.status, {'error': str(e)})
+    except json.JSONDecodeError:
+        response = json_response(400, {'error': 'Invalid JSON body'})
+    except Exception as e:
+        response = json_response(500, {'error': str(e)})
+    finally:
+        _trace_spans.reset(token)
+    if spans is None:
+        return response
+    return finish_trace(event, context, response, spans, started)
+# <<< runtime:http
+
+
+# >>> runtime:s3
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '10'))
+S3_MAX_ATTEMPTS = int(os.environ.get('S3_MAX_ATTEMPTS', '3'))
+_s3_client = None
+_s3_lock = threading.Lock()
+
+
+def _s3_before_call(context, model=None, **kwargs):
+    context['trace_started'] = time.perf_counter()
+    context['trace_operation'] = model.name if model is not None else kwargs.get('event_name', '').rsplit('.', 1)[-1]
+
+
+def _s3_after_call(context, **kwargs):
+    if 'trace_started' in context:
+        record_span('s3.' + context.pop('trace_operation', ''), None, context.pop('trace_started'))
+
+
+def _s3_after_call_error(context, exception=None, **kwargs):
+    # botocore передаёт сюда только exception и context; исключение из обработчика заслонило бы ошибку S3
+    if 'trace_started' in context:
+        record_span(
+            's3.' + context.pop('trace_operation', ''),
+            {'error': type(exception).__name__},
+            context.pop('trace_started')
+        )
+
+
+def instrument_s3(client):
+    '''Засекает каждый вызов S3 через события botocore как участок s3.<Операция>'''
+    client.meta.events.register('before-call.s3', _s3_before_call)
+    client.meta.events.register('after-call.s3', _s3_after_call)
+    client.meta.events.register('after-call-error.s3', _s3_after_call_error)
+    return client
+
+
+def get_s3_client():
+    '''Клиент S3 создаётся один раз на инстанс и переиспользует keep-alive соединения'''
+    global _s3_client
+    if _s3_client is None:
+        with _s3_lock:
+            if _s3_client is None:
+                import boto3
+                from botocore.config import Config
+                _s3_client = boto3.client('s3',
+                    endpoint_url='https://bucket.poehali.dev',
+                    aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+                    aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],
+                    config=Config(
+                        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                        retries={'max_attempts': S3_MAX_ATTEMPTS, 'mode': 'standard'},
+                        connect_timeout=5,
+                        read_timeout=60,
+                        tcp_keepalive=True
+                    )
+                )
+                instrument_s3(_s3_client)
+    return _s3_client
+# <<< runtime:s3
+
+
+# >>> runtime:image-variants
+IMAGE_VARIANTS_URL = os.environ.get('IMAGE_VARIANTS_URL', '')
+IMAGE_VARIANTS_TIMEOUT = float(os.environ.get('IMAGE_VARIANTS_TIMEOUT', '20'))
+IMAGE_VARIANTS_SOURCE_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/gif')
+
+
+def request_image_variants(source_url: str, content_type: str) -> None:
+    '''Просит функцию image-variants нарезать копии только что загруженной картинки.
+
+    Ошибка не роняет загрузку: она пишется в лог, а пропущенные работы
+    достраивает scripts/backfill_image_variants.py.
+    '''
+    if not IMAGE_VARIANTS_URL or (content_type or '').split(';')[0] not in IMAGE_VARIANTS_SOURCE_TYPES:
+        return
+    import urllib.request
+    request = urllib.request.Request(
+        IMAGE_VARIANTS_URL,
+        data=json.dumps({'url': source_url}).encode(),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    started = time.perf_counter()
+    error = None
+    try:
+        with urllib.request.urlopen(request, timeout=IMAGE_VARIANTS_TIMEOUT) as response:
+            response.read()
+    except (OSError, ValueError) as exc:
+        error = f'{type(exc).__name__}: {exc}'
+        print(json.dumps({'image_variants': {'url': source_url, 'error': error}}, ensure_ascii=False))
+    record_span('http.image_variants', {'error': error} if error else None, started)
+# <<< runtime:image-variants
+
+
+MULTIPART_THRESHOLD = int(os.environ.get('MULTIPART_THRESHOLD', str(16 * 1024 * 1024)))
+MULTIPART_PART_SIZE = max(int(os.environ.get('MULTIPART_PART_SIZE', str(8 * 1024 * 1024))), 5 * 1024 * 1024)
+MULTIPART_CONCURRENCY = int(os.environ.get('MULTIPART_CONCURRENCY', '4'))
+
+
+def iter_base64_chunks(encoded: str, chunk_size: int):
+    '''Декодирует base64 порциями, чтобы в памяти не было всего файла целиком.
+
+    Переносы строк и пробелы (base64 из MIME-кодировщиков) вырезаются до деления на
+    порции, а порция всегда содержит число значимых символов, кратное четырём.
+    Некорректный ввод поднимает binascii.Error.
+    '''
+    step = max(chunk_size // 3, 1) * 4
+    pending = ''
+    for start in range(0, len(encoded), step):
+        pending += ''.join(encoded[start:start + step].split())
+        aligned = len(pending) // 4 * 4
+        if aligned:
+            yield base64.b64decode(pending[:aligned], validate=True)
+            pending = pending[aligned:]
+    if pending:
+        yield base64.b64decode(pending, validate=True)
+
+
+def multipart_upload(s3, key: str, content_type: str, chunks) -> None:
+    '''Загружает поток байтов частями параллельно; при ошибке загрузка отменяется'''
+    upload_id = s3.create_multipart_upload(Bucket='files', Key=key, ContentType=content_type)['UploadId']
+    parts = []
     
-    if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+    def upload_part(part_number: int, data: bytes) -> dict:
+        response = s3.upload_part(
+            Bucket='files', Key=key, UploadId=upload_id,
+            PartNumber=part_number, Body=data
+        )
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
     
     try:
-        body = json.loads(event.get('body', '{}'))
-        file_base64 = body.get('file')
-        file_name = body.get('fileName')
-        file_type = body.get('fileType', 'application/pdf')
-        folder = body.get('folder', 'contests')
-        
-        if not file_base64 or not file_name:
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Отсутствует файл или имя файла'}),
-                'isBase64Encoded': False
-            }
-        
-        file_data = base64.b64decode(file_base64)
-        
-        file_extension = file_name.split('.')[-1] if '.' in file_name else 'pdf'
-        unique_file_name = f"{folder}/{uuid.uuid4()}.{file_extension}"
+        with ThreadPoolExecutor(max_workers=MULTIPART_CONCURRENCY) as pool:
+            in_flight = set()
+            
+            def submit(part_number: int, data: bytes) -> None:
+                nonlocal in_flight
+                # Не больше MULTIPART_CONCURRENCY частей в памяти одновременно
+                if len(in_flight) >= MULTIPART_CONCURRENCY:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    parts.extend(future.result() for future in done)
+                in_flight.add(pool.submit(contextvars.copy_context().run, upload_part, part_number, data))
+            
+            buffer = bytearray()
+            part_number = 0
+            for chunk in chunks:
+                buffer += chunk
+                while len(buffer) >= MULTIPART_PART_SIZE:
+                    part_number += 1
+                    submit(part_number, bytes(buffer[:MULTIPART_PART_SIZE]))
+                    del buffer[:MULTIPART_PART_SIZE]
+            if buffer or part_number == 0:
+                part_number += 1
+                submit(part_number, bytes(buffer))
+            del buffer
+            
+            parts.extend(future.result() for future in in_flight)
         
-        s3 = boto3.client('s3',
-            endpoint_url='https://bucket.poehali.dev',
-            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],
+        s3.complete_multipart_upload(
+            Bucket='files', Key=key, UploadId=upload_id,
+            MultipartUpload={'Parts': sorted(parts, key=lambda part: part['PartNumber'])}
         )
-        
-        s3.put_object(
-            Bucket='files',
-            Key=unique_file_name,
-            Body=file_data,
-            ContentType=file_type
-        )
-        
-        cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{unique_file_name}"
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'url': cdn_url,
-                'fileName': file_name,
-                'message': 'Файл успешно загружен'
-            }),
-            'isBase64Encoded': False
-        }
+    except Exception:
+        s3.abort_multipart_upload(Bucket='files', Key=key, UploadId=upload_id)
+        raise
+
+
+def upload_file(event: dict, context) -> dict:
+    """Кладёт присланный base64-файл в S3; большие файлы — multipart-загрузкой"""
+    body = json.loads(event.get('body', '{}'))
+    file_base64 = body.get('file')
+    file_name = body.get('fileName')
+    file_type = body.get('fileType', 'application/pdf')
+    folder = body.get('folder', 'contests')
     
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
+    if not file_base64 or not file_name:
+        return json_response(400, {'error': 'Отсутствует файл или имя файла'})
+    
+    file_extension = file_name.split('.')[-1] if '.' in file_name else 'pdf'
+    unique_file_name = f"{folder}/{uuid.uuid4()}.{file_extension}"
+    
+    try:
+        if len(file_base64) // 4 * 3 > MULTIPART_THRESHOLD:
+            multipart_upload(
+                get_s3_client(), unique_file_name, file_type,
+                iter_base64_chunks(file_base64, MULTIPART_PART_SIZE)
+            )
+        else:
+            file_data = base64.b64decode(''.join(file_base64.split()), validate=True)
+            get_s3_client().put_object(
+                Bucket='files',
+                Key=unique_file_name,
+                Body=file_data,
+                ContentType=file_type
+            )
+    except binascii.Error:
+        return json_response(400, {'error': 'Файл не является корректным base64'})
+    
+    cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{unique_file_name}"
+    request_image_variants(cdn_url, file_type)
+    
+    return json_response(200, {
+        'url': cdn_url,
+        'fileName': file_name,
+        'message': 'Файл успешно загружен'
+    })
+
+
+ROUTES = {'POST': upload_file}
+
+
+def handler(event: dict, context) -> dict:
+    """API для загрузки файлов в S3 хранилище"""
+    return dispatch(ROUTES, event, context)
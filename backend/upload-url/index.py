@@ -0,0 +1,531 @@
+import json
+import os
+import contextvars
+import re
+import uuid
+import psycopg2
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Блоки между маркерами runtime:* — копии секций backend/_runtime.py; правятся там и переносятся scripts/sync_runtime.py
+CORS_ALLOW_METHODS = 'POST, OPTIONS'
+CORS_ALLOW_HEADERS = 'Content-Type'
+
+
+# >>> runtime:trace
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', 'true') == 'true'
+TRACE_SERVER_TIMING = os.environ.get('TRACE_SERVER_TIMING', 'false') == 'true'
+TRACE_MAX_SPANS = int(os.environ.get('TRACE_MAX_SPANS', '200'))
+_trace_spans = contextvars.ContextVar('trace_spans', default=None)
+
+
+def record_span(name: str, detail, started: float) -> None:
+    '''Добавляет завершившийся участок в трассу текущего запроса, если она ведётся'''
+    spans = _trace_spans.get()
+    if spans is not None and len(spans) < TRACE_MAX_SPANS:
+        spans.append((name, detail, started, time.perf_counter()))
+
+
+def finish_trace(event: dict, context, response: dict, spans: list, started: float) -> dict:
+    '''Пишет трассу запроса одной JSON-строкой и при TRACE_SERVER_TIMING добавляет заголовок Server-Timing'''
+    total_ms = (time.perf_counter() - started) * 1000
+    totals = {}
+    for name, _, span_started, span_ended in spans:
+        count, ms = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, ms + (span_ended - span_started) * 1000)
+    print(json.dumps({'trace': {
+        'request_id': getattr(context, 'request_id', None),
+        'method': event.get('httpMethod'),
+        'status': response.get('statusCode'),
+        'total_ms': round(total_ms, 2),
+        'totals': {name: {'count': count, 'ms': round(ms, 2)} for name, (count, ms) in totals.items()},
+        'spans': [
+            {'name': name, 'detail': detail, 'at_ms': round((s - started) * 1000, 2), 'ms': round((e - s) * 1000, 2)}
+            for name, detail, s, e in spans
+        ]
+    }}, ensure_ascii=False, default=str))
+    if TRACE_SERVER_TIMING:
+        timing = ', '.join(
+            [f'{name};dur={ms:.1f};desc="{count}"' for name, (count, ms) in totals.items()] + [f'app;dur={total_ms:.1f}']
+        )
+        headers = dict(response.get('headers') or {})
+        headers['Server-Timing'] = headers['Server-Timing'] + ', ' + timing if headers.get('Server-Timing') else timing
+        if 'Server-Timing' not in headers.get('Access-Control-Expose-Headers', ''):
+            headers['Access-Control-Expose-Headers'] = ', '.join(
+                filter(None, [headers.get('Access-Control-Expose-Headers'), 'Server-Timing'])
+            )
+        response = dict(response, headers=headers)
+    return response
+# <<< runtime:trace
+
+
+# >>> runtime:span
+@contextmanager
+def span(name: str, detail=None):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, detail, started)
+# <<< runtime:span
+
+
+# >>> runtime:sql-trace
+TRACE_SQL_MAX_LENGTH = int(os.environ.get('TRACE_SQL_MAX_LENGTH', '300'))
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_normalized_sql = {}
+_traced_cursor_classes = {}
+_query_observers = []
+
+
+def normalize_sql(query) -> str:
+    '''Текст запроса без литералов и лишних пробелов; результат кешируется по исходной строке'''
+    text = _normalized_sql.get(query)
+    if text is None:
+        raw = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+        text = _SQL_LITERALS.sub('?', ' '.join(raw.split()))[:TRACE_SQL_MAX_LENGTH]
+        if len(_normalized_sql) < 1024:
+            _normalized_sql[query] = text
+    return text
+
+
+def traced_cursor_class(base):
+    '''Подкласс курсора, который засекает execute/executemany/copy_expert как участки db.query'''
+    cls = _traced_cursor_classes.get(base)
+    if cls is None:
+        class TracedCursor(base):
+            def execute(self, query, vars=None):
+                if _trace_spans.get() is None and not _query_observers:
+                    return super().execute(query, vars)
+                started = time.perf_counter()
+                with span('db.query', normalize_sql(query)):
+                    result = super().execute(query, vars)
+                # У именованного курсора execute — это только DECLARE; его выборку наблюдателям отдаёт stream_json_array
+                if self.name is None:
+                    for observer in _query_observers:
+                        observer(self.connection, query, vars, started)
+                return result
+
+            def executemany(self, query, vars_list):
+                if _trace_spans.get() is None:
+                    return super().executemany(query, vars_list)
+                with span('db.query', normalize_sql(query)):
+                    return super().executemany(query, vars_list)
+
+            def copy_expert(self, sql, file, size=8192):
+                if _trace_spans.get() is None:
+                    return super().copy_expert(sql, file, size)
+                with span('db.copy', normalize_sql(sql)):
+                    return super().copy_expert(sql, file, size)
+
+        cls = _traced_cursor_classes[base] = TracedCursor
+    return cls
+
+
+class TracingConnection(psycopg2.extensions.connection):
+    '''Соединение, все курсоры которого (включая RealDictCursor и именованные) пишут участки в трассу'''
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = traced_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+# <<< runtime:sql-trace
+
+
+# >>> runtime:pool
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_HEALTHCHECK_AFTER = float(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', '30'))
+DB_POOL_LOG_EVERY_RELEASE = os.environ.get('DB_POOL_LOG_EVERY_RELEASE', 'false') == 'true'
+_pool_cond = threading.Condition()
+_pool_idle = []
+_pool_size = 0
+_pool_stats = {'hits': 0, 'misses': 0, 'waits': 0, 'wait_ms': 0.0, 'evicted': 0}
+
+
+def _pool_snapshot(event: str) -> str:
+    '''Строка лога со счётчиками пула; собирается под _pool_cond, печатается уже без блокировки'''
+    return json.dumps({'db_pool': dict(_pool_stats, event=event, size=_pool_size, idle=len(_pool_idle))})
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_alive(conn) -> bool:
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def get_connection():
+    '''Выдаёт соединение из пула, который живёт между тёплыми вызовами функции.
+
+    В лог пишется только рост пула (новое соединение) и его исчерпание (ожидание свободного).
+    '''
+    global _pool_size
+    started = time.monotonic()
+    exhausted = None
+    with _pool_cond:
+        now = time.monotonic()
+        for item in [i for i in _pool_idle if now - i[1] > DB_POOL_IDLE_TIMEOUT]:
+            _pool_idle.remove(item)
+            _close_quietly(item[0])
+            _pool_size -= 1
+            _pool_stats['evicted'] += 1
+        if not _pool_idle and _pool_size >= DB_POOL_MAX_SIZE:
+            _pool_stats['waits'] += 1
+            exhausted = _pool_snapshot('exhausted')
+            while not _pool_idle and _pool_size >= DB_POOL_MAX_SIZE:
+                _pool_cond.wait()
+        _pool_stats['wait_ms'] += (time.monotonic() - started) * 1000
+        if _pool_idle:
+            conn, last_used = _pool_idle.pop()
+        else:
+            conn, last_used = None, None
+            _pool_size += 1
+    if exhausted:
+        print(exhausted)
+
+    if conn is not None:
+        idle_for = time.monotonic() - last_used
+        if not conn.closed and (idle_for < DB_POOL_HEALTHCHECK_AFTER or _is_alive(conn)):
+            with _pool_cond:
+                _pool_stats['hits'] += 1
+            return conn
+        _close_quietly(conn)
+        with _pool_cond:
+            _pool_stats['evicted'] += 1
+
+    try:
+        with span('db.connect'):
+            conn = psycopg2.connect(os.environ['DATABASE_URL'], connection_factory=TracingConnection)
+    except Exception:
+        with _pool_cond:
+            _pool_size -= 1
+            _pool_cond.notify()
+        raise
+    with _pool_cond:
+        _pool_stats['misses'] += 1
+        grew = _pool_snapshot('grew')
+    print(grew)
+    return conn
+
+
+def release_connection(conn) -> None:
+    '''Возвращает соединение в пул; разорванные соединения отбрасываются'''
+    global _pool_size
+    if not conn.closed:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            _close_quietly(conn)
+    with _pool_cond:
+        if conn.closed:
+            _pool_size -= 1
+        else:
+            _pool_idle.append((conn, time.monotonic()))
+        _pool_cond.notify()
+        released = _pool_snapshot('released') if DB_POOL_LOG_EVERY_RELEASE else None
+    if released:
+        print(released)
+
+
+@contextmanager
+def db_connection():
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+# <<< runtime:pool
+
+
+# >>> runtime:http
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_RESPONSE = {
+    'statusCode': 200,
+    'headers': {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': CORS_ALLOW_METHODS,
+        'Access-Control-Allow-Headers': CORS_ALLOW_HEADERS,
+        'Access-Control-Max-Age': '86400'
+    },
+    'body': '',
+    'isBase64Encoded': False
+}
+METHOD_NOT_ALLOWED_RESPONSE = {
+    'statusCode': 405,
+    'headers': JSON_HEADERS,
+    'body': '{"error": "Method not allowed"}',
+    'isBase64Encoded': False
+}
+
+
+class HttpError(Exception):
+    '''Ошибка с готовым HTTP-статусом; dispatch() превращает её в JSON-ответ'''
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(status: int, payload, headers: dict = JSON_HEADERS) -> dict:
+    body = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+    return {'statusCode': status, 'headers': headers, 'body': body, 'isBase64Encoded': False}
+
+
+def dispatch(routes: dict, event: dict, context, default_method: str = 'GET') -> dict:
+    '''Выбирает обработчик по HTTP-методу и переводит исключения в ответы.
+
+    Ответы на OPTIONS и неизвестный метод собраны заранее и не аллоцируются на каждый вызов.
+    Остальные запросы трассируются: участки БД, S3 и внешних HTTP-вызовов пишутся одной JSON-строкой в лог.
+    '''
+    method = event.get('httpMethod', default_method)
+    if method == 'OPTIONS':
+        return PREFLIGHT_RESPONSE
+    route = routes.get(method)
+    if route is None:
+        return METHOD_NOT_ALLOWED_RESPONSE
+    spans = [] if TRACE_ENABLED else None
+    token = _trace_spans.set(spans)
+    started = time.perf_counter()
+    try:
+        response = route(event, context)
+    except HttpError as e:
+        response = json_response(e.status, {'error': str(e)})
+    except json.JSONDecodeError:
+        response = json_response(400, {'error': 'Invalid JSON body'})
+    except Exception as e:
+        response = json_response(500, {'error': str(e)})
+    finally:
+        _trace_spans.reset(token)
+    if spans is None:
+        return response
+    return finish_trace(event, context, response, spans, started)
+# <<< runtime:http
+
+
+# >>> runtime:s3
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '10'))
+S3_MAX_ATTEMPTS = int(os.environ.get('S3_MAX_ATTEMPTS', '3'))
+_s3_client = None
+_s3_lock = threading.Lock()
+
+
+def _s3_before_call(context, model=None, **kwargs):
+    context['trace_started'] = time.perf_counter()
+    context['trace_operation'] = model.name if model is not None else kwargs.get('event_name', '').rsplit('.', 1)[-1]
+
+
+def _s3_after_call(context, **kwargs):
+    if 'trace_started' in context:
+        record_span('s3.' + context.pop('trace_operation', ''), None, context.pop('trace_started'))
+
+
+def _s3_after_call_error(context, exception=None, **kwargs):
+    # botocore передаёт сюда только exception и context; исключение из обработчика заслонило бы ошибку S3
+    if 'trace_started' in context:
+        record_span(
+            's3.' + context.pop('trace_operation', ''),
+            {'error': type(exception).__name__},
+            context.pop('trace_started')
+        )
+
+
+def instrument_s3(client):
+    '''Засекает каждый вызов S3 через события botocore как участок s3.<Операция>'''
+    client.meta.events.register('before-call.s3', _s3_before_call)
+    client.meta.events.register('after-call.s3', _s3_after_call)
+    client.meta.events.register('after-call-error.s3', _s3_after_call_error)
+    return client
+
+
+def get_s3_client():
+    '''Клиент S3 создаётся один раз на инстанс и переиспользует keep-alive соединения'''
+    global _s3_client
+    if _s3_client is None:
+        with _s3_lock:
+            if _s3_client is None:
+                import boto3
+                from botocore.config import Config
+                _s3_client = boto3.client('s3',
+                    endpoint_url='https://bucket.poehali.dev',
+                    aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+                    aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],
+                    config=Config(
+                        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                        retries={'max_attempts': S3_MAX_ATTEMPTS, 'mode': 'standard'},
+                        connect_timeout=5,
+                        read_timeout=60,
+                        tcp_keepalive=True
+                    )
+                )
+                instrument_s3(_s3_client)
+    return _s3_client
+# <<< runtime:s3
+
+
+# >>> runtime:image-variants
+IMAGE_VARIANTS_URL = os.environ.get('IMAGE_VARIANTS_URL', '')
+IMAGE_VARIANTS_TIMEOUT = float(os.environ.get('IMAGE_VARIANTS_TIMEOUT', '20'))
+IMAGE_VARIANTS_SOURCE_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/gif')
+
+
+def request_image_variants(source_url: str, content_type: str) -> None:
+    '''Просит функцию image-variants нарезать копии только что загруженной картинки.
+
+    Ошибка не роняет загрузку: она пишется в лог, а пропущенные работы
+    достраивает scripts/backfill_image_variants.py.
+    '''
+    if not IMAGE_VARIANTS_URL or (content_type or '').split(';')[0] not in IMAGE_VARIANTS_SOURCE_TYPES:
+        return
+    import urllib.request
+    request = urllib.request.Request(
+        IMAGE_VARIANTS_URL,
+        data=json.dumps({'url': source_url}).encode(),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    started = time.perf_counter()
+    error = None
+    try:
+        with urllib.request.urlopen(request, timeout=IMAGE_VARIANTS_TIMEOUT) as response:
+            response.read()
+    except (OSError, ValueError) as exc:
+        error = f'{type(exc).__name__}: {exc}'
+        print(json.dumps({'image_variants': {'url': source_url, 'error': error}}, ensure_ascii=False))
+    record_span('http.image_variants', {'error': error} if error else None, started)
+# <<< runtime:image-variants
+
+
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(200 * 1024 * 1024)))
+UPLOAD_URL_EXPIRES = int(os.environ.get('UPLOAD_URL_EXPIRES', '900'))
+ALLOWED_TYPE_PREFIXES = ('image/', 'video/', 'application/pdf')
+# Папка становится префиксом ключа, поэтому принимаются только известные имена без «/» и «..»
+UPLOAD_FOLDERS = ('works', 'receipts', 'contests', 'rules', 'diplomas')
+
+
+def presign_upload(body: dict) -> dict:
+    '''Проверяет заявленные тип и размер и выдаёт подписанную ссылку на PUT или POST'''
+    file_name = body.get('fileName')
+    file_type = body.get('fileType')
+    size = body.get('size')
+    folder = body.get('folder', 'works')
+    mode = body.get('mode', 'put')
+    
+    if not file_name or not file_type or not isinstance(size, int):
+        return json_response(400, {'error': 'fileName, fileType и size обязательны'})
+    if not file_type.startswith(ALLOWED_TYPE_PREFIXES):
+        return json_response(400, {'error': 'Недопустимый тип файла'})
+    if folder not in UPLOAD_FOLDERS:
+        return json_response(400, {'error': 'Недопустимая папка', 'folders': list(UPLOAD_FOLDERS)})
+    if size <= 0 or size > UPLOAD_MAX_BYTES:
+        return json_response(413, {'error': 'Файл слишком большой', 'maxBytes': UPLOAD_MAX_BYTES})
+    
+    file_extension = file_name.split('.')[-1] if '.' in file_name else 'bin'
+    object_key = f"{folder}/{uuid.uuid4()}.{file_extension}"
+    
+    # Клиент S3 создаётся только для прошедшего проверку запроса: отказ 400 не зависит от boto3 и ключей S3
+    s3 = get_s3_client()
+    if mode == 'post':
+        presigned = s3.generate_presigned_post(
+            Bucket='files',
+            Key=object_key,
+            Fields={'Content-Type': file_type},
+            Conditions=[
+                {'Content-Type': file_type},
+                ['content-length-range', 1, size]
+            ],
+            ExpiresIn=UPLOAD_URL_EXPIRES
+        )
+        upload = {'method': 'POST', 'url': presigned['url'], 'fields': presigned['fields']}
+    else:
+        url = s3.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': 'files', 'Key': object_key, 'ContentType': file_type, 'ContentLength': size},
+            ExpiresIn=UPLOAD_URL_EXPIRES
+        )
+        upload = {'method': 'PUT', 'url': url, 'headers': {'Content-Type': file_type}}
+    
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute('''
+                INSERT INTO uploads (object_key, file_name, content_type, declared_size, status)
+                VALUES (%s, %s, %s, %s, 'pending')
+            ''', (object_key, file_name, file_type, size))
+        conn.commit()
+    
+    return json_response(200, {'key': object_key, 'expiresIn': UPLOAD_URL_EXPIRES, 'upload': upload})
+
+
+def complete_upload(body: dict) -> dict:
+    '''Сверяет фактический размер объекта с заявленным и помечает загрузку завершённой'''
+    object_key = body.get('key')
+    if not object_key:
+        return json_response(400, {'error': 'Missing key'})
+    
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                'SELECT declared_size, status FROM uploads WHERE object_key = %s',
+                (object_key,)
+            )
+            row = cur.fetchone()
+            if not row:
+                return json_response(404, {'error': 'Upload not found'})
+            
+            s3 = get_s3_client()
+            try:
+                head = s3.head_object(Bucket='files', Key=object_key)
+            except s3.exceptions.ClientError:
+                return json_response(409, {'error': 'Файл ещё не загружен'})
+            
+            if head['ContentLength'] > row[0]:
+                s3.delete_object(Bucket='files', Key=object_key)
+                cur.execute("UPDATE uploads SET status = 'rejected' WHERE object_key = %s", (object_key,))
+                conn.commit()
+                return json_response(413, {'error': 'Размер файла превышает заявленный'})
+            
+            cur.execute('''
+                UPDATE uploads
+                SET status = 'completed', size = %s, completed_at = CURRENT_TIMESTAMP
+                WHERE object_key = %s
+            ''', (head['ContentLength'], object_key))
+        conn.commit()
+    
+    cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{object_key}"
+    request_image_variants(cdn_url, head.get('ContentType'))
+    return json_response(200, {'key': object_key, 'url': cdn_url, 'size': head['ContentLength']})
+
+
+UPLOAD_ACTIONS = {
+    'presign': presign_upload,
+    'complete': complete_upload
+}
+
+
+def upload_action(event: dict, context) -> dict:
+    body = json.loads(event.get('body', '{}'))
+    action = body.get('action', 'presign')
+    route = UPLOAD_ACTIONS.get(action)
+    if route is None:
+        raise HttpError(400, f'Unknown action: {action}')
+    return route(body)
+
+
+ROUTES = {'POST': upload_action}
+
+
+def handler(event: dict, context) -> dict:
+    '''API для прямой загрузки файлов в S3 по подписанным ссылкам: выдача ссылки и подтверждение загрузки'''
+    return dispatch(ROUTES, event, context)
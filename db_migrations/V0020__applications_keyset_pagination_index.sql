@@ -0,0 +1,7 @@
+-- Индексы под постраничную выдачу заявок.
+-- Корзина (deleted_at IS NOT NULL) листается keyset по (deleted_at, created_at, id)
+DROP INDEX IF EXISTS idx_applications_deleted_at;
+CREATE INDEX IF NOT EXISTS idx_applications_deleted_at ON applications(deleted_at DESC, created_at DESC, id DESC);
+-- Основной список (deleted_at IS NULL) листается по (created_at, id): частичный индекс
+-- отдаёт страницу Index Scan без сортировки, а в индекс по deleted_at этот порядок не попадает
+CREATE INDEX IF NOT EXISTS idx_applications_active_created_at ON applications(created_at DESC, id DESC) WHERE deleted_at IS NULL;
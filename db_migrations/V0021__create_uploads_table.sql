@@ -0,0 +1,14 @@
+-- Загрузки по подписанным ссылкам: файл идёт напрямую в S3, функция только фиксирует ключ
+CREATE TABLE IF NOT EXISTS t_p93576920_talent_studio_projec.uploads (
+    id SERIAL PRIMARY KEY,
+    object_key TEXT UNIQUE NOT NULL,
+    file_name VARCHAR(255),
+    content_type VARCHAR(100),
+    declared_size BIGINT NOT NULL,
+    size BIGINT,
+    status VARCHAR(20) DEFAULT 'pending' CHECK (status IN ('pending', 'completed', 'rejected')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP,
+    -- Заявка, к которой привязан файл, ставит отметку в своей транзакции: один ключ — одна заявка
+    consumed_at TIMESTAMP
+);
@@ -0,0 +1,8 @@
+-- Храним только ключ объекта в S3 вместо base64 файла работы
+ALTER TABLE t_p93576920_talent_studio_projec.applications 
+ADD COLUMN IF NOT EXISTS work_file_key TEXT;
+
+-- Частичный индекс для пакетного переноса оставшихся встроенных файлов
+CREATE INDEX IF NOT EXISTS idx_applications_inline_work_file 
+ON t_p93576920_talent_studio_projec.applications(id) 
+WHERE work_file IS NOT NULL;
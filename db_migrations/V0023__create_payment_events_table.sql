@@ -0,0 +1,10 @@
+-- Журнал уведомлений ЮКассы: повторная доставка того же события отсекается уникальным ключом
+CREATE TABLE IF NOT EXISTS t_p93576920_talent_studio_projec.payment_events (
+    id SERIAL PRIMARY KEY,
+    payment_id VARCHAR(100) NOT NULL,
+    event VARCHAR(100) NOT NULL,
+    application_id INTEGER NOT NULL,
+    status VARCHAR(50),
+    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (payment_id, event)
+);
@@ -0,0 +1,11 @@
+-- Очередь уведомлений ЮКассы: необработанные события ждут пакетного применения
+ALTER TABLE t_p93576920_talent_studio_projec.payment_events 
+ADD COLUMN IF NOT EXISTS processed_at TIMESTAMP;
+
+UPDATE t_p93576920_talent_studio_projec.payment_events 
+SET processed_at = received_at 
+WHERE processed_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_payment_events_pending 
+ON t_p93576920_talent_studio_projec.payment_events(id) 
+WHERE processed_at IS NULL;
@@ -0,0 +1,2 @@
+-- Один результат на заявку: нужен для слияния импорта через ON CONFLICT (application_id)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_results_application_id ON results(application_id);
@@ -0,0 +1,15 @@
+-- Подстрочный поиск по названию конкурса (ILIKE '%...%') через trigram-индекс
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_results_contest_name_trgm 
+ON results USING gin (contest_name gin_trgm_ops);
+
+-- Составные индексы под реальные комбинации фильтров и keyset-пагинацию
+CREATE INDEX IF NOT EXISTS idx_results_contest_place 
+ON results(contest_id, place);
+
+CREATE INDEX IF NOT EXISTS idx_results_result_created 
+ON results(result, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_results_created_id 
+ON results(created_at DESC, id DESC);
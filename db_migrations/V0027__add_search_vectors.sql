@@ -0,0 +1,26 @@
+-- Полнотекстовый поиск (русская конфигурация) по заявкам, результатам и конкурсам
+ALTER TABLE t_p93576920_talent_studio_projec.applications 
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian'::regconfig, coalesce(full_name, '')), 'A') ||
+    setweight(to_tsvector('russian'::regconfig, coalesce(work_title, '')), 'B') ||
+    setweight(to_tsvector('russian'::regconfig, coalesce(teacher, '') || ' ' || coalesce(institution, '')), 'C') ||
+    setweight(to_tsvector('russian'::regconfig, coalesce(contest_name, '')), 'D')
+) STORED;
+
+ALTER TABLE t_p93576920_talent_studio_projec.results 
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian'::regconfig, coalesce(full_name, '')), 'A') ||
+    setweight(to_tsvector('russian'::regconfig, coalesce(work_title, '')), 'B') ||
+    setweight(to_tsvector('russian'::regconfig, coalesce(teacher, '') || ' ' || coalesce(institution, '')), 'C') ||
+    setweight(to_tsvector('russian'::regconfig, coalesce(contest_name, '')), 'D')
+) STORED;
+
+ALTER TABLE t_p93576920_talent_studio_projec.contests 
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian'::regconfig, coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('russian'::regconfig, coalesce(description, '')), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_applications_search ON t_p93576920_talent_studio_projec.applications USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS idx_results_search ON t_p93576920_talent_studio_projec.results USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS idx_contests_search ON t_p93576920_talent_studio_projec.contests USING gin (search_vector);
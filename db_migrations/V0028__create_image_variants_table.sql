@@ -0,0 +1,9 @@
+-- Уменьшенные копии работ для галереи (WebP/AVIF нескольких ширин) и исходные размеры
+CREATE TABLE IF NOT EXISTS t_p93576920_talent_studio_projec.image_variants (
+    source_url TEXT PRIMARY KEY,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    variants JSONB NOT NULL DEFAULT '[]'::jsonb,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,113 @@
+-- Витрина для публичных результатов и галереи: только строки с согласием на публикацию,
+-- только нужные колонки. Поддерживается триггерами построчно, полная пересборка не нужна.
+CREATE TABLE IF NOT EXISTS t_p93576920_talent_studio_projec.public_results (
+    id INTEGER PRIMARY KEY,
+    full_name VARCHAR(255) NOT NULL,
+    age INTEGER,
+    teacher VARCHAR(255),
+    institution VARCHAR(255),
+    work_title VARCHAR(255),
+    contest_name VARCHAR(255),
+    result VARCHAR(100),
+    work_file_url TEXT,
+    width INTEGER,
+    height INTEGER,
+    variants JSONB NOT NULL DEFAULT '[]'::jsonb,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_public_results_created_at 
+ON t_p93576920_talent_studio_projec.public_results(created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_public_results_gallery 
+ON t_p93576920_talent_studio_projec.public_results(created_at DESC, id DESC) 
+WHERE work_file_url IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION t_p93576920_talent_studio_projec.sync_public_results() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.id <> NEW.id) THEN
+        DELETE FROM t_p93576920_talent_studio_projec.public_results WHERE id = OLD.id;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+
+    IF NEW.gallery_consent IS NOT TRUE THEN
+        DELETE FROM t_p93576920_talent_studio_projec.public_results WHERE id = NEW.id;
+        RETURN NEW;
+    END IF;
+
+    INSERT INTO t_p93576920_talent_studio_projec.public_results AS p (
+        id, full_name, age, teacher, institution, work_title, contest_name, result,
+        work_file_url, width, height, variants, created_at, updated_at
+    )
+    SELECT NEW.id, NEW.full_name, NEW.age, NEW.teacher, NEW.institution, NEW.work_title,
+           NEW.contest_name, NEW.result, NEW.work_file_url,
+           v.width, v.height, COALESCE(v.variants, '[]'::jsonb), NEW.created_at, NEW.updated_at
+    FROM (SELECT 1) one
+    LEFT JOIN t_p93576920_talent_studio_projec.image_variants v ON v.source_url = NEW.work_file_url
+    ON CONFLICT (id) DO UPDATE SET
+        full_name = EXCLUDED.full_name, age = EXCLUDED.age, teacher = EXCLUDED.teacher,
+        institution = EXCLUDED.institution, work_title = EXCLUDED.work_title,
+        contest_name = EXCLUDED.contest_name, result = EXCLUDED.result,
+        work_file_url = EXCLUDED.work_file_url, width = EXCLUDED.width, height = EXCLUDED.height,
+        variants = EXCLUDED.variants, created_at = EXCLUDED.created_at, updated_at = EXCLUDED.updated_at;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p93576920_talent_studio_projec.sync_public_results_variants() RETURNS trigger AS $$
+BEGIN
+    UPDATE t_p93576920_talent_studio_projec.public_results
+    SET width = NEW.width, height = NEW.height, variants = NEW.variants
+    WHERE work_file_url = NEW.source_url;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_results_public_sync ON t_p93576920_talent_studio_projec.results;
+CREATE TRIGGER trg_results_public_sync
+AFTER INSERT OR UPDATE OR DELETE ON t_p93576920_talent_studio_projec.results
+FOR EACH ROW EXECUTE FUNCTION t_p93576920_talent_studio_projec.sync_public_results();
+
+DROP TRIGGER IF EXISTS trg_image_variants_public_sync ON t_p93576920_talent_studio_projec.image_variants;
+CREATE TRIGGER trg_image_variants_public_sync
+AFTER INSERT OR UPDATE ON t_p93576920_talent_studio_projec.image_variants
+FOR EACH ROW EXECUTE FUNCTION t_p93576920_talent_studio_projec.sync_public_results_variants();
+
+-- Полная сверка витрины с results без блокировки читателей: строки обновляются
+-- на месте, лишние удаляются. Нужна после ручных правок в обход триггеров.
+CREATE OR REPLACE FUNCTION t_p93576920_talent_studio_projec.refresh_public_results() RETURNS INTEGER AS $$
+DECLARE
+    affected INTEGER;
+BEGIN
+    DELETE FROM t_p93576920_talent_studio_projec.public_results p
+    WHERE NOT EXISTS (
+        SELECT 1 FROM t_p93576920_talent_studio_projec.results r
+        WHERE r.id = p.id AND r.gallery_consent = true
+    );
+
+    INSERT INTO t_p93576920_talent_studio_projec.public_results AS p (
+        id, full_name, age, teacher, institution, work_title, contest_name, result,
+        work_file_url, width, height, variants, created_at, updated_at
+    )
+    SELECT r.id, r.full_name, r.age, r.teacher, r.institution, r.work_title, r.contest_name, r.result,
+           r.work_file_url, v.width, v.height, COALESCE(v.variants, '[]'::jsonb), r.created_at, r.updated_at
+    FROM t_p93576920_talent_studio_projec.results r
+    LEFT JOIN t_p93576920_talent_studio_projec.image_variants v ON v.source_url = r.work_file_url
+    WHERE r.gallery_consent = true
+    ON CONFLICT (id) DO UPDATE SET
+        full_name = EXCLUDED.full_name, age = EXCLUDED.age, teacher = EXCLUDED.teacher,
+        institution = EXCLUDED.institution, work_title = EXCLUDED.work_title,
+        contest_name = EXCLUDED.contest_name, result = EXCLUDED.result,
+        work_file_url = EXCLUDED.work_file_url, width = EXCLUDED.width, height = EXCLUDED.height,
+        variants = EXCLUDED.variants, created_at = EXCLUDED.created_at, updated_at = EXCLUDED.updated_at
+    WHERE (p.*) IS DISTINCT FROM (EXCLUDED.*);
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Первичное наполнение витрины
+SELECT t_p93576920_talent_studio_projec.refresh_public_results();
@@ -0,0 +1,64 @@
+'''Строит уменьшенные копии для всех работ галереи, у которых их ещё нет.
+
+Нарезка идёт в пуле процессов (по процессу на ядро), запись в базу — в основном процессе.
+
+    DATABASE_URL=... AWS_ACCESS_KEY_ID=... AWS_SECRET_ACCESS_KEY=... \
+        python scripts/backfill_image_variants.py --workers 4
+'''
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from load_function import load_function
+
+_variants = None
+
+
+def _init_worker() -> None:
+    global _variants
+    _variants = load_function('image-variants')
+
+
+def _build(source_url: str):
+    return source_url, _variants.build_variants(source_url)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--limit', type=int, default=0)
+    args = parser.parse_args()
+
+    variants = load_function('image-variants')
+    with variants.db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute('''
+                SELECT DISTINCT r.work_file_url
+                FROM results r
+                LEFT JOIN image_variants v ON v.source_url = r.work_file_url
+                WHERE r.gallery_consent = true
+                    AND COALESCE(r.work_file_url, '') <> ''
+                    AND v.source_url IS NULL
+            ''' + (' LIMIT %s' % args.limit if args.limit > 0 else ''))
+            urls = [row[0] for row in cur.fetchall()]
+
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(_build, url) for url in urls]
+            for future in as_completed(futures):
+                try:
+                    source_url, info = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f'failed: {e}')
+                    continue
+                variants.save_variants(conn, source_url, info)
+                done += 1
+                if done % 50 == 0:
+                    print(f'{done}/{len(urls)}')
+
+    print(f'done: {done}, failed: {failed}, total: {len(urls)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+'''Переносит base64 файлы работ из applications.work_file в S3 и очищает колонку.
+
+Разовый скрипт: обрабатывает заявки пакетами по id, в памяти держит не больше
+одного файла, после каждого пакета делает commit. Повторный запуск продолжает
+с оставшихся строк.
+
+    DATABASE_URL=... AWS_ACCESS_KEY_ID=... AWS_SECRET_ACCESS_KEY=... \
+        python scripts/backfill_work_files.py --batch-size 50
+'''
+import argparse
+import base64
+import hashlib
+import os
+import time
+import uuid
+
+import boto3
+import psycopg2
+
+
+CDN_URL_MARKER = '/bucket/'
+
+
+def key_from_url(work_file_url: str):
+    '''Ключ объекта из CDN-ссылки вида https://cdn.poehali.dev/projects/<id>/bucket/<ключ>'''
+    if not work_file_url or not work_file_url.startswith('https://cdn.poehali.dev/projects/'):
+        return None
+    key = work_file_url.split(CDN_URL_MARKER, 1)[1] if CDN_URL_MARKER in work_file_url else ''
+    return key or None
+
+
+def stored_object_matches(s3, key: str, data: bytes, md5_hex: str):
+    '''None — объекта нет; True — под ключом лежит этот же файл; False — чужой или непроверяемый объект'''
+    try:
+        head = s3.head_object(Bucket='files', Key=key)
+    except s3.exceptions.ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    # ETag совпадает с MD5 только у объектов, загруженных одним запросом; составной ETag («…-N») считается несовпадением
+    return head.get('ContentLength') == len(data) and head.get('ETag', '').strip('"') == md5_hex
+
+
+def backfill(conn, s3, batch_size: int, limit: int, pause: float, dry_run: bool) -> int:
+    cdn_prefix = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/"
+    last_id = 0
+    moved = 0
+
+    while limit <= 0 or moved < limit:
+        with conn.cursor() as cur:
+            cur.execute('''
+                SELECT id FROM applications
+                WHERE work_file IS NOT NULL AND id > %s
+                ORDER BY id
+                LIMIT %s
+            ''', (last_id, batch_size))
+            ids = [row[0] for row in cur.fetchall()]
+        if not ids:
+            break
+
+        for app_id in ids:
+            last_id = app_id
+            with conn.cursor() as cur:
+                cur.execute(
+                    'SELECT work_file, work_file_key, work_file_url, file_name, file_type FROM applications WHERE id = %s',
+                    (app_id,)
+                )
+                work_file, work_file_key, work_file_url, file_name, file_type = cur.fetchone()
+                if not work_file:
+                    continue
+
+                data = base64.b64decode(work_file)
+                del work_file
+                digest = hashlib.md5(data)
+
+                # Уже загруженный файл не дублируется: ключ берётся из его URL, чтобы ключ и URL
+                # указывали на один объект. Ключи вида works/<имя файла> у разных заявок совпадают,
+                # поэтому объект переиспользуется, только если его размер и MD5 совпадают с колонкой;
+                # иначе файл кладётся под новый уникальный ключ, а чужой объект не трогается
+                key = work_file_key or key_from_url(work_file_url) or f'works/{app_id}-{file_name or "work"}'
+                stored = stored_object_matches(s3, key, data, digest.hexdigest())
+                if stored is False:
+                    key = f'works/{app_id}-{uuid.uuid4().hex}-{file_name or "work"}'
+                    stored = None
+                if stored is None and not dry_run:
+                    s3.put_object(
+                        Bucket='files',
+                        Key=key,
+                        Body=data,
+                        ContentMD5=base64.b64encode(digest.digest()).decode(),
+                        ContentType=file_type or 'application/octet-stream'
+                    )
+                del data
+                work_file_key = key
+                if key_from_url(work_file_url) != work_file_key:
+                    work_file_url = cdn_prefix + work_file_key
+
+                if not dry_run:
+                    cur.execute('''
+                        UPDATE applications
+                        SET work_file = NULL,
+                            work_file_key = %s,
+                            work_file_url = %s
+                        WHERE id = %s
+                    ''', (
+                        work_file_key,
+                        work_file_url,
+                        app_id
+                    ))
+            moved += 1
+            if limit > 0 and moved >= limit:
+                break
+
+        conn.commit()
+        print(f'moved={moved} last_id={last_id}')
+        if pause:
+            time.sleep(pause)
+
+    return moved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=0, help='максимум строк за запуск, 0 — без ограничения')
+    parser.add_argument('--pause', type=float, default=0.0, help='пауза между пакетами, секунды')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    s3 = boto3.client('s3',
+        endpoint_url='https://bucket.poehali.dev',
+        aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],
+    )
+    try:
+        moved = backfill(conn, s3, args.batch_size, args.limit, args.pause, args.dry_run)
+    finally:
+        conn.close()
+    print(f'done, moved {moved} work files')
+
+
+if __name__ == '__main__':
+    main()
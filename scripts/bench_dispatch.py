@@ -0,0 +1,100 @@
+'''Замеряет накладные расходы диспетчеризации и время импорта функций backend/.
+
+Для каждой функции в отдельном процессе измеряется импорт index.py и то, какие
+тяжёлые зависимости (boto3, requests) оказались загружены после импорта. Затем
+в текущем процессе гоняются запросы, не доходящие до базы: OPTIONS, неизвестный
+метод и вызов пустого маршрута через dispatch() с трассировкой и без неё.
+
+    python scripts/bench_dispatch.py --iterations 100000
+    python scripts/bench_dispatch.py --functions results,payment --json
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+from load_function import BACKEND_DIR, load_function
+
+HEAVY_MODULES = ('boto3', 'botocore', 'requests', 'PIL', 'openpyxl')
+
+IMPORT_PROBE = '''
+import json, sys, time
+sys.path.insert(0, {scripts!r})
+started = time.perf_counter()
+from load_function import load_function
+load_function({name!r})
+elapsed_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{'import_ms': elapsed_ms, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def list_functions() -> list:
+    return sorted(
+        name for name in os.listdir(BACKEND_DIR)
+        if os.path.isfile(os.path.join(BACKEND_DIR, name, 'index.py'))
+    )
+
+
+def measure_import(name: str) -> dict:
+    probe = IMPORT_PROBE.format(scripts=os.path.dirname(os.path.abspath(__file__)), name=name, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def per_call_us(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def measure_dispatch(module, iterations: int) -> dict:
+    preflight = {'httpMethod': 'OPTIONS'}
+    unknown = {'httpMethod': 'PATCH'}
+    empty_routes = {'GET': lambda event, context: module.PREFLIGHT_RESPONSE}
+    get = {'httpMethod': 'GET'}
+    row = {
+        'options_us': per_call_us(lambda: module.handler(preflight, None), iterations),
+        'not_allowed_us': per_call_us(lambda: module.handler(unknown, None), iterations)
+    }
+    trace_enabled = module.TRACE_ENABLED
+    try:
+        module.TRACE_ENABLED = False
+        row['empty_route_us'] = per_call_us(lambda: module.dispatch(empty_routes, get, None), iterations)
+        module.TRACE_ENABLED = True
+        with contextlib.redirect_stdout(io.StringIO()):
+            row['traced_route_us'] = per_call_us(lambda: module.dispatch(empty_routes, get, None), iterations)
+    finally:
+        module.TRACE_ENABLED = trace_enabled
+    return row
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--functions', help='через запятую; по умолчанию все функции из backend/')
+    parser.add_argument('--iterations', type=int, default=50000)
+    parser.add_argument('--json', action='store_true', help='вывести результат одним JSON-документом')
+    args = parser.parse_args()
+
+    names = args.functions.split(',') if args.functions else list_functions()
+    report = {}
+    for name in names:
+        row = measure_import(name)
+        row.update(measure_dispatch(load_function(name), args.iterations))
+        report[name] = row
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'function':<20} {'import ms':>10} {'OPTIONS us':>11} {'405 us':>8} {'route us':>9} {'traced us':>10}  heavy imports")
+    for name, row in report.items():
+        print(f"{name:<20} {row['import_ms']:>10.1f} {row['options_us']:>11.2f} {row['not_allowed_us']:>8.2f} "
+              f"{row['empty_route_us']:>9.2f} {row['traced_route_us']:>10.2f}  {', '.join(row['heavy']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
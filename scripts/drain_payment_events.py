@@ -0,0 +1,31 @@
+'''Фоновый разборщик очереди payment_events для режима WEBHOOK_MODE=queue.
+
+    DATABASE_URL=... python scripts/drain_payment_events.py --batch-size 200 --flush-interval 2
+'''
+import argparse
+import time
+
+from load_function import load_function
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--flush-interval', type=float, default=2.0, help='пауза, когда очередь пуста, секунды')
+    parser.add_argument('--once', action='store_true', help='разобрать очередь и выйти')
+    args = parser.parse_args()
+
+    webhook = load_function('payment-webhook')
+    while True:
+        with webhook.db_connection() as conn:
+            drained = webhook.drain_payment_events(conn, args.batch_size)
+        if drained:
+            print(f'applied {drained} events')
+            continue
+        if args.once:
+            break
+        time.sleep(args.flush_interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+'''Снимает планы типовых запросов results API, чтобы сравнить их до и после миграции индексов.
+
+    DATABASE_URL=... python scripts/explain_results_queries.py --out before.json
+    # применить миграции
+    DATABASE_URL=... python scripts/explain_results_queries.py --out after.json --compare before.json
+'''
+import argparse
+import json
+import os
+
+import psycopg2
+
+QUERIES = {
+    'name_search': (
+        "SELECT id, full_name, contest_name, result, place FROM results "
+        "WHERE contest_name ILIKE %s ORDER BY created_at DESC, id DESC LIMIT 50",
+        ('%натюрморт%',)
+    ),
+    'contest_place': (
+        "SELECT id, full_name, place FROM results WHERE contest_id = %s AND place = %s "
+        "ORDER BY created_at DESC, id DESC LIMIT 50",
+        (1, 1)
+    ),
+    'result_recent': (
+        "SELECT id, full_name, result, created_at FROM results WHERE result = %s "
+        "ORDER BY created_at DESC, id DESC LIMIT 50",
+        ('Победитель',)
+    ),
+    'first_page': (
+        "SELECT id, full_name, created_at FROM results ORDER BY created_at DESC, id DESC LIMIT 50",
+        ()
+    ),
+}
+
+
+def summarize(plan: dict) -> dict:
+    nodes = []
+
+    def walk(node):
+        nodes.append(node['Node Type'] + (f" on {node['Index Name']}" if 'Index Name' in node else ''))
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan['Plan'])
+    return {
+        'execution_ms': plan['Execution Time'],
+        'shared_read': plan['Plan'].get('Shared Read Blocks', 0),
+        'shared_hit': plan['Plan'].get('Shared Hit Blocks', 0),
+        'nodes': nodes,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out')
+    parser.add_argument('--compare', help='JSON предыдущего прогона')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    report = {}
+    try:
+        with conn.cursor() as cur:
+            for name, (sql, params) in QUERIES.items():
+                cur.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params)
+                report[name] = summarize(cur.fetchone()[0][0])
+        conn.rollback()
+    finally:
+        conn.close()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    for name, summary in report.items():
+        line = f"{name}: {summary['execution_ms']:.2f} ms, {' > '.join(summary['nodes'])}"
+        if name in previous:
+            line += f" (was {previous[name]['execution_ms']:.2f} ms, {' > '.join(previous[name]['nodes'])})"
+        print(line)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
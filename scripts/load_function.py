@@ -0,0 +1,16 @@
+'''Загрузка backend/<function>/index.py как модуля для локальных скриптов.'''
+import importlib.util
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+
+def load_function(name: str):
+    path = os.path.join(BACKEND_DIR, name, 'index.py')
+    module_name = 'fn_' + name.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
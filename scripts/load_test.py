@@ -0,0 +1,349 @@
+'''Нагрузочный прогон функций backend/ по сценариям из их tests.json.
+
+Сценарии берутся из tests.json каждой функции. Дополнительные сценарии и вариации
+задаются в --variants, файле вида
+    {"results": [{"name": "page", "method": "GET", "path": "/", "vary": {"limit": [10, 100]}}]}
+где vary разворачивается в декартово произведение query-параметров.
+
+Каждый сценарий гоняется --requests раз с --concurrency потоками. Есть два режима:
+- по умолчанию handler() вызывается в процессе;
+- с --http запрос идёт через локальный HTTP-шим (ThreadingHTTPServer), который
+  превращает его в event; шим можно поднять отдельно через --serve.
+
+База берётся из DATABASE_URL и должна быть одноразовой: сценарии создают и
+удаляют записи. --migrate накатывает db_migrations/ по возрастанию версии.
+Схему удобно задать в DATABASE_URL (?options=-csearch_path%3D...).
+
+S3 подменяется на moto (--s3 moto) или на MinIO/другой совместимый endpoint
+(--s3 http://localhost:9000). Бакет files создаётся автоматически. Платёжные
+сценарии ходят в YOOKASSA_API_URL, поэтому для нагрузки его стоит направить на
+заглушку или исключить функцию через --exclude payment.
+
+Отчёт: throughput и p50/p95/p99 по каждому сценарию, JSON в --output.
+С --compare выводится изменение p95 и throughput относительно прошлого отчёта.
+
+    DATABASE_URL=postgresql://localhost/talent_load python scripts/load_test.py \
+        --functions results,applications --concurrency 16 --requests 500 --output load.json
+'''
+import argparse
+import base64
+import glob
+import http.client
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from load_function import BACKEND_DIR, load_function
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'db_migrations')
+
+
+def list_functions() -> list:
+    return sorted(
+        name for name in os.listdir(BACKEND_DIR)
+        if os.path.isfile(os.path.join(BACKEND_DIR, name, 'tests.json'))
+    )
+
+
+def expand_variants(scenario: dict) -> list:
+    vary = scenario.get('vary')
+    if not vary:
+        return [scenario]
+    keys = sorted(vary)
+    expanded = []
+    for values in itertools.product(*(vary[key] for key in keys)):
+        parsed = urllib.parse.urlsplit(scenario.get('path') or '/')
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        query.update({key: str(value) for key, value in zip(keys, values)})
+        suffix = ','.join(f'{key}={value}' for key, value in zip(keys, values))
+        expanded.append(dict(
+            scenario,
+            name=f"{scenario['name']} [{suffix}]",
+            path=parsed.path + '?' + urllib.parse.urlencode(query)
+        ))
+    return expanded
+
+
+def load_scenarios(names: list, variants_path: str) -> list:
+    extra = {}
+    if variants_path:
+        with open(variants_path) as f:
+            extra = json.load(f)
+    scenarios = []
+    for name in names:
+        with open(os.path.join(BACKEND_DIR, name, 'tests.json')) as f:
+            tests = json.load(f).get('tests', [])
+        for test in tests + extra.get(name, []):
+            for scenario in expand_variants(test):
+                scenarios.append(dict(scenario, function=name))
+    return scenarios
+
+
+def build_event(method: str, path: str, headers: dict, body) -> dict:
+    parsed = urllib.parse.urlsplit(path or '/')
+    if body is not None and not isinstance(body, str):
+        body = json.dumps(body, ensure_ascii=False)
+    return {
+        'httpMethod': method,
+        'path': parsed.path,
+        'queryStringParameters': dict(urllib.parse.parse_qsl(parsed.query)),
+        'headers': headers or {},
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+
+def apply_migrations(database_url: str) -> None:
+    import psycopg2
+
+    def version(path):
+        return int(re.match(r'V(\d+)__', os.path.basename(path)).group(1))
+
+    conn = psycopg2.connect(database_url)
+    try:
+        for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, 'V*__*.sql')), key=version):
+            with open(path) as f, conn.cursor() as cur:
+                cur.execute(f.read())
+            conn.commit()
+            print(f'applied {os.path.basename(path)}')
+    finally:
+        conn.close()
+
+
+def make_s3_client(target: str):
+    import boto3
+    if target == 'moto':
+        from moto import mock_aws
+        mock_aws().start()
+        client = boto3.client('s3', region_name='us-east-1')
+    else:
+        client = boto3.client(
+            's3',
+            endpoint_url=target,
+            aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID', 'minioadmin'),
+            aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY', 'minioadmin'),
+            region_name='us-east-1'
+        )
+    try:
+        client.create_bucket(Bucket='files')
+    except client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+    return client
+
+
+def load_modules(names: list, s3_target: str) -> dict:
+    s3 = make_s3_client(s3_target) if s3_target else None
+    modules = {}
+    for name in names:
+        module = load_function(name)
+        if s3 is not None and hasattr(module, 'get_s3_client'):
+            module.get_s3_client = lambda: s3
+        modules[name] = module
+    return modules
+
+
+class ShimHandler(BaseHTTPRequestHandler):
+    '''Переводит HTTP-запрос /<функция>/<путь>?<query> в event и вызывает handler() функции'''
+
+    modules = {}
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят отдельными write; без TCP_NODELAY keep-alive упирается в delayed ACK
+    disable_nagle_algorithm = True
+
+    def _dispatch(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        function, _, rest = urllib.parse.unquote(parsed.path).lstrip('/').partition('/')
+        module = self.modules.get(function)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else None
+        if module is None:
+            response = {'statusCode': 404, 'headers': {}, 'body': json.dumps({'error': 'Unknown function'})}
+        else:
+            event = build_event(self.command, '/' + rest + '?' + parsed.query, dict(self.headers), body)
+            response = module.handler(event, None)
+        payload = response.get('body') or ''
+        payload = base64.b64decode(payload) if response.get('isBase64Encoded') else payload.encode('utf-8')
+        self.send_response(response.get('statusCode', 200))
+        for key, value in (response.get('headers') or {}).items():
+            self.send_header(key, str(value))
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_OPTIONS = _dispatch
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_shim(modules: dict, port: int) -> ThreadingHTTPServer:
+    ShimHandler.modules = modules
+    server = ThreadingHTTPServer(('127.0.0.1', port), ShimHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def in_process_caller(modules: dict):
+    def call(scenario: dict) -> int:
+        event = build_event(scenario.get('method', 'GET'), scenario.get('path'), scenario.get('headers'), scenario.get('body'))
+        return modules[scenario['function']].handler(event, None).get('statusCode')
+    return call
+
+
+def http_caller(port: int):
+    local = threading.local()
+
+    def call(scenario: dict) -> int:
+        if getattr(local, 'conn', None) is None:
+            local.conn = http.client.HTTPConnection('127.0.0.1', port)
+        body = scenario.get('body')
+        if body is not None and not isinstance(body, str):
+            body = json.dumps(body, ensure_ascii=False)
+        headers = dict(scenario.get('headers') or {}, **({'Content-Type': 'application/json'} if body else {}))
+        try:
+            local.conn.request(
+                scenario.get('method', 'GET'),
+                urllib.parse.quote('/' + scenario['function'] + (scenario.get('path') or '/'), safe='/?=&'),
+                body=body.encode('utf-8') if body else None,
+                headers=headers
+            )
+            response = local.conn.getresponse()
+            response.read()
+            return response.status
+        except Exception:
+            local.conn.close()
+            local.conn = None
+            raise
+    return call
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(int(round(q / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def run_scenario(call, scenario: dict, requests: int, concurrency: int) -> dict:
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            status = call(scenario)
+        except Exception as error:
+            status = type(error).__name__
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed_ms)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    expected = str(scenario.get('expectedStatus')) if scenario.get('expectedStatus') else None
+    return {
+        'function': scenario['function'],
+        'method': scenario.get('method', 'GET'),
+        'path': scenario.get('path') or '/',
+        'requests': requests,
+        'concurrency': concurrency,
+        'throughput_rps': round(requests / wall, 1) if wall else None,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(latencies[-1], 2) if latencies else None,
+        'statuses': statuses,
+        'unexpected': requests - statuses.get(expected, 0) if expected else 0
+    }
+
+
+def compare(report: dict, baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)['scenarios']
+    print(f"\n{'scenario':<60} {'p95 Δ%':>8} {'rps Δ%':>8}")
+    for key, row in report['scenarios'].items():
+        before = baseline.get(key)
+        if not before or not before.get('p95_ms') or not before.get('throughput_rps'):
+            continue
+        p95_delta = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        rps_delta = (row['throughput_rps'] - before['throughput_rps']) / before['throughput_rps'] * 100
+        print(f'{key[:60]:<60} {p95_delta:>+8.1f} {rps_delta:>+8.1f}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--functions', help='через запятую; по умолчанию все функции с tests.json')
+    parser.add_argument('--exclude', default='', help='функции, которые не нагружать')
+    parser.add_argument('--variants', help='JSON с дополнительными сценариями и vary-параметрами')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='запросов на сценарий')
+    parser.add_argument('--warmup', type=int, default=5, help='прогревочных запросов на сценарий, не учитываются')
+    parser.add_argument('--http', action='store_true', help='гонять запросы через локальный HTTP-шим')
+    parser.add_argument('--serve', action='store_true', help='только поднять HTTP-шим и ждать')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--s3', help='moto или URL S3-совместимого endpoint (MinIO)')
+    parser.add_argument('--migrate', action='store_true', help='накатить db_migrations/ на DATABASE_URL перед прогоном')
+    parser.add_argument('--output', help='куда записать JSON-отчёт')
+    parser.add_argument('--compare', help='прошлый JSON-отчёт для сравнения')
+    args = parser.parse_args()
+
+    names = args.functions.split(',') if args.functions else list_functions()
+    names = [name for name in names if name not in args.exclude.split(',')]
+
+    if args.migrate:
+        apply_migrations(os.environ['DATABASE_URL'])
+    modules = load_modules(names, args.s3)
+
+    if args.serve:
+        server = start_shim(modules, args.port or 8000)
+        print(f'shim listening on http://127.0.0.1:{server.server_address[1]}/<function>/')
+        threading.Event().wait()
+
+    if args.http:
+        server = start_shim(modules, args.port)
+        call = http_caller(server.server_address[1])
+    else:
+        call = in_process_caller(modules)
+
+    report = {
+        'mode': 'http' if args.http else 'in-process',
+        'python': sys.version.split()[0],
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scenarios': {}
+    }
+    print(f"{'scenario':<60} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}  statuses")
+    for scenario in load_scenarios(names, args.variants):
+        key = f"{scenario['function']}: {scenario['name']}"
+        for _ in range(args.warmup):
+            try:
+                call(scenario)
+            except Exception:
+                pass
+        row = run_scenario(call, scenario, args.requests, args.concurrency)
+        report['scenarios'][key] = row
+        print(f"{key[:60]:<60} {row['throughput_rps']:>8} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}  "
+              + ', '.join(f'{status}×{count}' for status, count in sorted(row['statuses'].items())))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+'''Профилирует холодный старт каждой функции backend/ и проверяет бюджет.
+
+Каждая функция загружается в свежем интерпретаторе с -X importtime. Сначала
+снимается разбивка импорта по модулям, затем время первого вызова handler().
+Вызывается OPTIONS и первый сценарий из tests.json функции. База берётся из
+DATABASE_URL (локальный Postgres); S3 по умолчанию подменяется заглушкой в памяти.
+
+Если импорт или первый вызов дольше бюджета, скрипт завершается с кодом 1.
+Отчёт пишется в JSON, чтобы сравнивать его между релизами.
+
+    DATABASE_URL=postgresql://localhost/talent python scripts/profile_cold_start.py \
+        --import-budget-ms 150 --first-call-budget-ms 500 --output cold_start.json
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from load_function import BACKEND_DIR
+
+MARK = '--- cold start: function import ---'
+HEAVY_MODULES = ('boto3', 'botocore', 'requests', 'urllib3', 'psycopg2', 'PIL', 'openpyxl', 'orjson')
+
+# Выполняется в дочернем процессе; печатает одну JSON-строку с замерами
+PROBE = '''
+import json, sys, time, urllib.parse
+sys.path.insert(0, {scripts!r})
+from load_function import load_function
+
+
+class StubS3:
+    """Минимальный S3 в памяти: хватает для путей, которые вызывают функции"""
+
+    class exceptions:
+        ClientError = KeyError
+
+    def __init__(self):
+        self.objects = {{}}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body if isinstance(Body, bytes) else Body.read()
+        return {{}}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        import io
+        return {{'Body': io.BytesIO(self.objects[Key])}}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        return {{'ContentLength': len(self.objects[Key])}}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self.objects.pop(Key, None)
+        return {{}}
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return 'http://stub-s3.local/' + Params['Key']
+
+    def generate_presigned_post(self, Bucket, Key, Fields, Conditions, ExpiresIn):
+        return {{'url': 'http://stub-s3.local/', 'fields': dict(Fields, key=Key)}}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.objects[Key] = b''
+        return {{'UploadId': 'stub'}}
+
+    def upload_part(self, Bucket, Key, PartNumber, UploadId, Body):
+        self.objects[Key] += Body
+        return {{'ETag': str(PartNumber)}}
+
+    def complete_multipart_upload(self, **kwargs):
+        return {{}}
+
+    def abort_multipart_upload(self, **kwargs):
+        return {{}}
+
+
+def event_from_test(test):
+    parsed = urllib.parse.urlsplit(test.get('path') or '/')
+    body = test.get('body')
+    return {{
+        'httpMethod': test.get('method', 'GET'),
+        'queryStringParameters': dict(urllib.parse.parse_qsl(parsed.query)),
+        'headers': test.get('headers') or {{}},
+        'body': body if isinstance(body, str) or body is None else json.dumps(body)
+    }}
+
+
+def timed_call(module, event):
+    started = time.perf_counter()
+    try:
+        status = module.handler(event, None).get('statusCode')
+    except Exception as error:
+        status = type(error).__name__
+    return (time.perf_counter() - started) * 1000, status
+
+
+sys.stderr.write({mark!r} + '\\n')
+sys.stderr.flush()
+started = time.perf_counter()
+module = load_function({name!r})
+import_ms = (time.perf_counter() - started) * 1000
+loaded_after_import = [m for m in {heavy!r} if m in sys.modules]
+
+if {stub_s3!r} and hasattr(module, 'get_s3_client'):
+    stub = StubS3()
+    module.get_s3_client = lambda: stub
+
+options_ms, options_status = timed_call(module, {{'httpMethod': 'OPTIONS'}})
+first_call_ms, first_call_status, scenario = None, None, None
+if {tests!r}:
+    scenario = {tests!r}[0]
+    first_call_ms, first_call_status = timed_call(module, event_from_test(scenario))
+    second_call_ms, _ = timed_call(module, event_from_test(scenario))
+else:
+    second_call_ms = None
+
+print(json.dumps({{
+    'import_ms': round(import_ms, 2),
+    'heavy_after_import': loaded_after_import,
+    'heavy_after_first_call': [m for m in {heavy!r} if m in sys.modules],
+    'options_ms': round(options_ms, 3),
+    'options_status': options_status,
+    'scenario': scenario and scenario.get('name'),
+    'first_call_ms': first_call_ms and round(first_call_ms, 2),
+    'first_call_status': first_call_status,
+    'warm_call_ms': second_call_ms and round(second_call_ms, 2)
+}}))
+'''
+
+
+def list_functions() -> list:
+    return sorted(
+        name for name in os.listdir(BACKEND_DIR)
+        if os.path.isfile(os.path.join(BACKEND_DIR, name, 'index.py'))
+    )
+
+
+def load_tests(name: str) -> list:
+    path = os.path.join(BACKEND_DIR, name, 'tests.json')
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f).get('tests', [])
+
+
+def parse_importtime(stderr: str, top: int) -> list:
+    '''Разбирает вывод -X importtime после метки и возвращает самые дорогие импорты верхнего уровня'''
+    lines = stderr.splitlines()
+    if MARK in lines:
+        lines = lines[lines.index(MARK) + 1:]
+    entries = []
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|', 2)
+        # Вложенность в выводе importtime обозначается отступом по два пробела
+        if len(name) - len(name.lstrip(' ')) == 1:
+            entries.append({
+                'module': name.strip(),
+                'self_ms': round(int(self_us) / 1000, 2),
+                'cumulative_ms': round(int(cumulative_us) / 1000, 2)
+            })
+    entries.sort(key=lambda entry: entry['cumulative_ms'], reverse=True)
+    return entries[:top]
+
+
+def profile_function(name: str, stub_s3: bool, top: int, timeout: float) -> dict:
+    probe = PROBE.format(
+        scripts=os.path.dirname(os.path.abspath(__file__)),
+        name=name,
+        mark=MARK,
+        heavy=HEAVY_MODULES,
+        stub_s3=stub_s3,
+        tests=load_tests(name)
+    )
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', probe],
+        capture_output=True, text=True, timeout=timeout, env=env
+    )
+    stdout_lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not stdout_lines:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'probe failed'}
+    row = json.loads(stdout_lines[-1])
+    row['top_imports'] = parse_importtime(completed.stderr, top)
+    return row
+
+
+def load_budgets(args) -> dict:
+    budgets = {}
+    if args.budget_file:
+        with open(args.budget_file) as f:
+            budgets = json.load(f)
+    return budgets
+
+
+def check_budget(name: str, row: dict, args, budgets: dict) -> list:
+    limits = dict(
+        {'import_ms': args.import_budget_ms, 'first_call_ms': args.first_call_budget_ms},
+        **budgets.get(name, {})
+    )
+    row['budget'] = limits
+    if 'error' in row:
+        return [f'{name}: {row["error"]}']
+    violations = []
+    for metric, limit in limits.items():
+        if limit and row.get(metric) is not None and row[metric] > limit:
+            violations.append(f'{name}: {metric}={row[metric]} > {limit}')
+    return violations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--functions', help='через запятую; по умолчанию все функции из backend/')
+    parser.add_argument('--import-budget-ms', type=float, default=float(os.environ.get('COLD_START_IMPORT_BUDGET_MS', '200')))
+    parser.add_argument('--first-call-budget-ms', type=float, default=float(os.environ.get('COLD_START_FIRST_CALL_BUDGET_MS', '1000')))
+    parser.add_argument('--budget-file', help='JSON {"функция": {"import_ms": ..., "first_call_ms": ...}} для переопределений')
+    parser.add_argument('--real-s3', action='store_true', help='не подменять S3 заглушкой')
+    parser.add_argument('--top', type=int, default=10, help='сколько самых дорогих импортов сохранить')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--output', help='куда записать JSON-отчёт')
+    args = parser.parse_args()
+
+    names = args.functions.split(',') if args.functions else list_functions()
+    budgets = load_budgets(args)
+    report = {'python': sys.version.split()[0], 'functions': {}}
+    violations = []
+    for name in names:
+        row = profile_function(name, not args.real_s3, args.top, args.timeout)
+        violations += check_budget(name, row, args, budgets)
+        report['functions'][name] = row
+
+    print(f"{'function':<20} {'import ms':>10} {'first call ms':>14} {'warm ms':>8}  slowest import")
+    for name, row in report['functions'].items():
+        if 'error' in row:
+            print(f'{name:<20} ERROR {row["error"]}')
+            continue
+        slowest = row['top_imports'][0] if row['top_imports'] else None
+        print(f"{name:<20} {row['import_ms']:>10.1f} {row['first_call_ms'] or 0:>14.1f} {row['warm_call_ms'] or 0:>8.1f}  "
+              + (f"{slowest['module']} ({slowest['cumulative_ms']} ms)" if slowest else '-'))
+
+    report['violations'] = violations
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if violations:
+        print('\nover budget:\n  ' + '\n  '.join(violations))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
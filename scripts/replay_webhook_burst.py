@@ -0,0 +1,107 @@
+'''Воспроизводит всплеск уведомлений ЮКассы против функции payment-webhook на локальной базе.
+
+Тела уведомлений берутся из JSONL-файла (одно уведомление в строке) или
+генерируются для заявок с id из --application-ids. Часть уведомлений
+повторяется, как при ретраях провайдера.
+
+    DATABASE_URL=postgresql://localhost/talent python scripts/replay_webhook_burst.py \
+        --mode queue --application-ids 1-500 --concurrency 16 --duplicates 0.3
+'''
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from load_function import load_function
+
+
+def synthetic_burst(application_ids: list, duplicates: float) -> list:
+    events = [{
+        'event': 'payment.succeeded',
+        'object': {
+            'id': f'burst-{app_id}',
+            'status': 'succeeded',
+            'metadata': {'application_id': str(app_id)}
+        }
+    } for app_id in application_ids]
+    events += random.sample(events, int(len(events) * duplicates))
+    random.shuffle(events)
+    return events
+
+
+def parse_ids(spec: str) -> list:
+    ids = []
+    for part in spec.split(','):
+        if '-' in part:
+            start, end = part.split('-')
+            ids.extend(range(int(start), int(end) + 1))
+        elif part:
+            ids.append(int(part))
+    return ids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=['inline', 'queue'], default='queue')
+    parser.add_argument('--recording', help='JSONL с записанными телами уведомлений')
+    parser.add_argument('--application-ids', default='1-100')
+    parser.add_argument('--duplicates', type=float, default=0.2)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--flush-interval', type=float, default=5.0)
+    args = parser.parse_args()
+
+    os.environ['WEBHOOK_MODE'] = args.mode
+    os.environ['WEBHOOK_BATCH_SIZE'] = str(args.batch_size)
+    os.environ['WEBHOOK_FLUSH_INTERVAL'] = str(args.flush_interval)
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(args.concurrency))
+    webhook = load_function('payment-webhook')
+
+    if args.recording:
+        with open(args.recording) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+    else:
+        events = synthetic_burst(parse_ids(args.application_ids), args.duplicates)
+
+    def deliver(body: dict):
+        started = time.monotonic()
+        response = webhook.handler({'httpMethod': 'POST', 'body': json.dumps(body)}, None)
+        return response['statusCode'], json.loads(response['body']).get('status'), time.monotonic() - started
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(deliver, events))
+    ack_seconds = time.monotonic() - started
+
+    drain_started = time.monotonic()
+    drained = 0
+    if args.mode == 'queue':
+        with webhook.db_connection() as conn:
+            while True:
+                batch = webhook.drain_payment_events(conn, args.batch_size)
+                if not batch:
+                    break
+                drained += batch
+    drain_seconds = time.monotonic() - drain_started
+
+    latencies = sorted(r[2] for r in results)
+    outcomes = {}
+    for status_code, status, _ in results:
+        key = f'{status_code}:{status}'
+        outcomes[key] = outcomes.get(key, 0) + 1
+    print(json.dumps({
+        'mode': args.mode,
+        'events': len(events),
+        'outcomes': outcomes,
+        'ack_seconds': round(ack_seconds, 3),
+        'ack_p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'ack_p95_ms': round(latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000, 2),
+        'drained_after_burst': drained,
+        'drain_seconds': round(drain_seconds, 3)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
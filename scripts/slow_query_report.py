@@ -0,0 +1,110 @@
+'''Сводит записи slow_query из логов функций в отчёт по отпечаткам запросов.
+
+Функции results, applications и gallery-works при SLOW_QUERY_MS > 0 пишут
+в лог каждый запрос дольше порога, а часть из них — вместе с планом
+EXPLAIN (ANALYZE, BUFFERS). Скрипт читает такие логи (файлы или stdin),
+группирует записи по отпечатку и показывает частоту, задержки и
+последовательные сканирования из снятых планов.
+
+    SLOW_QUERY_MS=50 SLOW_QUERY_EXPLAIN_RATE=0.2 python scripts/load_test.py ... > run.log
+    python scripts/slow_query_report.py run.log --output slow_queries.json --fail-on-seq-scan 1000
+'''
+import argparse
+import json
+import sys
+
+
+def iter_records(streams):
+    '''Достаёт {"slow_query": ...} из строк лога; префиксы платформы перед JSON пропускаются'''
+    for stream in streams:
+        for line in stream:
+            start = line.find('{"slow_query"')
+            if start < 0:
+                continue
+            try:
+                yield json.loads(line[start:])['slow_query']
+            except (ValueError, KeyError):
+                continue
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def aggregate(records) -> dict:
+    groups = {}
+    for record in records:
+        group = groups.setdefault(record['fingerprint'], {
+            'query': record['query'], 'durations': [], 'explained': 0, 'seq_scans': {}, 'slowest_plan': None
+        })
+        group['durations'].append(record['ms'])
+        explain = record.get('explain')
+        if not explain or 'error' in explain:
+            continue
+        group['explained'] += 1
+        for scan in explain['seq_scans']:
+            scanned = (scan.get('rows') or 0) + (scan.get('removed_by_filter') or 0)
+            relation = scan.get('relation')
+            group['seq_scans'][relation] = max(group['seq_scans'].get(relation, 0), scanned)
+        slowest = group['slowest_plan']
+        if slowest is None or (explain.get('execution_ms') or 0) > (slowest.get('execution_ms') or 0):
+            group['slowest_plan'] = explain
+
+    report = []
+    for fingerprint, group in groups.items():
+        durations = group.pop('durations')
+        report.append(dict(
+            group,
+            fingerprint=fingerprint,
+            count=len(durations),
+            total_ms=round(sum(durations), 2),
+            p50_ms=percentile(durations, 0.5),
+            p95_ms=percentile(durations, 0.95),
+            max_ms=max(durations)
+        ))
+    report.sort(key=lambda row: row['total_ms'], reverse=True)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('logs', nargs='*', help='файлы логов; без аргументов читается stdin')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', help='куда записать JSON-отчёт со снятыми планами')
+    parser.add_argument('--fail-on-seq-scan', type=int, metavar='ROWS',
+                        help='код 1, если в плане есть Seq Scan, просмотревший не меньше ROWS строк')
+    args = parser.parse_args()
+
+    streams = [open(path) for path in args.logs] or [sys.stdin]
+    try:
+        report = aggregate(iter_records(streams))
+    finally:
+        for stream in streams:
+            if stream is not sys.stdin:
+                stream.close()
+
+    print(f"{'fingerprint':<17} {'count':>6} {'total ms':>10} {'p50':>8} {'p95':>8} {'max':>8} {'plans':>6}  seq scans / query")
+    for row in report[:args.top]:
+        scans = ', '.join(f'{relation} ({rows} rows)' for relation, rows in row['seq_scans'].items())
+        print(f"{row['fingerprint']:<17} {row['count']:>6} {row['total_ms']:>10.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['max_ms']:>8.1f} {row['explained']:>6}  {scans or '-'}")
+        print(f"{'':<17} {row['query'][:160]}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.fail_on_seq_scan is not None:
+        violations = [
+            f"{row['fingerprint']}: Seq Scan on {relation} over {rows} rows"
+            for row in report for relation, rows in row['seq_scans'].items()
+            if rows >= args.fail_on_seq_scan
+        ]
+        if violations:
+            print('\nsequential scans over threshold:\n  ' + '\n  '.join(violations))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+'''Копирует секции backend/_runtime.py в index.py функций и проверяет, что копии не разошлись.
+
+Функция подключает секцию маркерами «# >>> runtime:<имя>» и «# <<< runtime:<имя>»;
+всё между ними перезаписывается текстом секции из backend/_runtime.py. Кроме
+совпадения текста проверяется, что функции хватает остального: секций, на которые
+ссылается подключённая (например, pool использует span), импортов и собственных
+констант вроде CORS_ALLOW_METHODS.
+
+    python scripts/sync_runtime.py           # переписать копии
+    python scripts/sync_runtime.py --check   # только проверить; код 1 при расхождении
+'''
+import argparse
+import ast
+import builtins
+import difflib
+import os
+import re
+import sys
+
+from load_function import BACKEND_DIR
+
+RUNTIME_PATH = os.path.join(BACKEND_DIR, '_runtime.py')
+SECTION = re.compile(r'^# >>> runtime:(?P<name>[\w-]+)\n(?P<body>.*?)^# <<< runtime:(?P=name)$', re.MULTILINE | re.DOTALL)
+MARKER = re.compile(r'^# (?:>>>|<<<) runtime:([\w-]+)$', re.MULTILINE)
+
+
+def list_functions() -> list:
+    return sorted(
+        name for name in os.listdir(BACKEND_DIR)
+        if os.path.isfile(os.path.join(BACKEND_DIR, name, 'index.py'))
+    )
+
+
+def top_level_names(tree) -> set:
+    '''Имена, которые модуль или секция связывают на верхнем уровне (включая try/except вокруг импортов)'''
+    names = set()
+    for node in tree.body:
+        nodes = [node]
+        if isinstance(node, ast.Try):
+            nodes += node.body + [item for handler in node.handlers for item in handler.body]
+        for item in nodes:
+            if isinstance(item, (ast.FunctionDef, ast.ClassDef)):
+                names.add(item.name)
+            elif isinstance(item, (ast.Import, ast.ImportFrom)):
+                names.update((alias.asname or alias.name).split('.')[0] for alias in item.names)
+            elif isinstance(item, (ast.Assign, ast.AnnAssign)):
+                targets = item.targets if isinstance(item, ast.Assign) else [item.target]
+                names.update(t.id for t in targets if isinstance(t, ast.Name))
+    return names
+
+
+def free_names(tree) -> set:
+    '''Имена, которые секция читает, но не определяет сама'''
+    bound, loaded = set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            (loaded if isinstance(node.ctx, ast.Load) else bound).add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            # Ленивые импорты внутри функций (boto3 в get_s3_client) секция связывает сама
+            bound.update((alias.asname or alias.name).split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.Global):
+            loaded.update(node.names)
+    return loaded - bound - set(dir(builtins))
+
+
+def load_sections() -> dict:
+    with open(RUNTIME_PATH) as f:
+        source = f.read()
+    sections = {}
+    for match in SECTION.finditer(source):
+        tree = ast.parse(match.group('body'))
+        sections[match.group('name')] = {
+            'body': match.group('body'),
+            'defines': top_level_names(tree),
+            'needs': free_names(tree)
+        }
+    return sections
+
+
+def sync_source(source: str, sections: dict) -> tuple:
+    '''Возвращает (новый текст, подключённые секции, ошибки разметки)'''
+    errors, used = [], []
+    names = MARKER.findall(source)
+    for name in dict.fromkeys(names):
+        if names.count(name) != 2:
+            errors.append(f'runtime:{name}: markers must come in one >>> / <<< pair')
+        elif name not in sections:
+            errors.append(f'runtime:{name}: no such section in backend/_runtime.py')
+        else:
+            used.append(name)
+
+    def replace(match):
+        section = sections.get(match.group('name'))
+        if section is None:
+            return match.group(0)
+        return f"# >>> runtime:{match.group('name')}\n{section['body']}# <<< runtime:{match.group('name')}"
+
+    return SECTION.sub(replace, source), used, errors
+
+
+def check_dependencies(source: str, used: list, sections: dict) -> list:
+    '''Каждое имя, нужное подключённым секциям, должно быть определено в самой функции'''
+    defined = top_level_names(ast.parse(source))
+    provided_by = {name: section for section, info in sections.items() for name in info['defines']}
+    errors = []
+    for section in used:
+        for name in sorted(sections[section]['needs'] - defined):
+            if name in provided_by:
+                errors.append(f'runtime:{section} needs section runtime:{provided_by[name]} (for {name})')
+            else:
+                errors.append(f'runtime:{section} needs {name} to be imported or defined')
+    return errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--check', action='store_true', help='ничего не писать, только сообщить о расхождениях')
+    args = parser.parse_args()
+
+    sections = load_sections()
+    failed = False
+    for name in list_functions():
+        path = os.path.join(BACKEND_DIR, name, 'index.py')
+        with open(path) as f:
+            source = f.read()
+        synced, used, errors = sync_source(source, sections)
+        errors += check_dependencies(synced, used, sections)
+        for error in errors:
+            print(f'{name}: {error}')
+        failed = failed or bool(errors)
+
+        if synced == source:
+            continue
+        if args.check:
+            failed = True
+            diff = difflib.unified_diff(
+                source.splitlines(), synced.splitlines(),
+                f'{name}/index.py', 'backend/_runtime.py', lineterm='', n=1
+            )
+            print(f'{name}: runtime copy drifted from backend/_runtime.py')
+            print('\n'.join(list(diff)[:40]))
+        else:
+            with open(path, 'w') as f:
+                f.write(synced)
+            print(f'{name}: synced {", ".join(used)}')
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()